@@ -15,10 +15,21 @@ top-level functions to this file.
 """
 from __future__ import annotations
 import csv
-from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import io
+import locale
+import os
+import pickle
+import threading
+import time
+from collections import Counter
+from itertools import islice
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, \
+    Optional, Tuple, Union
 
 from melody import Melody
 from prefix_tree import SimplePrefixTree, CompressedPrefixTree, Autocompleter
+from prefix_tree import FrozenPrefixTree, MappedPrefixTree, PrefixCursor
 
 
 ################################################################################
@@ -36,8 +47,24 @@ class LetterAutocompleteEngine:
 
     === Attributes ===
     autocompleter: An Autocompleter used by this engine.
+
+    === Private Attributes ===
+    _config: The configuration this engine was built from, or None if it was
+             opened from an index file.
+    _checksum: The checksum of the part of config['file'] read when this
+               engine was built, loaded or last saved.
+    _timings: The seconds spent in each phase of building this engine (see
+              stats_info), all None if it was loaded or opened from an index
+              file.
+    _position: How far config['file'] has been read, as the device and inode
+               of the file and the byte offset reached in it (see refresh),
+               or None if this engine was opened from an index file.
     """
     autocompleter: Autocompleter
+    _config: Optional[Dict[str, Any]]
+    _checksum: Optional[str]
+    _timings: Dict[str, Optional[float]]
+    _position: Optional[Tuple[int, int, int]]
 
     def __init__(self, config: Dict[str, Any]) -> None:
         """Initialize this engine with the given configuration.
@@ -48,6 +75,8 @@ class LetterAutocompleteEngine:
               specifying which subclass of Autocompleter to use.
             - 'weight_type': either 'sum' or 'average', which specifies the
               weight type for the prefix tree.
+            - 'cache_size' (optional): the number of recent autocomplete
+              results the prefix tree caches (see set_result_cache).
 
         Each line of the specified file counts as one input string.
         Note that the line may or may not contain spaces.
@@ -62,22 +91,15 @@ class LetterAutocompleteEngine:
         one line of the input file; this would result in that string getting
         a larger weight (because of how Autocompleter.insert works).
         """
-        # determine tree type
-        self.autocompleter = None
-        if config['autocompleter'] == 'simple':
-            self.autocompleter = SimplePrefixTree(config['weight_type'])
-        elif config['autocompleter'] == 'compressed':
-            self.autocompleter = CompressedPrefixTree(config['weight_type'])
-
-        # We've opened the file for you here. You should iterate over the
-        # lines of the file and process them according to the description in
-        # this method's docstring.
+        # the file is read in chunks of whole lines, each chunk sanitized at
+        # once, and the whole tree is built at once instead of inserting line
+        # by line (see _ingest); refresh goes on from where the file ended
+        self._config = dict(config)
+        self._checksum = _checksum(config['file'])
         with open(config['file'], encoding='utf8') as f:
-            for line in f:
-                sanitized = _sanitize(line)  # sanitize each line
-
-                if sanitized is not None:
-                    self.autocompleter.insert(sanitized, 1, list(sanitized))
+            self.autocompleter, self._timings = _ingest(
+                config, _read_chunks(f), _letter_items)
+            self._position = _file_position(f, f.buffer.tell())
 
     def autocomplete(self, prefix: str,
                      limit: Optional[int] = None) -> List[Tuple[str, float]]:
@@ -99,6 +121,168 @@ class LetterAutocompleteEngine:
 
         return self.autocompleter.autocomplete(list(prefix), limit)
 
+    def autocomplete_fuzzy(self, prefix: str, max_edits: int = 1,
+                           limit: Optional[int] = None) -> List[
+                               Tuple[str, float, int]]:
+        """Return up to <limit> strings that start with a string within
+        <max_edits> letter edits of the given prefix string, so a mistyped
+        prefix still finds its matches.
+
+        The return value is a list of tuples (string, weight, edits), fewest
+        edits first and then in non-increasing weight. If limit is None,
+        return *every* such string.
+
+        Preconditions:
+            max_edits >= 0
+            limit is None or limit > 0
+            <prefix> contains only lowercase alphanumeric characters and spaces
+        """
+        return self.autocompleter.autocomplete_fuzzy(list(prefix), max_edits,
+                                                     limit)
+
+    def autocomplete_many(self, prefixes: List[str],
+                          limit: Optional[int] = None) -> List[
+                              List[Tuple[str, float]]]:
+        """Return the result of autocomplete(prefix, limit) for every
+        prefix string in <prefixes>, in the same order.
+
+        This is much faster than calling autocomplete for each of them:
+        prefixes that share a beginning trace it down the tree only once, and
+        the matches of a prefix nested under another are reused for it.
+        Ties may be broken differently than by autocomplete.
+
+        Preconditions:
+            limit is None or limit > 0
+            every prefix contains only lowercase alphanumeric characters and
+            spaces
+        """
+        sequences = [list(prefix) for prefix in prefixes]
+        return self.autocompleter.autocomplete_many(sequences, limit)
+
+    def session(self) -> PrefixCursor:
+        """Return a session for a prefix typed one letter at a time.
+
+        session.extend(letter) adds a letter (which may be a space) and
+        session.backspace() takes the last one back. The session stays where
+        its prefix leads, so neither goes back to the root, and
+        session.autocomplete(limit) returns the matches for the prefix typed so
+        far, as autocomplete does.
+        """
+        return self.autocompleter.cursor()
+
+    def iter_autocomplete(self, prefix: str) -> Iterator[Tuple[str, float]]:
+        """Lazily yield every match for the given prefix string.
+
+        The matches are yielded as tuples (string, weight), in non-increasing
+        weight, so the caller can stop as soon as it has seen enough.
+
+        Precondition:
+            <prefix> contains only lowercase alphanumeric characters and spaces
+        """
+        return self.autocompleter.iter_autocomplete(list(prefix))
+
+    def save(self, path: str) -> None:
+        """Save a snapshot of this engine, with its built Autocompleter, to
+        <path>.
+
+        load reads the snapshot back much faster than this engine was built.
+        """
+        _save_snapshot(self, path)
+
+    @classmethod
+    def load(cls, path: str) -> LetterAutocompleteEngine:
+        """Return the engine saved to <path> by save.
+
+        If the part of the source file the engine had read (including by
+        refresh) has changed since it was saved, the snapshot is stale: the
+        engine is built again from the file and saved back to <path>
+        instead. Lines appended to the file since are left for refresh.
+        Only load snapshots you trust, since they are pickled.
+        """
+        return _load_snapshot(cls, path)
+
+    def write_index(self, path: str) -> None:
+        """Write the strings of this engine to an index file at <path>.
+
+        from_index maps the file back into an engine without reading or
+        sanitizing the source file again.
+        """
+        _freeze(self.autocompleter).write_index(path)
+
+    @classmethod
+    def from_index(cls, path: str) -> LetterAutocompleteEngine:
+        """Return an engine answering queries straight from the index file at
+        <path>, written by write_index.
+
+        The file is mapped into memory rather than loaded, so this takes the
+        same time whatever the size of the file. The engine is read-only:
+        remove raises TypeError, and so does save, since the index file
+        already is its snapshot.
+        """
+        engine = cls.__new__(cls)
+        engine.autocompleter = MappedPrefixTree(path)
+        engine._config = None
+        engine._checksum = None
+        engine._timings = dict.fromkeys(_PHASES)
+        engine._position = None
+        return engine
+
+    def refresh(self) -> int:
+        """Insert the lines appended to config['file'] since this engine last
+        read it, sanitized as when it was built, and return the number of
+        strings inserted or given more weight.
+
+        Only the bytes past the offset read up to so far (the end of the
+        file when this engine was built) are read, and they are inserted in
+        batches. A line with no newline yet is left for the next refresh.
+        If the file was rotated (another file has taken its path) or
+        truncated, the file now at the path is read from the start; lines
+        appended to a rotated file after the last refresh are missed.
+
+        Raise TypeError if this engine was opened from an index file.
+        """
+        return _refresh(self, 'utf8', _read_chunks, _letter_items)
+
+    def follow(self, interval: float = 1.0,
+               stop: Optional[threading.Event] = None) -> None:
+        """Call refresh every <interval> seconds until <stop> is set, or for
+        ever if no stop is given.
+
+        This is meant to run in a thread of its own. refresh changes the
+        autocompleter as insert does, so queries from other threads must not
+        overlap it unless the autocompleter is a VersionedPrefixTree (see
+        SimplePrefixTree.versioned).
+        """
+        if stop is None:
+            stop = threading.Event()
+
+        while not stop.wait(interval):
+            self.refresh()
+
+    def set_stats(self, enabled: bool,
+                  callback: Optional[Callable[[Any, Dict[str, int]],
+                                              None]] = None) -> None:
+        """Turn counting the work of autocomplete on or off.
+
+        While it is on, the autocompleter counts the nodes each autocomplete
+        call visits, the prefix elements it compares, the sorts it does and
+        the leaves it collects, and passes the counts of every call to
+        <callback> with the prefix sequence, if a callback is given.
+        While it is off, nothing is counted.
+        """
+        self.autocompleter.set_stats(enabled, callback)
+
+    def stats_info(self) -> Dict[str, Optional[float]]:
+        """Return the seconds spent building this engine in each phase:
+        'read' (reading the file), 'sanitize' (turning its lines into
+        strings) and 'insert' (building the autocompleter), along with the
+        totals counted by autocomplete since set_stats turned counting on
+        (None for whatever was not measured).
+        """
+        stats = dict(self._timings)
+        stats.update(self.autocompleter.stats_info())
+        return stats
+
     def remove(self, prefix: str) -> None:
         """Remove all strings that match the given prefix string.
 
@@ -110,6 +294,17 @@ class LetterAutocompleteEngine:
         """
         self.autocompleter.remove(list(prefix))
 
+    def remove_value(self, value: str) -> None:
+        """Remove the given string, and no other string that shares its
+        prefix.
+
+        Raise KeyError if the string is not stored in this engine.
+
+        Precondition: <value> contains only lowercase alphanumeric characters
+                      and spaces.
+        """
+        self.autocompleter.remove_value(value)
+
 
 class SentenceAutocompleteEngine:
     """An autocomplete engine that suggests strings based on a few words.
@@ -124,8 +319,24 @@ class SentenceAutocompleteEngine:
 
     === Attributes ===
     autocompleter: An Autocompleter used by this engine.
+
+    === Private Attributes ===
+    _config: The configuration this engine was built from, or None if it was
+             opened from an index file.
+    _checksum: The checksum of the part of config['file'] read when this
+               engine was built, loaded or last saved.
+    _timings: The seconds spent in each phase of building this engine (see
+              stats_info), all None if it was loaded or opened from an index
+              file.
+    _position: How far config['file'] has been read, as the device and inode
+               of the file and the byte offset reached in it (see refresh),
+               or None if this engine was opened from an index file.
     """
     autocompleter: Autocompleter
+    _config: Optional[Dict[str, Any]]
+    _checksum: Optional[str]
+    _timings: Dict[str, Optional[float]]
+    _position: Optional[Tuple[int, int, int]]
 
     def __init__(self, config: Dict[str, Any]) -> None:
         """Initialize this engine with the given configuration.
@@ -136,6 +347,8 @@ class SentenceAutocompleteEngine:
               specifying which subclass of Autocompleter to use.
             - 'weight_type': either 'sum' or 'average', which specifies the
               weight type for the prefix tree.
+            - 'cache_size' (optional): the number of recent autocomplete
+              results the prefix tree caches (see set_result_cache).
 
         Precondition:
         The given file is a *CSV file* where each line has two entries:
@@ -157,21 +370,12 @@ class SentenceAutocompleteEngine:
         # We haven't given you any starter code here! You should review how
         # you processed CSV files on Assignment 1.
 
-        self.autocompleter = None
-        # determine tree type
-        if config['autocompleter'] == 'simple':
-            self.autocompleter = SimplePrefixTree(config['weight_type'])
-        elif config['autocompleter'] == 'compressed':
-            self.autocompleter = CompressedPrefixTree(config['weight_type'])
-
-        with open(config['file']) as file:
-            reader = csv.reader(file)
-            for item in reader:
-                sanitized = _sanitize(item[0])  # sanitize each line
-
-                if sanitized is not None:
-                    self.autocompleter.insert(sanitized, float(item[1]),
-                                              sanitized.strip().split(" "))
+        self._config = dict(config)
+        self._checksum = _checksum(config['file'])
+        with open(config['file']) as f:
+            self.autocompleter, self._timings = _ingest(
+                config, _read_rows(f), _sentence_items)
+            self._position = _file_position(f, f.buffer.tell())
 
     def autocomplete(self, prefix: str,
                      limit: Optional[int] = None) -> List[Tuple[str, float]]:
@@ -191,6 +395,168 @@ class SentenceAutocompleteEngine:
         """
         return self.autocompleter.autocomplete(prefix.strip().split(" "), limit)
 
+    def autocomplete_fuzzy(self, prefix: str, max_edits: int = 1,
+                           limit: Optional[int] = None) -> List[
+                               Tuple[str, float, int]]:
+        """Return up to <limit> strings that start with words within
+        <max_edits> edits of the words of the given prefix, where an edit
+        inserts, deletes or replaces a whole word.
+
+        The return value is a list of tuples (string, weight, edits), fewest
+        edits first and then in non-increasing weight. If limit is None,
+        return *every* such string.
+
+        Preconditions:
+            max_edits >= 0
+            limit is None or limit > 0
+            <prefix> contains only lowercase alphanumeric characters and spaces
+        """
+        return self.autocompleter.autocomplete_fuzzy(prefix.strip().split(" "),
+                                                     max_edits, limit)
+
+    def autocomplete_many(self, prefixes: List[str],
+                          limit: Optional[int] = None) -> List[
+                              List[Tuple[str, float]]]:
+        """Return the result of autocomplete(prefix, limit) for every
+        prefix string in <prefixes>, in the same order.
+
+        This is much faster than calling autocomplete for each of them:
+        prefixes that share a beginning trace it down the tree only once, and
+        the matches of a prefix nested under another are reused for it.
+        Ties may be broken differently than by autocomplete.
+
+        Preconditions:
+            limit is None or limit > 0
+            every prefix contains only lowercase alphanumeric characters and
+            spaces
+        """
+        sequences = [prefix.strip().split(" ") for prefix in prefixes]
+        return self.autocompleter.autocomplete_many(sequences, limit)
+
+    def session(self) -> PrefixCursor:
+        """Return a session for a prefix typed one word at a time.
+
+        session.extend(word) adds a word and session.backspace() takes the last
+        one back. The session stays where its prefix leads, so neither goes
+        back to the root, and session.autocomplete(limit) returns the matches
+        for the prefix typed so far, as autocomplete does.
+        """
+        return self.autocompleter.cursor()
+
+    def iter_autocomplete(self, prefix: str) -> Iterator[Tuple[str, float]]:
+        """Lazily yield every match for the given prefix string.
+
+        The matches are yielded as tuples (string, weight), in non-increasing
+        weight, so the caller can stop as soon as it has seen enough.
+
+        Precondition:
+            <prefix> contains only lowercase alphanumeric characters and spaces
+        """
+        return self.autocompleter.iter_autocomplete(prefix.strip().split(" "))
+
+    def save(self, path: str) -> None:
+        """Save a snapshot of this engine, with its built Autocompleter, to
+        <path>.
+
+        load reads the snapshot back much faster than this engine was built.
+        """
+        _save_snapshot(self, path)
+
+    @classmethod
+    def load(cls, path: str) -> SentenceAutocompleteEngine:
+        """Return the engine saved to <path> by save.
+
+        If the part of the source file the engine had read (including by
+        refresh) has changed since it was saved, the snapshot is stale: the
+        engine is built again from the file and saved back to <path>
+        instead. Lines appended to the file since are left for refresh.
+        Only load snapshots you trust, since they are pickled.
+        """
+        return _load_snapshot(cls, path)
+
+    def write_index(self, path: str) -> None:
+        """Write the strings of this engine to an index file at <path>.
+
+        from_index maps the file back into an engine without reading or
+        sanitizing the source file again.
+        """
+        _freeze(self.autocompleter).write_index(path)
+
+    @classmethod
+    def from_index(cls, path: str) -> SentenceAutocompleteEngine:
+        """Return an engine answering queries straight from the index file at
+        <path>, written by write_index.
+
+        The file is mapped into memory rather than loaded, so this takes the
+        same time whatever the size of the file. The engine is read-only:
+        remove raises TypeError, and so does save, since the index file
+        already is its snapshot.
+        """
+        engine = cls.__new__(cls)
+        engine.autocompleter = MappedPrefixTree(path)
+        engine._config = None
+        engine._checksum = None
+        engine._timings = dict.fromkeys(_PHASES)
+        engine._position = None
+        return engine
+
+    def refresh(self) -> int:
+        """Insert the rows appended to config['file'] since this engine last
+        read it, sanitized as when it was built, and return the number of
+        strings inserted or given more weight.
+
+        Only the bytes past the offset read up to so far (the end of the
+        file when this engine was built) are read, and they are inserted in
+        batches. A line with no newline yet is left for the next refresh.
+        If the file was rotated (another file has taken its path) or
+        truncated, the file now at the path is read from the start; rows
+        appended to a rotated file after the last refresh are missed.
+
+        Raise TypeError if this engine was opened from an index file.
+        """
+        return _refresh(self, locale.getpreferredencoding(False), _read_rows,
+                        _sentence_items)
+
+    def follow(self, interval: float = 1.0,
+               stop: Optional[threading.Event] = None) -> None:
+        """Call refresh every <interval> seconds until <stop> is set, or for
+        ever if no stop is given.
+
+        This is meant to run in a thread of its own. refresh changes the
+        autocompleter as insert does, so queries from other threads must not
+        overlap it unless the autocompleter is a VersionedPrefixTree (see
+        SimplePrefixTree.versioned).
+        """
+        if stop is None:
+            stop = threading.Event()
+
+        while not stop.wait(interval):
+            self.refresh()
+
+    def set_stats(self, enabled: bool,
+                  callback: Optional[Callable[[Any, Dict[str, int]],
+                                              None]] = None) -> None:
+        """Turn counting the work of autocomplete on or off.
+
+        While it is on, the autocompleter counts the nodes each autocomplete
+        call visits, the prefix elements it compares, the sorts it does and
+        the leaves it collects, and passes the counts of every call to
+        <callback> with the prefix sequence, if a callback is given.
+        While it is off, nothing is counted.
+        """
+        self.autocompleter.set_stats(enabled, callback)
+
+    def stats_info(self) -> Dict[str, Optional[float]]:
+        """Return the seconds spent building this engine in each phase:
+        'read' (reading the file), 'sanitize' (turning its lines into
+        strings) and 'insert' (building the autocompleter), along with the
+        totals counted by autocomplete since set_stats turned counting on
+        (None for whatever was not measured).
+        """
+        stats = dict(self._timings)
+        stats.update(self.autocompleter.stats_info())
+        return stats
+
     def remove(self, prefix: str) -> None:
         """Remove all strings that match the given prefix.
 
@@ -202,6 +568,17 @@ class SentenceAutocompleteEngine:
         """
         self.autocompleter.remove(prefix.strip().split(" "))
 
+    def remove_value(self, value: str) -> None:
+        """Remove the given sentence, and no other sentence that shares its
+        words.
+
+        Raise KeyError if the sentence is not stored in this engine.
+
+        Precondition: <value> contains only lowercase alphanumeric characters
+                      and spaces.
+        """
+        self.autocompleter.remove_value(value)
+
 
 ################################################################################
 # Melody-based Autocomplete Engines (Task 5)
@@ -218,8 +595,15 @@ class MelodyAutocompleteEngine:
 
     # === Private Attributes ===
     autocompleter: An Autocompleter used by this engine.
+    _config: The configuration this engine was built from.
+    _checksum: The checksum of config['file'] when this engine was built.
+    _timings: The seconds spent in each phase of building this engine (see
+              stats_info), all None if it was loaded from a snapshot.
     """
     autocompleter: Autocompleter
+    _config: Dict[str, Any]
+    _checksum: str
+    _timings: Dict[str, Optional[float]]
 
     def __init__(self, config: Dict[str, Any]) -> None:
         """Initialize this engine with the given configuration.
@@ -230,6 +614,8 @@ class MelodyAutocompleteEngine:
               specifying which subclass of Autocompleter to use.
             - 'weight_type': either 'sum' or 'average', which specifies the
               weight type for the prefix tree.
+            - 'cache_size' (optional): the number of recent autocomplete
+              results the prefix tree caches (see set_result_cache).
 
         Precondition:
         The given file is a *CSV file* where each line has the following format:
@@ -246,34 +632,11 @@ class MelodyAutocompleteEngine:
         """
         # We haven't given you any starter code here! You should review how
         # you processed CSV files on Assignment 1.
-        self.autocompleter = None
-        # determine tree type
-        if config['autocompleter'] == 'simple':
-            self.autocompleter = SimplePrefixTree(config['weight_type'])
-        elif config['autocompleter'] == 'compressed':
-            self.autocompleter = CompressedPrefixTree(config['weight_type'])
-
+        self._config = dict(config)
+        self._checksum = _checksum(config['file'])
         with open(config['file']) as file:
-            reader = csv.reader(file)
-            for item in reader:
-                name = item[0]  # get song name
-                index = 1
-                notes = []
-                interval = []
-                prev_pit = None
-                # loop to record notes and pitches
-                while index < len(item) and len(item[index]) != 0:
-                    pitch = int(item[index])
-
-                    if prev_pit is not None:
-                        interval.append(pitch - prev_pit)
-
-                    prev_pit = pitch
-                    notes.append((pitch, int(item[index + 1])))
-
-                    index += 2
-
-                self.autocompleter.insert(Melody(name, notes), 1, interval)
+            self.autocompleter, self._timings = _ingest(
+                config, _read_rows(file), _melody_items)
 
     def autocomplete(self, prefix: List[int],
                      limit: Optional[int] = None) -> List[Tuple[Melody, float]]:
@@ -289,21 +652,516 @@ class MelodyAutocompleteEngine:
         """
         return self.autocompleter.autocomplete(prefix, limit)
 
+    def autocomplete_many(self, prefixes: List[List[int]],
+                          limit: Optional[int] = None) -> List[
+                              List[Tuple[Melody, float]]]:
+        """Return the result of autocomplete(prefix, limit) for every
+        interval sequence in <prefixes>, in the same order.
+
+        This is much faster than calling autocomplete for each of them:
+        prefixes that share a beginning trace it down the tree only once, and
+        the matches of a prefix nested under another are reused for it.
+        Ties may be broken differently than by autocomplete.
+
+        Preconditions:
+            limit is None or limit > 0
+        """
+        return self.autocompleter.autocomplete_many(prefixes, limit)
+
+    def session(self) -> PrefixCursor:
+        """Return a session for a prefix typed one interval at a time.
+
+        session.extend(interval) adds an interval and session.backspace() takes
+        the last one back. The session stays where its prefix leads, so neither
+        goes back to the root, and session.autocomplete(limit) returns the
+        matches for the prefix typed so far, as autocomplete does.
+        """
+        return self.autocompleter.cursor()
+
+    def iter_autocomplete(self, prefix: List[int]) -> Iterator[
+            Tuple[Melody, float]]:
+        """Lazily yield every match for the given interval sequence.
+
+        The matches are yielded as tuples (melody, weight), in non-increasing
+        weight, so the caller can stop as soon as it has seen enough.
+        """
+        return self.autocompleter.iter_autocomplete(prefix)
+
+    def save(self, path: str) -> None:
+        """Save a snapshot of this engine, with its built Autocompleter, to
+        <path>.
+
+        load reads the snapshot back much faster than this engine was built.
+        """
+        _save_snapshot(self, path)
+
+    @classmethod
+    def load(cls, path: str) -> MelodyAutocompleteEngine:
+        """Return the engine saved to <path> by save.
+
+        If the source file of the engine has changed since it was built, the
+        snapshot is stale: the engine is built again from the file and saved
+        back to <path> instead. Only load snapshots you trust, since they are
+        pickled.
+        """
+        return _load_snapshot(cls, path)
+
+    def set_stats(self, enabled: bool,
+                  callback: Optional[Callable[[Any, Dict[str, int]],
+                                              None]] = None) -> None:
+        """Turn counting the work of autocomplete on or off.
+
+        While it is on, the autocompleter counts the nodes each autocomplete
+        call visits, the prefix elements it compares, the sorts it does and
+        the leaves it collects, and passes the counts of every call to
+        <callback> with the prefix sequence, if a callback is given.
+        While it is off, nothing is counted.
+        """
+        self.autocompleter.set_stats(enabled, callback)
+
+    def stats_info(self) -> Dict[str, Optional[float]]:
+        """Return the seconds spent building this engine in each phase:
+        'read' (reading the file), 'sanitize' (turning its lines into
+        melodies) and 'insert' (building the autocompleter), along with the
+        totals counted by autocomplete since set_stats turned counting on
+        (None for whatever was not measured).
+        """
+        stats = dict(self._timings)
+        stats.update(self.autocompleter.stats_info())
+        return stats
+
     def remove(self, prefix: List[int]) -> None:
         """Remove all melodies that match the given interval sequence.
         """
         self.autocompleter.remove(prefix)
 
+    def remove_value(self, value: Melody) -> None:
+        """Remove the given melody, and no other melody with the same
+        interval sequence.
 
-def _sanitize(org: str) -> Optional[str]:
+        Raise KeyError if the melody is not stored in this engine.
+        """
+        self.autocompleter.remove_value(value)
+
+
+################################################################################
+# Ingestion pipeline
+################################################################################
+_CHUNK_SIZE = 1 << 20
+_BATCH_SIZE = 1 << 14
+
+
+class _SanitizeTable(dict):
+    """A table for str.translate that keeps alphanumeric characters and
+    spaces and deletes every other character of a lowercased string.
+
+    Each character is looked up by isalnum only the first time it is seen;
+    the ASCII characters are looked up when the table is made.
     """
-    helper method to sanitize
+    def __init__(self, keep: str = '') -> None:
+        """Initialize the table, which keeps the characters of <keep> too.
+        """
+        super().__init__()
+        for code in range(128):
+            self.__missing__(code)
+        self.update((ord(c), ord(c)) for c in keep)
+
+    def __missing__(self, code: int) -> Optional[int]:
+        """Return what the character <code> is translated to, and remember it.
+        """
+        char = chr(code)
+        result = code if char.isalnum() or char == ' ' else None
+        self[code] = result
+        return result
+
+
+_SANITIZE = _SanitizeTable()
+_SANITIZE_LINES = _SanitizeTable('\n')
+
+
+def _read_chunks(file: IO[str]) -> Iterator[str]:
     """
-    sanitized = ""
+    helper method yielding the text of <file> in chunks of about _CHUNK_SIZE
+    characters, each made of whole lines
+    """
+    rest = ''
+    for chunk in iter(lambda: file.read(_CHUNK_SIZE), ''):
+        end = chunk.rfind('\n') + 1
+        if end == 0:
+            rest += chunk
+        else:
+            yield rest + chunk[:end]
+            rest = chunk[end:]
+
+    if rest:
+        yield rest
+
+
+def _read_rows(file: IO[str]) -> Iterator[List[List[str]]]:
+    """
+    helper method yielding the rows of the CSV <file> in batches of
+    _BATCH_SIZE rows
+    """
+    reader = csv.reader(file)
+    yield from iter(lambda: list(islice(reader, _BATCH_SIZE)), [])
+
 
-    for c in org.lower():
-        if c.isalnum() or c == " ":
-            sanitized += c
+def _letter_items(chunk: str) -> Iterator[Tuple[str, int, str]]:
+    """
+    helper method yielding an item (string, weight, letters) for every distinct
+    sanitized line in <chunk>, weighted by its count there
+    """
+    lines = Counter(chunk.lower().translate(_SANITIZE_LINES).split('\n'))
+
+    for line, count in lines.items():
+        if line and not line.isspace():
+            yield line, count, line
+
+
+def _sentence_items(rows: List[List[str]]) -> Iterator[
+        Tuple[str, float, List[str]]]:
+    """
+    helper method yielding an item (string, weight, words) for every row in
+    <rows> whose sanitized string has an alphanumeric character
+    """
+    for item in rows:
+        sanitized = _sanitize(item[0])  # sanitize each line
+
+        if sanitized is not None:
+            yield sanitized, float(item[1]), sanitized.strip().split(" ")
+
+
+def _melody_items(rows: List[List[str]]) -> Iterator[
+        Tuple[Melody, int, List[int]]]:
+    """
+    helper method yielding an item (melody, 1, intervals) for every row in
+    <rows>
+    """
+    for item in rows:
+        name = item[0]  # get song name
+        index = 1
+        notes = []
+        interval = []
+        prev_pit = None
+        # loop to record notes and pitches
+        while index < len(item) and len(item[index]) != 0:
+            pitch = int(item[index])
+
+            if prev_pit is not None:
+                interval.append(pitch - prev_pit)
+
+            prev_pit = pitch
+            notes.append((pitch, int(item[index + 1])))
+
+            index += 2
+
+        yield Melody(name, notes), 1, interval
+
+
+def _merge_batches(batches: Iterable[Any],
+                   parse: Callable[[Any], Iterable[Tuple[Any, float, List]]],
+                   timings: Dict[str, float]) -> Dict[Any, List]:
+    """
+    helper method parsing the batches of <batches> by <parse> and adding up the
+    weights of duplicate values, returning the [weight, prefix] of each value
+    and adding the seconds spent to <timings>
+    """
+    totals = {}
+    batches = iter(batches)
+
+    while True:
+        start = time.perf_counter()
+        batch = next(batches, None)
+        read = time.perf_counter()
+        timings['read'] += read - start
+        if batch is None:
+            break
+
+        items = list(parse(batch))
+        parsed = time.perf_counter()
+        timings['sanitize'] += parsed - read
+
+        for value, weight, prefix in items:
+            total = totals.get(value)
+            if total is None:
+                totals[value] = [weight, prefix]
+            else:
+                total[0] += weight
+        timings['insert'] += time.perf_counter() - parsed
+
+    return totals
+
+
+def _ingest(config: Dict[str, Any], batches: Iterable[Any],
+            parse: Callable[[Any], Iterable[Tuple[Any, float, List]]]) \
+        -> Tuple[Autocompleter, Dict[str, float]]:
+    """
+    helper method building the autocompleter of an engine from <batches>,
+    parsed by <parse>
+
+    return the autocompleter with the seconds spent in each stage
+    """
+    timings = dict.fromkeys(_PHASES, 0.0)
+    totals = _merge_batches(batches, parse, timings)
+
+    start = time.perf_counter()
+    autocompleter = _build_autocompleter(
+        config, [(value, weight, prefix)
+                 for value, (weight, prefix) in totals.items()])
+    timings['insert'] += time.perf_counter() - start
+    return autocompleter, timings
+
+
+def _file_position(file: IO, offset: int) -> Tuple[int, int, int]:
+    """
+    helper method returning the position <offset> in the open <file> as
+    (device, inode, offset), which tells whether the file at the same path
+    later is still the same file
+    """
+    stat = os.fstat(file.fileno())
+    return stat.st_dev, stat.st_ino, offset
+
+
+def _path_position(path: str, offset: Optional[int] = None) -> Optional[
+        Tuple[int, int, int]]:
+    """
+    helper method returning the position <offset> in the file at <path>, or
+    at its end if offset is None (see _file_position), or None if there is no
+    such file
+    """
+    try:
+        with open(path, 'rb') as f:
+            if offset is None:
+                offset = f.seek(0, os.SEEK_END)
+            return _file_position(f, offset)
+    except FileNotFoundError:
+        return None
+
+
+def _read_lines(path: str, encoding: str,
+                position: Optional[Tuple[int, int, int]] = None) -> Tuple[
+                    IO[str], Tuple[int, int, int]]:
+    """
+    helper method returning the whole lines of the file at <path> past
+    <position>, decoded by <encoding>, with the position past them; a rotated
+    or truncated file, or a None position, is read from the start
+    """
+    with open(path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        offset = 0
+        if position is not None and position[:2] == (stat.st_dev,
+                                                      stat.st_ino) \
+                and stat.st_size >= position[2]:
+            offset = position[2]
+        f.seek(offset)
+        data = f.read()
+
+    end = data.rfind(b'\n') + 1
+    text = io.StringIO(data[:end].decode(encoding), newline=None)
+    return text, (stat.st_dev, stat.st_ino, offset + end)
+
+
+def _refresh(engine: Union[LetterAutocompleteEngine,
+                           SentenceAutocompleteEngine], encoding: str,
+             read: Callable[[IO[str]], Iterable[Any]],
+             parse: Callable[[Any], Iterable[Tuple[Any, float, List]]]) -> int:
+    """
+    helper method inserting into <engine> the whole lines of its file past
+    engine._position, parsed as when it was built, and moving _position past
+    them
+
+    return the number of distinct values inserted
+    """
+    if engine._position is None:
+        raise TypeError('this engine was not built from a file it can follow')
+
+    try:
+        text, position = _read_lines(engine._config['file'], encoding,
+                                     engine._position)
+    except FileNotFoundError:
+        return 0  # rotated away, and nothing has taken its place yet
+
+    totals = _merge_batches(read(text), parse, dict.fromkeys(_PHASES, 0.0))
+    items = [(value, weight, list(prefix))
+             for value, (weight, prefix) in totals.items()]
+
+    for start in range(0, len(items), _BATCH_SIZE):
+        _insert_batch(engine.autocompleter, items[start:start + _BATCH_SIZE])
+
+    engine._position = position
+    return len(items)
+
+
+def _insert_batch(autocompleter: Autocompleter,
+                  items: List[Tuple[Any, float, List]]) -> None:
+    """
+    helper method inserting <items> into <autocompleter>; a prefix tree that
+    does not sort lazily already does so for the batch, so every subtrees
+    list it changes is sorted once at the end instead of on every insert
+    """
+    lazy = isinstance(autocompleter, (SimplePrefixTree,
+                                      CompressedPrefixTree)) and \
+        not autocompleter._lazy
+
+    if lazy:
+        autocompleter.set_lazy_sorting(True)
+    try:
+        for value, weight, prefix in items:
+            autocompleter.insert(value, weight, prefix)
+    finally:
+        if lazy:
+            autocompleter.set_lazy_sorting(False)
+
+
+def _build_autocompleter(config: Dict[str, Any],
+                         items: List[Tuple[Any, float, List]]) \
+        -> Autocompleter:
+    """
+    helper method to bulk-load <items> into the tree named by
+    config['autocompleter'], or raise ValueError if it names none
+    """
+    # determine tree type
+    if config['autocompleter'] == 'simple':
+        tree_class = SimplePrefixTree
+    elif config['autocompleter'] == 'compressed':
+        tree_class = CompressedPrefixTree
+    else:
+        raise ValueError(f"unknown autocompleter "
+                         f"{config['autocompleter']!r}: expected 'simple' "
+                         f"or 'compressed'")
+
+    tree = tree_class.from_items(items, config['weight_type'])
+    tree.set_result_cache(config.get('cache_size'))
+    return tree
+
+
+_SNAPSHOT_VERSION = 4
+_PHASES = ('read', 'sanitize', 'insert')
+Engine = Union[LetterAutocompleteEngine, SentenceAutocompleteEngine,
+               MelodyAutocompleteEngine]
+
+
+def _checksum(path: str, size: Optional[int] = None) -> str:
+    """
+    helper method returning the SHA-256 digest of the first <size> bytes of
+    the file at <path>, or of the whole file if size is None
+    """
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        if size is None:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                digest.update(block)
+        else:
+            while size > 0:
+                block = f.read(min(size, 1 << 16))
+                if not block:
+                    break
+                digest.update(block)
+                size -= len(block)
+
+    return digest.hexdigest()
+
+
+def _read_checksum(engine: Engine) -> Tuple[Optional[str], Optional[int]]:
+    """
+    helper method returning the checksum of the part of its file <engine> has
+    read, with the number of bytes in that part (None for the whole file); a
+    refreshed engine has read past the end its file had when it was built
+    """
+    if isinstance(engine, MelodyAutocompleteEngine) or \
+            engine._position is None or \
+            _path_position(engine._config['file'],
+                           engine._position[2]) != engine._position:
+        return engine._checksum, None  # rotated files are checked whole
+
+    size = engine._position[2]
+    return _checksum(engine._config['file'], size), size
+
+
+def _save_snapshot(engine: Engine, path: str) -> None:
+    """
+    helper method pickling <engine> with its configuration and the checksum of
+    the part of its file it has read to <path>, replacing the file in one step
+    """
+    if isinstance(engine.autocompleter, MappedPrefixTree):
+        raise TypeError('an engine opened from an index file cannot be '
+                        'saved; its index file already holds it')
+
+    engine._checksum, size = _read_checksum(engine)
+
+    snapshot = {
+        'version': _SNAPSHOT_VERSION,
+        'engine': type(engine).__name__,
+        'config': engine._config,
+        'checksum': engine._checksum,
+        'size': size,
+        'autocompleter': engine.autocompleter
+    }
+    temp = f'{path}.{os.getpid()}.tmp'
+
+    with open(temp, 'wb') as f:
+        pickle.dump(snapshot, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(temp, path)
+
+
+def _load_snapshot(cls: type, path: str) -> Engine:
+    """
+    helper method loading an engine of class <cls> from the snapshot at <path>,
+    or rebuilding and saving it if the snapshot is stale
+    """
+    with open(path, 'rb') as f:
+        snapshot = pickle.load(f)
+
+    if not isinstance(snapshot, dict) or \
+            snapshot.get('engine') != cls.__name__:
+        raise ValueError(f'{path} is not a snapshot of a {cls.__name__}')
+
+    if snapshot['version'] != _SNAPSHOT_VERSION:
+        engine = cls(snapshot['config'])
+        engine.save(path)
+        return engine
+
+    config = snapshot['config']
+    try:
+        checksum = _checksum(config['file'], snapshot['size'])
+    except FileNotFoundError:
+        checksum = snapshot['checksum']
+
+    if checksum != snapshot['checksum']:
+        engine = cls(config)
+        engine.save(path)
+        return engine
+
+    engine = cls.__new__(cls)
+    engine.autocompleter = snapshot['autocompleter']
+    engine.autocompleter.set_result_cache(config.get('cache_size'))
+    engine._config = config
+    engine._checksum = checksum
+    engine._timings = dict.fromkeys(_PHASES)
+    if cls is not MelodyAutocompleteEngine:
+        # follow the file from where the saved engine had read up to
+        engine._position = _path_position(config['file'], snapshot['size'])
+    return engine
+
+
+def _freeze(autocompleter: Autocompleter) -> FrozenPrefixTree:
+    """
+    helper method returning a frozen snapshot of <autocompleter>, which may
+    already be one
+    """
+    if isinstance(autocompleter, FrozenPrefixTree):
+        return autocompleter
+    return autocompleter.freeze()
+
+
+def _sanitize(org: str) -> Optional[str]:
+    """
+    helper method to sanitize: lowercase, then keep only alphanumeric
+    characters and spaces (by the table _SANITIZE), or None if that leaves
+    no alphanumeric character
+    """
+    sanitized = org.lower().translate(_SANITIZE)
 
     if len(sanitized) == 0 or sanitized.isspace():
         return None
@@ -354,12 +1212,6 @@ if __name__ == '__main__':
     #     'extra-imports': ['csv', 'prefix_tree', 'melody']
     # })
 
-    # This is used to increase the recursion limit so that your sample runs
-    # work even for fairly tall simple prefix trees.
-    import sys
-
-    sys.setrecursionlimit(5000)
-
     # STAR WARS **************************************************************
     # ma = MelodyAutocompleteEngine(
     #    {'file': 'data/songbook.csv', 'autocompleter': 'simple',
@@ -369,3 +1221,4 @@ if __name__ == '__main__':
     # print(sample_letter_autocomplete())
     # print(sample_sentence_autocomplete())
     # sample_melody_autocomplete()
+    pass
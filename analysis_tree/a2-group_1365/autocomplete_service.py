@@ -0,0 +1,215 @@
+"""Autocomplete service
+
+=== Module Description ===
+This file contains an asyncio service that answers autocomplete queries for
+one of the engines in autocomplete_engines.py over TCP.
+
+The protocol is one request per line, answered by one JSON object per line.
+A request is either a JSON object such as
+    {"id": 7, "prefix": "how to", "limit": 5, "timeout": 0.5}
+where only "prefix" is required (a list of intervals for a melody engine), or
+a plain line of text, which is taken as the prefix with no limit. The answer
+to a JSON request carries its "id", so requests sent together may be answered
+in any order:
+    {"id": 7, "results": [["how to cook", 12.0], ...]}
+    {"id": 7, "error": "deadline exceeded"}
+Melodies are answered by their names.
+
+Queries run in an executor, so the event loop keeps serving other clients
+while a large one is collected, and identical queries that arrive while one
+is still running share its result instead of collecting it again.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Dict, Hashable, List, Optional, Tuple, Union
+
+from melody import Melody
+from autocomplete_engines import LetterAutocompleteEngine, \
+    SentenceAutocompleteEngine, MelodyAutocompleteEngine, Engine
+
+
+class AutocompleteService:
+    """A service answering autocomplete queries for one engine.
+
+    === Attributes ===
+    engine: The engine queries are answered by.
+    timeout: The number of seconds a query may take unless it asks for
+             another deadline, or None for no deadline.
+
+    === Private Attributes ===
+    _executor: The executor queries are run in.
+    _in_flight: The queries running right now, keyed by (prefix, limit),
+                each with the future of its result.
+    """
+    engine: Engine
+    timeout: Optional[float]
+    _executor: Executor
+    _in_flight: Dict[Tuple[Hashable, Optional[int]], asyncio.Future]
+
+    def __init__(self, engine: Engine, executor: Optional[Executor] = None,
+                 timeout: Optional[float] = None) -> None:
+        """Initialize a service for <engine>, running queries in <executor>.
+
+        By default queries run one at a time in a thread of their own, since
+        a SimplePrefixTree or CompressedPrefixTree may reorder its subtrees
+        or update its result cache while it is queried. An executor with
+        more threads is safe for an engine whose autocompleter is a
+        FrozenPrefixTree, MappedPrefixTree or VersionedPrefixTree.
+        """
+        self.engine = engine
+        self.timeout = timeout
+        self._executor = executor if executor is not None else \
+            ThreadPoolExecutor(max_workers=1)
+        self._in_flight = {}
+
+    async def autocomplete(self, prefix: Any, limit: Optional[int] = None,
+                           timeout: Optional[float] = None) -> List[
+                               Tuple[Any, float]]:
+        """Return the engine's autocomplete(prefix, limit).
+
+        If the same query is already running, wait for its result instead of
+        running it again. Raise asyncio.TimeoutError if the result takes
+        longer than <timeout> seconds (self.timeout if timeout is None); the
+        query itself keeps running for anyone else waiting on it.
+        """
+        key = (tuple(prefix) if isinstance(prefix, list) else prefix, limit)
+        future = self._in_flight.get(key)
+
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor,
+                                          self.engine.autocomplete, prefix,
+                                          limit)
+            self._in_flight[key] = future
+            future.add_done_callback(
+                lambda done: self._forget(key, done))
+
+        if timeout is None:
+            timeout = self.timeout
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+
+    def _forget(self, key: Tuple[Hashable, Optional[int]],
+                future: asyncio.Future) -> None:
+        """
+        helper method dropping the finished <future> of the query <key> from
+        the queries in flight
+        """
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+    async def answer(self, line: Union[str, bytes]) -> Dict[str, Any]:
+        """Return the answer to the request on <line>, as described in the
+        module description. A line of bytes that is not UTF-8 is a bad
+        request, and any other error raised while answering is answered as
+        an error too, so it does not end the connection.
+        """
+        request_id = None
+        try:
+            if isinstance(line, bytes):
+                line = line.decode('utf8')
+            if line.lstrip().startswith('{'):
+                request = json.loads(line)
+                request_id = request.get('id')
+                results = await self.autocomplete(request['prefix'],
+                                                  request.get('limit'),
+                                                  request.get('timeout'))
+            else:
+                results = await self.autocomplete(line.rstrip('\r\n'))
+        except asyncio.TimeoutError:
+            return {'id': request_id, 'error': 'deadline exceeded'}
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            return {'id': request_id, 'error': f'bad request: {error}'}
+        except Exception as error:
+            return {'id': request_id,
+                    'error': f'internal error: {type(error).__name__}: '
+                             f'{error}'}
+
+        return {'id': request_id,
+                'results': [[_encode_value(value), weight]
+                            for value, weight in results]}
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter) -> None:
+        """Answer every request sent on one connection until it is closed.
+
+        Each request is answered as soon as its result is ready, so a large
+        query does not hold up the ones sent after it.
+        """
+        tasks = set()
+        lock = asyncio.Lock()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.ensure_future(self._reply(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            writer.close()
+
+    async def _reply(self, line: bytes, writer: asyncio.StreamWriter,
+                     lock: asyncio.Lock) -> None:
+        """
+        helper method writing the answer to the request on <line>, holding
+        the connection's <lock> so answers are not interleaved
+        """
+        answer = await self.answer(line)
+        async with lock:
+            writer.write(json.dumps(answer).encode('utf8') + b'\n')
+            await writer.drain()
+
+    async def serve(self, host: str = '127.0.0.1',
+                    port: int = 8765) -> asyncio.AbstractServer:
+        """Start listening for connections on <host> and <port>, and return
+        the server.
+        """
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+def _encode_value(value: Any) -> Any:
+    """
+    helper method returning <value> as something JSON can hold: a melody
+    by its name, anything else as it is
+    """
+    if isinstance(value, Melody):
+        return value.name
+    return value
+
+
+async def _run(service: AutocompleteService, host: str, port: int) -> None:
+    """
+    helper method serving with <service> on <host> and <port> until stopped
+    """
+    server = await service.serve(host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve autocomplete queries.')
+    parser.add_argument('engine', choices=['letter', 'sentence', 'melody'])
+    parser.add_argument('file')
+    parser.add_argument('--autocompleter', default='compressed',
+                        choices=['simple', 'compressed'])
+    parser.add_argument('--weight-type', default='sum',
+                        choices=['sum', 'average'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--timeout', type=float, default=None)
+    args = parser.parse_args()
+
+    engine_class = {'letter': LetterAutocompleteEngine,
+                    'sentence': SentenceAutocompleteEngine,
+                    'melody': MelodyAutocompleteEngine}[args.engine]
+    built = engine_class({'file': args.file,
+                          'autocompleter': args.autocompleter,
+                          'weight_type': args.weight_type})
+    asyncio.run(_run(AutocompleteService(built, timeout=args.timeout),
+                     args.host, args.port))
@@ -0,0 +1,289 @@
+"""Prefix tree benchmarks
+
+=== Module Description ===
+This file contains a benchmark suite comparing SimplePrefixTree with
+CompressedPrefixTree, and the 'sum' weight type with 'average', on synthetic
+corpora:
+    - 'strings': strings of letters drawn with Zipfian frequencies, so popular
+      strings repeat (like the lines of a text file for the letter engine)
+    - 'words': sequences of words drawn with Zipfian frequencies, weighted
+      like the searches for the sentence engine
+    - 'intervals': sequences of intervals, like melodies for the melody
+      engine
+
+For every corpus, tree class and weight type, it times building the tree by
+insert and by from_items (and gives how many times faster from_items is),
+top-k autocomplete at several limits, unlimited autocomplete and remove, and
+measures the peak memory used by either way of building it.
+
+Every corpus and query set comes from a seeded random generator, so runs are
+comparable; each time is the median of several repeats with the garbage
+collector paused, given per operation. Run this file to print a table, or
+with --json for machine-readable output:
+    python benchmarks.py --size 20000 --repeat 5
+"""
+from __future__ import annotations
+import argparse
+import gc
+import json
+import random
+import statistics
+import string
+import time
+import tracemalloc
+from itertools import accumulate
+from typing import Any, Callable, Dict, List, Tuple
+
+from prefix_tree import SimplePrefixTree, CompressedPrefixTree
+
+Item = Tuple[Any, float, List]
+
+TREE_CLASSES = (SimplePrefixTree, CompressedPrefixTree)
+WEIGHT_TYPES = ('sum', 'average')
+LIMITS = (1, 10, 100)
+
+
+################################################################################
+# Corpus generators
+################################################################################
+def _zipf_sampler(rng: random.Random, population: List[Any],
+                  exponent: float = 1.1) -> Callable[[], Any]:
+    """
+    helper function returning a function that draws from <population>, the
+    item of rank r with probability proportional to 1 / r ** exponent
+    """
+    cumulative = list(accumulate(1 / rank ** exponent
+                                 for rank in range(1, len(population) + 1)))
+    return lambda: rng.choices(population, cum_weights=cumulative)[0]
+
+
+def zipf_strings(size: int, seed: int = 0) -> List[Item]:
+    """Return <size> items of strings drawn with Zipfian frequencies from a
+    vocabulary of lowercase strings, each with weight 1 and its letters as
+    its prefix.
+    """
+    rng = random.Random(seed)
+    vocabulary = [''.join(rng.choices(string.ascii_lowercase + ' ',
+                                      k=rng.randint(3, 30)))
+                  for _ in range(max(size // 4, 1))]
+    draw = _zipf_sampler(rng, vocabulary)
+    items = []
+    for _ in range(size):
+        line = draw()
+        items.append((line, 1, list(line)))
+    return items
+
+
+def word_sequences(size: int, seed: int = 0) -> List[Item]:
+    """Return <size> items of one to six words drawn with Zipfian frequencies,
+    each with a random weight and its words as its prefix.
+    """
+    rng = random.Random(seed)
+    words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9)))
+             for _ in range(max(size // 10, 1))]
+    draw = _zipf_sampler(rng, words)
+    items = []
+    for _ in range(size):
+        sentence = [draw() for _ in range(rng.randint(1, 6))]
+        items.append((' '.join(sentence), rng.randint(1, 1000), sentence))
+    return items
+
+
+def interval_sequences(size: int, seed: int = 0) -> List[Item]:
+    """Return <size> items named 'melody <i>', each with weight 1 and a random
+    sequence of 3 to 15 intervals (mostly small steps) as its prefix.
+    """
+    rng = random.Random(seed)
+    steps = [0, 1, -1, 2, -2, 3, -3, 4, -4, 5, -5, 7, -7, 12, -12]
+    draw = _zipf_sampler(rng, steps, 0.8)
+    return [(f'melody {i}', 1, [draw() for _ in range(rng.randint(3, 15))])
+            for i in range(size)]
+
+
+CORPORA = {
+    'strings': zipf_strings,
+    'words': word_sequences,
+    'intervals': interval_sequences
+}
+
+
+def _query_prefixes(items: List[Item], count: int, seed: int) -> List[List]:
+    """
+    helper function returning <count> prefixes to query: the first one to
+    three elements of the prefixes of randomly chosen items
+    """
+    rng = random.Random(seed)
+    prefixes = []
+    for _ in range(count):
+        prefix = rng.choice(items)[2]
+        prefixes.append(prefix[:rng.randint(1, 3)])
+    return prefixes
+
+
+def _removal_prefixes(items: List[Item], count: int, seed: int) -> List[List]:
+    """
+    helper function returning up to <count> prefixes to remove, chosen as by
+    _query_prefixes, but none of them empty or a prefix of another, so every
+    remove still has its own values to take out of the tree
+    """
+    rng = random.Random(seed)
+    prefixes = []
+    for _ in range(count * 20):
+        if len(prefixes) == count:
+            break
+        prefix = rng.choice(items)[2]
+        prefix = prefix[:rng.randint(1, 3)]
+        if prefix and not any(prefix[:len(other)] == other
+                              or other[:len(prefix)] == prefix
+                              for other in prefixes):
+            prefixes.append(prefix)
+    return prefixes
+
+
+################################################################################
+# Measurement
+################################################################################
+def _median_time(action: Callable[[], Any], setup: Callable[[], Any],
+                 repeat: int) -> float:
+    """
+    helper function returning the median time in seconds of calling
+    action(setup()) <repeat> times; setup is not timed, and the garbage
+    collector is paused while action runs
+    """
+    times = []
+    for _ in range(repeat):
+        argument = setup()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            action(argument)
+            times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return statistics.median(times)
+
+
+def _insert_all(tree_class: type, weight_type: str,
+                items: List[Item]) -> Any:
+    """
+    helper function building a tree of <tree_class> by inserting <items> one
+    at a time
+    """
+    tree = tree_class(weight_type)
+    for value, weight, prefix in items:
+        tree.insert(value, weight, prefix)
+    return tree
+
+
+def _peak_memory(build: Callable[[], Any]) -> int:
+    """
+    helper function returning the peak number of bytes allocated while
+    calling <build>
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        build()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(tree_class: type, weight_type: str, items: List[Item],
+             queries: List[List], removals: List[List],
+             repeat: int) -> Dict[str, float]:
+    """Return the measurements for one tree class and weight type on
+    <items>: microseconds per operation for each timed operation, how many
+    times faster from_items builds the tree than insert, and the peak memory
+    of building by insert and by from_items in megabytes.
+    """
+    def fresh() -> Any:
+        return tree_class.from_items(items, weight_type)
+
+    built = fresh()
+    result = {
+        'insert': _median_time(
+            lambda _: _insert_all(tree_class, weight_type, items),
+            lambda: None, repeat) / len(items),
+        'from_items': _median_time(
+            lambda _: fresh(), lambda: None, repeat) / len(items)
+    }
+
+    for limit in LIMITS:
+        result[f'top{limit}'] = _median_time(
+            lambda tree: [tree.autocomplete(query, limit)
+                          for query in queries],
+            lambda: built, repeat) / len(queries)
+    result['unlimited'] = _median_time(
+        lambda tree: [tree.autocomplete(query) for query in queries],
+        lambda: built, repeat) / len(queries)
+    result['remove'] = _median_time(
+        lambda tree: [tree.remove(prefix) for prefix in removals],
+        fresh, repeat) / len(removals)
+
+    result = {name: seconds * 1e6 for name, seconds in result.items()}
+    result['bulk_speedup'] = result['insert'] / result['from_items']
+    result['insert_peak_mb'] = _peak_memory(
+        lambda: _insert_all(tree_class, weight_type, items)) / 1e6
+    result['from_items_peak_mb'] = _peak_memory(fresh) / 1e6
+    return result
+
+
+def run_suite(size: int, repeat: int, seed: int,
+              corpora: List[str]) -> List[Dict[str, Any]]:
+    """Return one row of measurements for every corpus named in <corpora>,
+    tree class and weight type, with corpora of <size> items made from
+    <seed>.
+    """
+    rows = []
+    for corpus in corpora:
+        items = CORPORA[corpus](size, seed)
+        queries = _query_prefixes(items, 200, seed + 1)
+        removals = _removal_prefixes(items, 50, seed + 2)
+        for tree_class in TREE_CLASSES:
+            for weight_type in WEIGHT_TYPES:
+                row = {'corpus': corpus, 'tree': tree_class.__name__,
+                       'weight_type': weight_type}
+                row.update(run_case(tree_class, weight_type, items, queries,
+                                    removals, repeat))
+                rows.append(row)
+    return rows
+
+
+def format_table(rows: List[Dict[str, Any]]) -> str:
+    """Return <rows> as a text table, times in microseconds per operation.
+    """
+    columns = ['corpus', 'tree', 'weight_type', 'insert', 'from_items',
+               'bulk_speedup'] + [f'top{limit}' for limit in LIMITS] + \
+        ['unlimited', 'remove', 'insert_peak_mb', 'from_items_peak_mb']
+    cells = [columns] + [[row[column] if isinstance(row[column], str)
+                          else f'{row[column]:.2f}' for column in columns]
+                         for row in rows]
+    widths = [max(len(line[i]) for line in cells)
+              for i in range(len(columns))]
+    return '\n'.join('  '.join(cell.rjust(width)
+                               for cell, width in zip(line, widths))
+                     for line in cells)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the prefix trees on synthetic corpora.')
+    parser.add_argument('--size', type=int, default=10000,
+                        help='number of items in each corpus')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='repeats per measurement (the median is kept)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--corpus', action='append', choices=list(CORPORA),
+                        help='corpus to run (default: all)')
+    parser.add_argument('--json', action='store_true',
+                        help='print the rows as JSON instead of a table')
+    args = parser.parse_args()
+
+    results = run_suite(args.size, args.repeat, args.seed,
+                        args.corpus or list(CORPORA))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(format_table(results))
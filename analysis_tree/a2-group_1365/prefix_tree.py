@@ -8,6 +8,12 @@ University of Toronto
 This file contains the design of a public interface (Autocompleter) and two
 implementation of this interface, SimplePrefixTree and CompressedPrefixTree.
 You'll complete both of these subclasses over the course of this assignment.
+A PrefixCursor follows a prefix typed into either tree one element at a time.
+A VersionedPrefixTree lets threads query either tree while one thread changes
+it, by path copying.
+Either tree can be frozen into a FrozenPrefixTree, a read-only snapshot for
+serving queries, which can be written to an index file and mapped back in as a
+MappedPrefixTree.
 
 As usual, be sure not to change any parts of the given *public interface* in the
 starter code---and this includes the instance attributes, which we will be
@@ -15,7 +21,17 @@ testing directly! You may, however, add new private attributes, methods, and
 top-level functions to this file.
 """
 from __future__ import annotations
-from typing import Any, List, Optional, Tuple
+from collections import OrderedDict
+import heapq
+import mmap
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, \
+    Sequence, Tuple, Union
 
 
 ################################################################################
@@ -24,6 +40,7 @@ from typing import Any, List, Optional, Tuple
 class Autocompleter:
     """An abstract class representing the Autocompleter Abstract Data Type.
     """
+    __slots__ = ()
 
     def __len__(self) -> int:
         """Return the number of values stored in this Autocompleter."""
@@ -60,11 +77,190 @@ class Autocompleter:
         """
         raise NotImplementedError
 
+    def iter_autocomplete(self, prefix: List) -> Iterator[Tuple[Any, float]]:
+        """Lazily yield every match for the given prefix.
+
+        The matches are yielded as tuples (value, weight), in non-increasing
+        weight, so the caller can stop as soon as it has seen enough.
+        This Autocompleter must not be changed while the iterator is in use.
+        """
+        raise NotImplementedError
+
+    def autocomplete_many(self, prefixes: List[List],
+                          limit: Optional[int] = None) -> List[
+                              List[Tuple[Any, float]]]:
+        """Return the result of autocomplete(prefix, limit) for every prefix
+        in <prefixes>, in the same order.
+
+        Precondition: limit is None or limit > 0.
+        """
+        return [self.autocomplete(prefix, limit) for prefix in prefixes]
+
+    def autocomplete_fuzzy(self, prefix: List, max_edits: int = 1,
+                           limit: Optional[int] = None) -> List[
+                               Tuple[Any, float, int]]:
+        """Return up to <limit> values whose prefix sequence starts with a
+        sequence within <max_edits> edits of <prefix>.
+
+        An edit inserts, deletes or replaces one prefix element. The return
+        value is a list of tuples (value, weight, edits), fewest edits first
+        and then in non-increasing weight. If limit is None, return *every*
+        such value.
+
+        Preconditions:
+            max_edits >= 0
+            limit is None or limit > 0
+        """
+        raise NotImplementedError
+
+    def set_stats(self, enabled: bool,
+                  callback: Optional[Callable[[List, Dict[str, int]],
+                                              None]] = None) -> None:
+        """Turn counting the work done by autocomplete on or off.
+
+        While it is on, every autocomplete call counts the nodes it visits,
+        the prefix elements it compares on the way down, the sorts it does
+        and the leaves it collects. The totals are read with stats_info, and
+        <callback>, if given, is called with the prefix and the counts of
+        each call. While it is off, autocomplete counts nothing.
+        """
+        raise NotImplementedError
+
+    def stats_info(self) -> Dict[str, Optional[int]]:
+        """Return the number of autocomplete calls counted since set_stats
+        turned counting on, and the totals of their counts (all None if
+        counting is off).
+        """
+        return _QueryStats.info(None)
+
+    def update_weight(self, value: Any, delta: float) -> None:
+        """Add <delta> to the weight of the given value, which is already in
+        this Autocompleter. <delta> may be negative.
+
+        Raise KeyError if the value is not in this Autocompleter, and
+        ValueError if its weight would not stay above 0.
+        """
+        raise NotImplementedError
+
     def remove(self, prefix: List) -> None:
         """Remove all values that match the given prefix.
         """
         raise NotImplementedError
 
+    def remove_value(self, value: Any) -> None:
+        """Remove the given value, and only that value, from this
+        Autocompleter.
+
+        Raise KeyError if the value is not in this Autocompleter.
+        """
+        raise NotImplementedError
+
+
+################################################################################
+# PrefixCursor
+################################################################################
+class PrefixCursor:
+    """A prefix typed into a prefix tree one element at a time.
+
+    The cursor remembers where each prefix of its prefix leads in the tree,
+    so extend and backspace take constant time instead of tracing the whole
+    prefix down from the root again, and autocomplete starts right there.
+    If the tree is changed, the cursor traces its prefix again the next time
+    it is used.
+
+    === Private Attributes ===
+    _tree:
+        The tree the prefix is typed into.
+    _prefix:
+        The prefix typed so far.
+    _positions:
+        _positions[i] is where the first i elements of _prefix lead in _tree,
+        as given by _tree._step, or None if no value has that prefix.
+    _generation:
+        The generation of _tree when _positions were traced.
+
+    >>> t = SimplePrefixTree('sum')
+    >>> t.insert("cat", 3, ["c", "a", "t"])
+    >>> t.insert("cow", 5, ["c", "o", "w"])
+    >>> cursor = t.cursor()
+    >>> cursor.extend("c")
+    >>> cursor.autocomplete(1)
+    [('cow', 5)]
+    >>> cursor.extend("a")
+    >>> cursor.autocomplete()
+    [('cat', 3)]
+    >>> cursor.backspace()
+    >>> cursor.extend("x")
+    >>> cursor.autocomplete()
+    []
+    >>> cursor.prefix
+    ['c', 'x']
+    """
+    __slots__ = ('_tree', '_prefix', '_positions', '_generation')
+    _tree: Union[SimplePrefixTree, CompressedPrefixTree, FrozenPrefixTree]
+    _prefix: List[Any]
+    _positions: List[Any]
+    _generation: int
+
+    def __init__(self, tree: Union[SimplePrefixTree, CompressedPrefixTree,
+                                   FrozenPrefixTree]) -> None:
+        """Initialize a cursor with an empty prefix into <tree>."""
+        self._tree = tree
+        self._prefix = []
+        self._positions = [tree._start()]
+        self._generation = tree._generation
+
+    @property
+    def prefix(self) -> List[Any]:
+        """The prefix typed so far."""
+        return list(self._prefix)
+
+    def extend(self, element: Any) -> None:
+        """Add <element> to the end of the prefix."""
+        self._retrace()
+        position = self._positions[-1]
+
+        if position is not None:
+            position = self._tree._step(position, element)
+        self._prefix.append(element)
+        self._positions.append(position)
+
+    def backspace(self) -> None:
+        """Remove the last element of the prefix, if there is one."""
+        if self._prefix:
+            self._prefix.pop()
+            self._positions.pop()
+
+    def autocomplete(self, limit: Optional[int] = None) -> List[
+            Tuple[Any, float]]:
+        """Return up to <limit> matches for the prefix, as the autocomplete
+        method of the tree does.
+
+        Precondition: limit is None or limit > 0.
+        """
+        self._retrace()
+        position = self._positions[-1]
+
+        if position is None:
+            return []
+        return self._tree._matches_at(position, self._prefix, limit)
+
+    def _retrace(self) -> None:
+        """
+        helper method tracing the prefix down the tree again if the tree has
+        changed since it was last traced
+        """
+        if self._generation == self._tree._generation:
+            return
+
+        position = self._tree._start()
+        self._positions = [position]
+        for element in self._prefix:
+            if position is not None:
+                position = self._tree._step(position, element)
+            self._positions.append(position)
+        self._generation = self._tree._generation
+
 
 ################################################################################
 # SimplePrefixTree (Tasks 1-3)
@@ -72,35 +268,857 @@ class Autocompleter:
 def _sort_auto_collection(lst: List[Tuple[Any, float]]) -> List[
         Tuple[Any, float]]:
     """
-    a helper function used to sort the subtrees in non-increasing order by
-    quick sort
+    a helper function used to sort the collected leaves in non-increasing
+    order of weight (with the built-in sort, which does not recurse)
+    """
+    return sorted(lst, key=lambda item: item[1], reverse=True)
+
+
+def _iter_best_first(tree: Union[SimplePrefixTree, CompressedPrefixTree]) \
+        -> Iterator[Tuple[Any, float]]:
+    """
+    a helper generator used to yield the leaves of <tree> as (value, weight),
+    heaviest first, by best-first search on each tree's max leaf weight
+    """
+    heap = [(-tree._max_weight, 0, tree)]
+    count = 0
+
+    while heap:
+        tree = heapq.heappop(heap)[2]
+
+        if tree.is_leaf():
+            yield tree.value, tree.weight
+        else:
+            for subtree in tree.subtrees:
+                count -= 1
+                heapq.heappush(heap, (-subtree._max_weight, count, subtree))
+
+
+def _step(position: Tuple[Union[SimplePrefixTree, CompressedPrefixTree], int],
+          element: Any) -> Optional[Tuple[Union[SimplePrefixTree,
+                                                CompressedPrefixTree], int]]:
+    """
+    a helper function returning the position, a pair (tree, depth), that the
+    prefix leading to <position> reaches with <element> added, or None
+    """
+    tree, depth = position
+
+    if depth < tree._depth:
+        if tree._value[depth] == element:
+            return tree, depth + 1
+        return None
+
+    subtree = tree._children.get(element)
+    if subtree is None:
+        return None
+    return subtree, depth + 1
+
+
+def _collect_matches(tree: Union[SimplePrefixTree, CompressedPrefixTree],
+                     limit: Optional[int]) -> List[Tuple[Any, float]]:
+    """
+    a helper function returning up to <limit> leaves of <tree> as
+    (value, weight) in non-increasing order of weight: every leaf sorted if
+    limit is None, else the first limit leaves of _iter_best_first
+    """
+    if limit is None:
+        return _sort_auto_collection(tree._limitless_leaf_collector())
+    return list(islice(_iter_best_first(tree), limit))
+
+
+def _autocomplete_many(tree: Union[SimplePrefixTree, CompressedPrefixTree,
+                                   FrozenPrefixTree],
+                       prefixes: List[List[Any]], limit: Optional[int]) \
+        -> List[List[Tuple[Any, float]]]:
+    """
+    a helper function answering autocomplete on <tree> for each of <prefixes>
+    with <limit>, walking shared path segments once and reusing nested matches
+    """
+    keys = [tuple(prefix) for prefix in prefixes]
+    trie = {}
+    for key in keys:
+        node = trie
+        for element in key:
+            node = node.setdefault(element, {})
+
+    wanted = set(keys)
+    found = []
+    stack = [(trie, (), tree._start())]
+    while stack:
+        node, key, position = stack.pop()
+        if key in wanted:
+            found.append((key, position))
+        for element, child in node.items():
+            if position is not None:
+                stack.append((child, key + (element,),
+                              tree._step(position, element)))
+            else:
+                stack.append((child, key + (element,), None))
+
+    # every prefix is found after the prefixes that it is nested under
+    results = {}
+    memo = {}
+    for key, position in reversed(found):
+        if position is None:
+            results[key] = []
+        else:
+            results[key] = tree._matches_reusing(position, limit, memo)
+
+    return [list(results[key]) for key in keys]
+
+
+def _collect_reusing(tree: Union[SimplePrefixTree, CompressedPrefixTree],
+                     limit: Optional[int],
+                     memo: Dict[Any, List[Tuple[Any, float]]]) -> List[
+                         Tuple[Any, float]]:
+    """
+    a helper function returning what _collect_matches does, taking the matches
+    of trees already in <memo> from there and recording memo[tree]
+    """
+    if limit is None:
+        lst = []
+        stack = [tree]
+        while stack:
+            subtree = stack.pop()
+
+            if subtree is not tree and subtree in memo:
+                lst.extend(memo[subtree])
+            elif subtree.is_leaf():
+                lst.append((subtree.value, subtree.weight))
+            else:
+                stack.extend(subtree.subtrees)
+        result = _sort_auto_collection(lst)
+    else:
+        result = list(islice(_iter_best_first_reusing(tree, memo), limit))
+
+    memo[tree] = result
+    return result
+
+
+def _iter_best_first_reusing(tree: Union[SimplePrefixTree,
+                                         CompressedPrefixTree],
+                             memo: Dict[Any, List[Tuple[Any, float]]]) \
+        -> Iterator[Tuple[Any, float]]:
+    """
+    a helper generator doing what _iter_best_first does, except that a tree
+    under <tree> that is in <memo> is replaced by its matches from there
+    instead of being searched
+    """
+    heap = [(-tree._max_weight, 0, tree, None)]
+    count = 0
+
+    while heap:
+        _, _, subtree, match = heapq.heappop(heap)
+
+        if subtree is None:
+            yield match
+        elif subtree.is_leaf():
+            yield subtree.value, subtree.weight
+        elif subtree is not tree and subtree in memo:
+            for match in memo[subtree]:
+                count -= 1
+                heapq.heappush(heap, (-match[1], count, None, match))
+        else:
+            for child in subtree.subtrees:
+                count -= 1
+                heapq.heappush(heap, (-child._max_weight, count, child, None))
+
+
+def _next_row(row: List[int], query: List[Any], element: Any) -> List[int]:
+    """
+    a helper function returning the edit distance row that follows <row>
+    when <element> is added to the prefix it was made for: entry j is the
+    fewest edits turning query[:j] into that prefix
+    """
+    new = [row[0] + 1]
+    for j in range(1, len(row)):
+        new.append(min(row[j] + 1, new[j - 1] + 1,
+                       row[j - 1] + (query[j - 1] != element)))
+    return new
+
+
+def _fuzzy_edge(row: List[int], best: int, query: List[Any],
+                elements: Iterable[Any], max_edits: int) -> Optional[
+                    Tuple[Optional[List[int]], int]]:
+    """
+    a helper function carrying the edit distance <row> and <best> along the
+    prefix <elements> of an edge: return None to prune it, (None, best) once
+    best is final and within <max_edits>, or else the new (row, best)
+    """
+    for element in elements:
+        row = _next_row(row, query, element)
+        best = min(best, row[-1])
+        lowest = min(row)
+
+        if lowest >= best:
+            return (None, best) if best <= max_edits else None
+        elif lowest > max_edits:
+            return None
+    return row, best
+
+
+def _iter_fuzzy(tree: Union[SimplePrefixTree, CompressedPrefixTree],
+                prefix: List[Any], max_edits: int) -> Iterator[
+                    Tuple[Any, float, int]]:
+    """
+    a helper generator used to yield (value, weight, edits) for every value of
+    <tree> within <max_edits> edits of <prefix>, fewest edits first and then
+    heaviest first, by best-first search
+    """
+    row = list(range(len(prefix) + 1))
+    best = len(prefix)
+    if best == 0:
+        row = None
+    heap = [(0, -tree._max_weight, 0, tree, row, best)]
+    count = 0
+
+    while heap:
+        _, _, _, tree, row, best = heapq.heappop(heap)
+
+        if tree._depth is None:
+            yield tree.value, tree.weight, best
+            continue
+
+        for subtree in tree.subtrees:
+            count -= 1
+            if subtree._depth is None:
+                if best <= max_edits:
+                    heapq.heappush(heap, (best, -subtree.weight, count,
+                                          subtree, None, best))
+                continue
+
+            state = (None, best) if row is None else _fuzzy_edge(
+                row, best, prefix, subtree._value[tree._depth:subtree._depth],
+                max_edits)
+            if state is not None:
+                key = state[1] if state[0] is None else min(state[0])
+                heapq.heappush(heap, (key, -subtree._max_weight, count,
+                                      subtree) + state)
+
+
+class _ResultCache:
+    """A bounded cache of autocomplete results, which drops the least
+    recently used result when it is full.
+
+    A result is stored with the tree its prefix led to and the generation of
+    that tree, and is only reused while the prefix leads to that same tree at
+    that same generation.
+
+    === Attributes ===
+    maxsize:
+        The number of results this cache holds at most.
+    hits:
+        The number of lookups answered from this cache.
+    misses:
+        The number of lookups that had to collect their result.
+    evictions:
+        The number of results dropped to make room for another.
+
+    === Private Attributes ===
+    _results:
+        Maps (prefix as a tuple, limit) to (tree, generation, result), least
+        recently used first.
+    """
+    __slots__ = ('maxsize', 'hits', 'misses', 'evictions', '_results')
+    maxsize: int
+    hits: int
+    misses: int
+    evictions: int
+    _results: OrderedDict
+
+    def __init__(self, maxsize: int) -> None:
+        """Initialize an empty cache of up to <maxsize> results.
+
+        Precondition: maxsize > 0
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._results = OrderedDict()
+
+    def lookup(self, prefix: List[Any], limit: Optional[int],
+               tree: Union[SimplePrefixTree, CompressedPrefixTree],
+               collect: Callable[..., List[Tuple[Any, float]]] =
+               _collect_matches) -> List[Tuple[Any, float]]:
+        """
+        return the result of autocomplete for <prefix> and <limit>, where
+        <tree> is the tree prefix leads to, from this cache if it holds a
+        result that is still fresh, else by collect(tree, limit) (and keep it)
+        """
+        key = (tuple(prefix), limit)
+        cached = self._results.get(key)
+
+        if cached is not None and cached[0] is tree and \
+                cached[1] == tree._generation:
+            self.hits += 1
+            self._results.move_to_end(key)
+            return list(cached[2])
+
+        self.misses += 1
+        result = collect(tree, limit)
+        self._results[key] = (tree, tree._generation, result)
+        self._results.move_to_end(key)
+
+        if len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+            self.evictions += 1
+        return list(result)
+
+    @staticmethod
+    def info(cache: Optional[_ResultCache]) -> Dict[str, Optional[int]]:
+        """
+        return the statistics of <cache> as a dictionary, all None if there
+        is no cache
+        """
+        if cache is None:
+            return dict.fromkeys(('hits', 'misses', 'evictions', 'maxsize',
+                                  'currsize'))
+        return {'hits': cache.hits, 'misses': cache.misses,
+                'evictions': cache.evictions, 'maxsize': cache.maxsize,
+                'currsize': len(cache._results)}
+
+
+class _QueryStats:
+    """The totals of the work done by the autocomplete calls on a tree that
+    has counting turned on (see Autocompleter.set_stats).
+
+    === Attributes ===
+    counts:
+        Maps every name in COUNTERS to its total over the calls so far:
+        the number of calls, the trees visited on the way down and while
+        collecting, the prefix elements compared on the way down (looking
+        one up in _children is one comparison), the sorts done and the
+        leaves collected.
+    callback:
+        Called with the prefix and the counts of every call, or None.
+    lock:
+        Held while the totals are added to or read, since the versions of a
+        VersionedPrefixTree share one _QueryStats across threads.
+    """
+    COUNTERS = ('calls', 'nodes_visited', 'comparisons', 'sorts',
+                'leaves_collected')
+    __slots__ = ('counts', 'callback', 'lock')
+    counts: Dict[str, int]
+    callback: Optional[Callable[[List, Dict[str, int]], None]]
+    lock: threading.Lock
+
+    def __init__(self, callback: Optional[Callable[[List, Dict[str, int]],
+                                                   None]]) -> None:
+        """Initialize totals of zero, reported call by call to <callback>.
+        """
+        self.counts = dict.fromkeys(_QueryStats.COUNTERS, 0)
+        self.callback = callback
+        self.lock = threading.Lock()
+
+    def record(self, prefix: List[Any], counts: Dict[str, int]) -> None:
+        """
+        add the <counts> of one autocomplete call for <prefix> to the totals,
+        and pass them on to the callback
+        """
+        counts['calls'] = 1
+        with self.lock:
+            for name, count in counts.items():
+                self.counts[name] += count
+
+        if self.callback is not None:
+            self.callback(prefix, counts)
+
+    @staticmethod
+    def info(stats: Optional[_QueryStats]) -> Dict[str, Optional[int]]:
+        """
+        return the totals of <stats> as a dictionary, all None if counting
+        is off
+        """
+        if stats is None:
+            return dict.fromkeys(_QueryStats.COUNTERS)
+        with stats.lock:
+            return dict(stats.counts)
+
+
+def _traced_autocomplete(tree: Union[SimplePrefixTree, CompressedPrefixTree],
+                         prefix: List[Any], limit: Optional[int]) -> List[
+                             Tuple[Any, float]]:
+    """
+    a helper function doing what autocomplete does on <tree>, while counting
+    its work for tree._stats
+    """
+    counts = dict.fromkeys(_QueryStats.COUNTERS, 0)
+    result = []
+
+    if not tree.is_empty():
+        initial_tree = tree._trace_initial_tree(prefix, counts)
+
+        if initial_tree is not None:
+            def collect(subtree: Union[SimplePrefixTree,
+                                       CompressedPrefixTree],
+                        at_most: Optional[int]) -> List[Tuple[Any, float]]:
+                return _traced_collect(subtree, at_most, counts)
+
+            if tree._cache is not None:
+                result = tree._cache.lookup(prefix, limit, initial_tree,
+                                            collect)
+            else:
+                result = collect(initial_tree, limit)
+
+    tree._stats.record(prefix, counts)
+    return result
+
+
+def _traced_collect(tree: Union[SimplePrefixTree, CompressedPrefixTree],
+                    limit: Optional[int], counts: Dict[str, int]) -> List[
+                        Tuple[Any, float]]:
+    """
+    a helper function returning what _collect_matches does, walking <tree>
+    the same way while adding the trees it visits, the sorts it does and the
+    leaves it collects to <counts>
+    """
+    if limit is None:
+        lst = []
+        stack = [tree]
+        while stack:
+            subtree = stack.pop()
+            counts['nodes_visited'] += 1
+
+            if subtree.is_leaf():
+                lst.append((subtree.value, subtree.weight))
+            else:
+                stack.extend(subtree.subtrees)
+
+        counts['sorts'] += 1
+        result = _sort_auto_collection(lst)
+    else:
+        result = []
+        heap = [(-tree._max_weight, 0, tree)]
+        count = 0
+        while heap and len(result) < limit:
+            subtree = heapq.heappop(heap)[2]
+            counts['nodes_visited'] += 1
+
+            if subtree.is_leaf():
+                result.append((subtree.value, subtree.weight))
+            else:
+                for child in subtree.subtrees:
+                    count -= 1
+                    heapq.heappush(heap, (-child._max_weight, count, child))
+
+    counts['leaves_collected'] += len(result)
+    return result
+
+
+def _reposition(subtrees: List[Union[SimplePrefixTree, CompressedPrefixTree]],
+                index: int) -> None:
+    """
+    a helper function used to move subtrees[index], whose weight just changed,
+    to its sorted place, recording the new index of every tree it moves
+    """
+    tree = subtrees[index]
+
+    while index > 0 and subtrees[index - 1].weight < tree.weight:
+        subtrees[index] = subtrees[index - 1]
+        subtrees[index]._sibling_index = index
+        index -= 1
+    while index < len(subtrees) - 1 and \
+            subtrees[index + 1].weight > tree.weight:
+        subtrees[index] = subtrees[index + 1]
+        subtrees[index]._sibling_index = index
+        index += 1
+
+    subtrees[index] = tree
+    tree._sibling_index = index
+
+
+def _find_position(subtrees: List[Union[SimplePrefixTree,
+                                        CompressedPrefixTree]],
+                   tree: Union[SimplePrefixTree, CompressedPrefixTree]) -> int:
+    """
+    a helper function returning the index of <tree> in <subtrees>, trying its
+    recorded index, the one before it (a sibling before it was taken out)
+    and the last one before scanning
     """
-    if len(lst) < 2:
-        return lst[:]
+    index = tree._sibling_index
+    if index < len(subtrees) and subtrees[index] is tree:
+        return index
+    elif 0 < index <= len(subtrees) and subtrees[index - 1] is tree:
+        index -= 1
+    elif subtrees[-1] is tree:
+        index = len(subtrees) - 1
     else:
-        pivot = lst[0][1]
-        smaller, bigger = _partition(lst[1:], pivot)
+        index = subtrees.index(tree)
+    tree._sibling_index = index
+    return index
+
+
+def _sort_dirty(tree: Union[SimplePrefixTree, CompressedPrefixTree]) -> None:
+    """
+    a helper function used to sort the subtrees of every dirty tree in <tree>,
+    skipping clean subtrees
+    """
+    stack = [tree]
+    while stack:
+        tree = stack.pop()
+
+        if tree._dirty:
+            tree._ensure_sorted()
+            stack.extend(tree._children.values())
+
+
+def _collapse_items(items: Iterable[Tuple[Any, float, List]]) -> Dict[
+        Tuple, List[Tuple[Any, float]]]:
+    """
+    a helper function used to collapse duplicate values in <items> by adding
+    up their weights, then group the resulting (value, weight) pairs by their
+    prefix sequence (as a tuple)
+    """
+    weights = {}
+    prefixes = {}
+    for value, weight, prefix in items:
+        if value in weights:
+            weights[value] += weight
+        else:
+            weights[value] = weight
+            prefixes[value] = tuple(prefix)
+
+    groups = {}
+    for value, weight in weights.items():
+        groups.setdefault(prefixes[value], []).append((value, weight))
+
+    return groups
+
+
+def _count_common(first: Sequence, second: Sequence) -> int:
+    """
+    a helper function used to return the length of the longest common prefix
+    of two prefix sequences
+    """
+    count = 0
+    for a, b in zip(first, second):
+        if a != b:
+            break
+        count += 1
+    return count
+
+
+def _build_bulk(tree: Union[SimplePrefixTree, CompressedPrefixTree],
+                groups: Dict[Tuple, List[Tuple[Any, float]]],
+                compressed: bool) -> None:
+    """
+    a helper function used to build the empty <tree> from <groups> in one pass
+    over their sorted prefixes, finishing each node once the walk leaves it;
+    if <compressed>, only the nodes that hold leaves or branch are made
+
+    a node on the stack keeps the running size, leaf weight total and max
+    leaf weight of what it holds so far in its own attributes; the work per
+    node is done inline, since there is a node per prefix element
+    """
+    if not groups:
+        return
+
+    create = tree._create_tree
+    average = tree.weight_type == 'average'
+    get_weight = type(tree)._get_weight
+    index = tree._index
+    stack = [tree]
+    previous = ()
+    for key in sorted(groups):
+        common = _count_common(previous, key)
+
+        while stack[-1]._depth > common:
+            node = stack.pop()
+            node.weight = node._sum / node._size if average else node._sum
+            if len(node.subtrees) > 1:
+                node.subtrees.sort(key=get_weight, reverse=True)
+                for position, subtree in enumerate(node.subtrees):
+                    subtree._sibling_index = position
+
+            parent = stack[-1]
+            if parent._depth < common:
+                parent = create(key, 0, common)
+                parent._size = 0
+                stack.append(parent)
+            parent.subtrees.append(node)
+            parent._children[node._value[parent._depth]] = node
+            parent._sum += node._sum
+            parent._size += node._size
+            if node._max_weight > parent._max_weight:
+                parent._max_weight = node._max_weight
+
+        if compressed:
+            depths = [len(key)] if len(key) > stack[-1]._depth else []
+        else:
+            depths = range(stack[-1]._depth + 1, len(key) + 1)
+        for depth in depths:
+            node = create(key, 0, depth)
+            node._size = 0
+            stack.append(node)
+
+        top = stack[-1]
+        subtrees = top.subtrees
+        for value, weight in groups[key]:
+            leaf = create(value, weight)
+            subtrees.append(leaf)
+            top._sum += weight
+            if weight > top._max_weight:
+                top._max_weight = weight
+            if index is not None:
+                index[value] = (top, leaf)
+        top._size += len(groups[key])
+        previous = key
+
+    while len(stack) > 1:
+        node = stack.pop()
+        _finish_bulk_node(node)
+        _add_bulk_node(stack[-1], node)
+
+    _finish_bulk_node(tree)
+
+
+def _add_bulk_node(parent: Union[SimplePrefixTree, CompressedPrefixTree],
+                   node: Union[SimplePrefixTree, CompressedPrefixTree]) \
+        -> None:
+    """
+    a helper function used to adopt the finished internal <node> into
+    <parent>, adding its running totals to those of parent (see _build_bulk)
+    """
+    parent._adopt(node)
+    parent._sum += node._sum
+    parent._size += node._size
+    if node._max_weight > parent._max_weight:
+        parent._max_weight = node._max_weight
+
+
+def _finish_bulk_node(tree: Union[SimplePrefixTree, CompressedPrefixTree]) \
+        -> None:
+    """
+    a helper function used to set the aggregate weight of an internal <tree>
+    from its running totals, and sort its subtrees (see _build_bulk)
+    """
+    tree.weight = _aggregate(tree, tree.weight_type)
+
+    if len(tree.subtrees) > 1:
+        tree.subtrees.sort(key=type(tree)._get_weight, reverse=True)
+        for index, subtree in enumerate(tree.subtrees):
+            subtree._sibling_index = index
+
+
+def _aggregate(tree: Union[SimplePrefixTree, CompressedPrefixTree],
+               weight_type: str) -> float:
+    """
+    a helper function returning the aggregate weight of <tree> under
+    <weight_type>, from its leaf weight total and its number of leaves;
+    neither drifts, since an average is never updated from an average
+    """
+    if tree._size == 0:
+        return 0
+    elif weight_type == 'average':
+        return tree._sum / tree._size
+    return tree._sum
+
+
+def _path_to(tree: Union[SimplePrefixTree, CompressedPrefixTree],
+             target: Union[SimplePrefixTree, CompressedPrefixTree]) -> List[
+                 Union[SimplePrefixTree, CompressedPrefixTree]]:
+    """
+    a helper function returning the trees on the way from <tree> down to
+    the non-leaf <target> under it, both included, by following the prefix
+    of target through _children
+    """
+    path = [tree]
+    while tree is not target:
+        tree = tree._children[target._value[tree._depth]]
+        path.append(tree)
+    return path
 
-        smaller_sorted = _sort_auto_collection(smaller)
-        bigger_sorted = _sort_auto_collection(bigger)
 
-        return bigger_sorted + [lst[0]] + smaller_sorted
+def _build_index(tree: Union[SimplePrefixTree, CompressedPrefixTree]) -> Dict[
+        Any, Tuple[Union[SimplePrefixTree, CompressedPrefixTree],
+                   Union[SimplePrefixTree, CompressedPrefixTree]]]:
+    """
+    a helper function returning the value index of <tree> (see _index):
+    every value under it mapped to (its parent, its leaf)
+    """
+    index = {}
+    stack = [tree]
+    while stack:
+        parent = stack.pop()
+
+        for subtree in parent.subtrees:
+            if subtree._depth is None:
+                index[subtree._value] = (parent, subtree)
+            else:
+                stack.append(subtree)
+    return index
+
+
+def _unindex(index: Dict[Any, Tuple[Any, Any]],
+             tree: Union[SimplePrefixTree, CompressedPrefixTree]) -> None:
+    """
+    a helper function dropping every value under <tree> from <index>
+    """
+    for value in _build_index(tree):
+        del index[value]
+
+
+def _update_weight(tree: Union[SimplePrefixTree, CompressedPrefixTree],
+                   value: Any, delta: float) -> None:
+    """
+    a helper function adding <delta> to the weight of the leaf of <value> in
+    the root <tree> and to every tree on the path down to it, moving each among
+    its siblings by _fix_order
+    """
+    if tree._index is None:
+        raise TypeError('this tree keeps no index of its values')
+
+    parent, leaf = tree._index[value]
+    if leaf.weight + delta <= 0:
+        raise ValueError(f'the weight of {value!r} must stay above 0')
+
+    old_max = leaf._max_weight
+    leaf.weight += delta
+    leaf._sum = leaf._max_weight = leaf.weight
+    changed = leaf
+
+    for ancestor in reversed(_path_to(tree, parent)):
+        ancestor._generation += 1
+        ancestor._add_weight(delta)
+        ancestor._fix_order(changed, tree._lazy)
+
+        previous = ancestor._max_weight
+        if changed._max_weight >= previous:
+            ancestor._max_weight = changed._max_weight
+        elif old_max == previous:
+            ancestor._max_weight = max(subtree._max_weight
+                                       for subtree in ancestor.subtrees)
+        old_max = previous
+        changed = ancestor
+
+
+def _remove_value(tree: Union[SimplePrefixTree, CompressedPrefixTree],
+                  value: Any) -> List[Union[SimplePrefixTree,
+                                            CompressedPrefixTree]]:
+    """
+    a helper function taking the leaf of <value> out of the root <tree> and out
+    of the totals of every tree on the path down to it, detaching the trees
+    left empty
+
+    return the trees on the path, from <tree> down
+    """
+    if tree._index is None:
+        raise TypeError('this tree keeps no index of its values')
+
+    parent, leaf = tree._index.pop(value)
+    del parent.subtrees[_find_position(parent.subtrees, leaf)]
+    weight = leaf.weight
+
+    path = _path_to(tree, parent)
+    pruned = None
+    changed = None
+    for ancestor in reversed(path):
+        ancestor._generation += 1
+        ancestor._size -= 1
+
+        if ancestor._size == 0:
+            pruned = ancestor
+            ancestor.weight = ancestor._sum = 0
+            continue
+        elif pruned is not None:
+            ancestor._detach(pruned)
+            pruned = None
+
+        ancestor._add_weight(-weight)
+
+        if weight >= ancestor._max_weight:
+            ancestor._max_weight = max(subtree._max_weight
+                                       for subtree in ancestor.subtrees)
+
+        if changed is not None:
+            ancestor._fix_order(changed, tree._lazy)
+        changed = ancestor
+
+    if pruned is not None:
+        # the last value was removed, so drop the emptied path as well
+        tree.subtrees = []
+        tree._children = {}
+        tree._max_weight = 0
+    return path
+
+
+def _flatten(tree: Union[SimplePrefixTree, CompressedPrefixTree]) -> List[
+        Tuple[Any, Optional[int], float, float, int, float, bool, int]]:
+    """
+    a helper function listing the trees in <tree> in preorder as flat records,
+    so pickle does not recurse once per level
+    """
+    records = []
+    stack = [tree]
 
+    while stack:
+        tree = stack.pop()
+        records.append((tree._value, tree._depth, tree.weight, tree._sum,
+                        tree._size, tree._max_weight, tree._dirty,
+                        len(tree.subtrees)))
+        stack.extend(reversed(tree.subtrees))
 
-def _partition(lst: List[Tuple[Any, float]], pivot: float) -> Tuple[
-        List[Tuple[Any, float]], List[Tuple[Any, float]]]:
+    return records
+
+
+def _unflatten(cls: type, weight_type: str, lazy: bool,
+               records: List[Tuple[Any, Optional[int], float, float, int,
+                                   float, bool, int]],
+               compact: Optional[bool] = None) \
+        -> Union[SimplePrefixTree, CompressedPrefixTree]:
     """
-    a helper function used to partition the list for quick sort
+    a helper function rebuilding the tree of class <cls> from the <records> of
+    _flatten, with <compact> set for a CompressedPrefixTree
     """
-    smaller = []
-    bigger = []
-    for item in lst:
-        if item[1] <= pivot:
-            smaller.append(item)
+    root = None
+    stack = []
+
+    for value, depth, weight, sum_, size, max_weight, dirty, count in \
+            records:
+        # every attribute is set here, so __init__ is skipped
+        tree = cls.__new__(cls)
+        tree.weight_type = weight_type
+        tree._value = value
+        tree._depth = depth
+        tree.weight = weight
+        tree.subtrees = []
+        tree._sum = sum_
+        tree._size = size
+        tree._children = {}
+        tree._lazy = False
+        tree._dirty = dirty
+        tree._max_weight = max_weight
+        tree._generation = 0
+        tree._cache = None
+        tree._stats = None
+        tree._index = None
+        tree._sibling_index = 0
+        if compact is not None:
+            tree._auto_compact = False
+
+        if not stack:
+            root = tree
+            root._lazy = lazy
+            root._index = {}
+            if compact is not None:
+                root._auto_compact = compact
         else:
-            bigger.append(item)
+            parent = stack[-1]
+            tree._sibling_index = len(parent[0].subtrees)
+            if depth is None:
+                parent[0].subtrees.append(tree)
+                root._index[value] = (parent[0], tree)
+            else:
+                parent[0]._adopt(tree)
+            parent[1] -= 1
+            if parent[1] == 0:
+                stack.pop()
 
-    return smaller, bigger
+        if count > 0:
+            stack.append([tree, count])
+
+    return root
 
 
 class SimplePrefixTree(Autocompleter):
@@ -147,12 +1165,72 @@ class SimplePrefixTree(Autocompleter):
       Note that this applies to both leaves and non-leaf subtrees:
       both can appear in the same self.subtrees list, and both have a `weight`
       attribute.
+
+    === Private Attributes ===
+    _value:
+        The value of a leaf. For any other tree, a prefix sequence (tuple)
+        shared with the other trees created along with it, of which
+        self.value is the first self._depth elements.
+    _depth:
+        None for a leaf, otherwise the length of self.value.
+    _size:
+        The number of values stored in this prefix tree.
+    _children:
+        The non-leaf subtrees of this prefix tree, keyed by the prefix element
+        that follows self.value on the way down to them. This holds exactly
+        the non-leaf trees in self.subtrees.
+    _lazy:
+        Whether insert and remove on this tree defer sorting subtrees.
+        (Only read on the tree they are called on.)
+    _dirty:
+        Whether a lazy mutation may have left self.subtrees out of order.
+    _max_weight:
+        The largest leaf weight in this prefix tree (the weight itself for a
+        leaf, 0 for an empty tree).
+    _generation:
+        Goes up by one whenever an insert or remove passes through this tree,
+        which tells a cached result for this tree that it is stale.
+    _cache:
+        The result cache turned on by set_result_cache, or None.
+        (Only read on the tree autocomplete is called on.)
+    _stats:
+        The totals of the work of autocomplete, while set_stats has counting
+        turned on, or None. (Only read on the tree autocomplete is called on.)
+    _index:
+        Maps every value in this tree to (the tree whose subtrees hold its
+        leaf, the leaf), so a value is found without walking the tree or
+        scanning leaves. None for any tree but the root, and for a root that
+        keeps no index (see VersionedPrefixTree).
+    _sum:
+        The total of the leaf weights in this prefix tree (the weight itself
+        for a leaf, 0 for an empty tree). With _size, it gives the aggregate
+        weight under either weight type (see aggregate_weight).
+    _sibling_index:
+        The index of this tree in its parent's subtrees when it was last
+        moved, so the tree is found there without a scan (see
+        _find_position).
     """
+    __slots__ = ('_value', '_depth', 'weight', 'subtrees', 'weight_type',
+                 '_size', '_children', '_lazy', '_dirty', '_max_weight',
+                 '_generation', '_cache', '_stats', '_index', '_sum',
+                 '_sibling_index')
     value: Any
     weight: float
     subtrees: List[SimplePrefixTree]
     weight_type: str
+    _value: Any
+    _depth: Optional[int]
     _size: int
+    _children: Dict[Any, SimplePrefixTree]
+    _lazy: bool
+    _dirty: bool
+    _max_weight: float
+    _generation: int
+    _cache: Optional[_ResultCache]
+    _stats: Optional[_QueryStats]
+    _index: Optional[Dict[Any, Tuple[Any, Any]]]
+    _sum: float
+    _sibling_index: int
 
     def __init__(self, weight_type: str) -> None:
         """Initialize an empty simple prefix tree.
@@ -166,8 +1244,42 @@ class SimplePrefixTree(Autocompleter):
         self.weight_type = weight_type
         self.weight = 0
         self.subtrees = []
-        self.value = []
+        self._value = ()
+        self._depth = 0
         self._size = 0
+        self._children = {}
+        self._lazy = False
+        self._dirty = False
+        self._max_weight = 0
+        self._generation = 0
+        self._cache = None
+        self._stats = None
+        self._index = {}
+        self._sum = 0
+        self._sibling_index = 0
+
+    @property
+    def value(self) -> Any:
+        """
+        the value of a leaf, or the common prefix of any other tree, rebuilt
+        as a list from the shared prefix sequence
+        """
+        if self._depth is None:
+            return self._value
+        return list(self._value[:self._depth])
+
+    @value.setter
+    def value(self, value: Any) -> None:
+        """
+        set the value of a leaf, or the prefix of any other tree, which gets
+        a prefix sequence of its own; only this tree changes, not its
+        subtrees, its parent's _children or the root's value index
+        """
+        if self._depth is None:
+            self._value = value
+        else:
+            self._value = tuple(value)
+            self._depth = len(self._value)
 
     def __len__(self) -> int:
         """
@@ -176,6 +1288,54 @@ class SimplePrefixTree(Autocompleter):
         """
         return self._size
 
+    def __reduce__(self) -> Tuple[Any, Tuple[Any, ...]]:
+        """
+        pickle this tree as its flat preorder records (see _flatten), so deep
+        trees do not run into the recursion limit
+
+        >>> import pickle
+        >>> t = SimplePrefixTree('average')
+        >>> t.insert("ca", 3, ["c", "a"])
+        >>> t.insert("cb", 5, ["c", "b"])
+        >>> copy = pickle.loads(pickle.dumps(t))
+        >>> str(copy) == str(t)
+        True
+        >>> copy.autocomplete(["c"])
+        [('cb', 5), ('ca', 3)]
+        """
+        return _unflatten, (SimplePrefixTree, self.weight_type, self._lazy,
+                            _flatten(self))
+
+    @classmethod
+    def from_items(cls, items: Iterable[Tuple[Any, float, List]],
+                   weight_type: str) -> SimplePrefixTree:
+        """
+        BULK-LOAD constructor for SimplePrefixTree
+        return a new tree holding every (value, weight, prefix) in <items>,
+        the same tree that inserting them one by one into an empty tree gives
+
+        duplicate values are collapsed first (their weights are added up),
+        then the tree is built bottom-up in one pass over the sorted
+        prefixes, sorting each subtrees list only once
+
+        Precondition: weight_type == 'sum' or weight_type == 'average'.
+                      Every value is hashable, and the elements of the
+                      prefixes can be compared with each other.
+
+        >>> t = SimplePrefixTree.from_items([("cb", 1, ["c", "b"]),
+        ...                                  ("ca", 2, ["c", "a"]),
+        ...                                  ("cb", 2, ["c", "b"])], 'sum')
+        >>> len(t)
+        2
+        >>> t.subtrees[0].subtrees[0].value
+        ['c', 'b']
+        >>> t.subtrees[0].subtrees[0].subtrees[0].weight
+        3
+        """
+        tree = cls(weight_type)
+        _build_bulk(tree, _collapse_items(items), False)
+        return tree
+
     def insert(self, value: Any, weight: float, prefix: List) -> None:
         """
         INSERT method for SimplePrefixTree
@@ -209,116 +1369,282 @@ class SimplePrefixTree(Autocompleter):
         ['c', 'b']
         """
         if self.is_empty():
+            self._generation += 1
             self._size += 1
-            self.weight = weight
-            self._do_insertion(1, prefix, value, weight)
+            self.weight = self._sum = weight
+            self._max_weight = weight
+            new = self._do_insertion(1, prefix, value, weight)
+            if self._index is not None:
+                self._index[value] = new
         else:
-            self._insert_helper(value, weight, prefix)
+            self._insert_helper(value, weight, prefix, self._lazy)
 
     def _insert_helper(self, value: Any, weight: float,
-                       prefix: List[Any]) -> bool:
+                       prefix: List[Any], lazy: bool) -> None:
         """
         INSERT while tree is not empty
-        loop through the subtrees list,
 
-        if subtree is a leaf, check whether value == subtree,
-        if True, simply add weight and redo the size increment then break out
+        walk down the prefix path by _children, keeping every tree on it in
+        path, until prefix ends or the next tree is missing
 
-        if subtree is a prefix, recursively do _insert_helper to trace down the
-        tree until there's no duplicate prefix path then break set found
+        if the path stops short, go down a level from its last tree and call
+        _do_insertion; otherwise call _insert_leaf on its last tree
 
-        if found is False, go down a level and call _do_insertion
-        update weight
+        then walk path back up, updating generation, size, weight and max
+        leaf weight of each tree, and restore the order of its subtrees by
+        _fix_order
         """
-        self._size += 1
-        found = False
-        is_dup = False
+        path = [self]
+        tree = self
 
-        for subtree in self.subtrees:
-            if subtree.is_leaf():
-                if subtree.value == value:
-                    subtree.weight += weight
-                    found = True
-                    is_dup = True
-                    self._size -= 1
-                    break
-                continue
-            elif subtree._is_subprefix(prefix):
+        while len(prefix) > tree._depth:
+            tree = tree._children.get(prefix[tree._depth])
 
-                if subtree._insert_helper(value, weight, prefix):
-                    self._size -= 1
-                    is_dup = True
-                found = True
+            if tree is None:
                 break
+            path.append(tree)
+
+        tree = path[-1]
+        if len(prefix) > tree._depth:
+            new = tree._do_insertion(tree._depth + 1, prefix, value, weight)
+            if self._index is not None:
+                self._index[value] = new
+            changed, is_dup = tree.subtrees[-1], False
+        else:
+            changed, is_dup = tree._insert_leaf(value, weight, self._index)
+
+        for tree in reversed(path):
+            tree._generation += 1
+            if not is_dup:
+                tree._size += 1
+            tree._add_weight(weight)
+            tree._fix_order(changed, lazy)
+            tree._max_weight = max(tree._max_weight, changed._max_weight)
+            changed = tree
+
+    def _insert_leaf(self, value: Any, weight: float,
+                     index: Optional[Dict[Any, Tuple[Any, Any]]]) -> Tuple[
+                         SimplePrefixTree, bool]:
+        """
+        add weight to the leaf of value, found by the root's value <index> or
+        among the leaves of this tree, or append a new one; return it and
+        whether it was already there
+        """
+        if index is not None:
+            entry = index.get(value)
+            if entry is not None:
+                subtree = entry[1]
+                subtree.weight += weight
+                subtree._sum = subtree._max_weight = subtree.weight
+                return subtree, True
+        else:
+            for subtree in self.subtrees:
+                if subtree.is_leaf() and subtree._value == value:
+                    subtree.weight += weight
+                    subtree._sum = subtree._max_weight = subtree.weight
+                    return subtree, True
 
-        if not found:
-            self._do_insertion(len(self.value) + 1, prefix, value,
-                               weight)
-
-        self._add_weight(weight, is_dup)
-        self.subtrees.sort(key=SimplePrefixTree._get_weight, reverse=True)
+        subtree = self._create_tree(value, weight)
+        self.subtrees.append(subtree)
+        if index is not None:
+            index[value] = (self, subtree)
+        return subtree, False
 
-        return is_dup
+    def _fix_order(self, subtree: SimplePrefixTree, lazy: bool) -> None:
+        """
+        helper method to move <subtree> to its place after its weight changed,
+        or if <lazy>, just mark this tree dirty
+        """
+        if lazy or self._dirty:
+            self._dirty = True
+        else:
+            _reposition(self.subtrees,
+                        _find_position(self.subtrees, subtree))
 
-    def _get_weight(self) -> float:
+    def _ensure_sorted(self) -> None:
         """
-        return weight
+        helper method to sort subtrees if a lazy mutation left them dirty
         """
-        return self.weight
+        if self._dirty:
+            self.subtrees.sort(key=SimplePrefixTree._get_weight, reverse=True)
+            self._dirty = False
 
-    def _add_weight(self, weight: float, same_size: bool) -> None:
+    def set_result_cache(self, maxsize: Optional[int]) -> None:
         """
-        update weight
-        if sum, simply increment
-        if average, calculate a new average after adding value
-        """
-        if self.weight_type == 'sum':
-            self.weight += weight
-        elif self.weight_type == 'average':
-            if same_size:
-                self.weight = (self.weight * len(self) + weight) / len(self)
-            else:
-                self.weight = ((self.weight * (len(self) - 1) + weight) / len(
-                    self))
+        keep the results of the last <maxsize> distinct autocomplete calls,
+        keyed by prefix and limit, or stop caching if maxsize is None
 
-    def _do_insertion(self, start: int, prefix: List[Any], value: Any,
-                      weight: float) -> None:
+        a result is reused only while its prefix leads to the same tree and
+        no insert or remove has passed through that tree since, so a
+        mutation only invalidates the results under the prefixes it touched.
+        turning the cache on again starts an empty one.
+
+        >>> t = SimplePrefixTree('sum')
+        >>> t.set_result_cache(2)
+        >>> t.insert("ca", 3, ["c", "a"])
+        >>> t.insert("db", 5, ["d", "b"])
+        >>> t.autocomplete(["c"])
+        [('ca', 3)]
+        >>> t.insert("dc", 1, ["d", "c"])
+        >>> t.autocomplete(["c"])
+        [('ca', 3)]
+        >>> t.cache_info()['hits']
+        1
+        """
+        self._cache = None if maxsize is None else _ResultCache(maxsize)
+
+    def cache_info(self) -> Dict[str, Optional[int]]:
+        """
+        return the statistics of the result cache: the number of hits,
+        misses and evictions, maxsize and the number of results held
+        (all None if the cache is off)
+        """
+        return _ResultCache.info(self._cache)
+
+    def set_stats(self, enabled: bool,
+                  callback: Optional[Callable[[List, Dict[str, int]],
+                                              None]] = None) -> None:
+        """
+        turn counting the work of autocomplete on or off (see
+        Autocompleter.set_stats); turning it on again starts from zero
+        while it is off, autocomplete only checks that it is off
+
+        >>> t = SimplePrefixTree('sum')
+        >>> t.insert("ca", 3, ["c", "a"])
+        >>> t.insert("cb", 5, ["c", "b"])
+        >>> t.set_stats(True)
+        >>> t.autocomplete(["c"], 1)
+        [('cb', 5)]
+        >>> info = t.stats_info()
+        >>> (info['nodes_visited'], info['comparisons'],
+        ...  info['leaves_collected'])
+        (5, 1, 1)
+        """
+        self._stats = _QueryStats(callback) if enabled else None
+
+    def stats_info(self) -> Dict[str, Optional[int]]:
+        """
+        return the totals counted by autocomplete (see
+        Autocompleter.stats_info)
+        """
+        return _QueryStats.info(self._stats)
+
+    def set_lazy_sorting(self, lazy: bool) -> None:
+        """
+        turn lazy sorting of subtrees on or off for insert and remove
+
+        with lazy sorting off (the default), a mutation moves only the subtree
+        whose weight changed to its new place at every level of its path.
+        with it on, a mutation only marks the trees on its path dirty, and a
+        dirty tree's subtrees are sorted the next time a query needs their
+        order, so write-heavy ingestion stops paying for sorts nobody reads.
+        (self.subtrees of a dirty tree is not sorted until then.)
+
+        turning lazy sorting off sorts every dirty tree right away.
+
+        >>> t = SimplePrefixTree('sum')
+        >>> t.set_lazy_sorting(True)
+        >>> t.insert("a", 1, ["a"])
+        >>> t.insert("b", 2, ["b"])
+        >>> t.autocomplete(["b"])
+        [('b', 2)]
+        >>> t.set_lazy_sorting(False)
+        >>> t.subtrees[0].value
+        ['b']
+        """
+        self._lazy = lazy
+
+        if not lazy:
+            _sort_dirty(self)
+
+    def _get_weight(self) -> float:
+        """
+        return weight
+        """
+        return self.weight
+
+    def _add_weight(self, weight: float) -> None:
         """
-        from root to the latest parent of value,
-        create prefix path by creating tree and appending them to its parent's
-        subtrees list and going down level
+        update weight
+        add weight to the leaf weight total, then find the aggregate weight
+        again from it and the (already updated) size by _aggregate
+        """
+        self._sum += weight
+        self.weight = _aggregate(self, self.weight_type)
 
-        finally append created tree containing value to its parent's subtrees
+    def _do_insertion(self, start: int, prefix: List[Any], value: Any,
+                      weight: float) -> Tuple[SimplePrefixTree,
+                                              SimplePrefixTree]:
+        """
+        create the prefix path from root to the latest parent of value, sharing
+        one copy of prefix, append the leaf of value to it and return both
         """
         cur_tree = self
+        shared = tuple(prefix)
 
         for k in range(start, len(prefix) + 1):
-            new_tree = self._create_tree(prefix[0:k], weight)
-            cur_tree.subtrees.append(new_tree)
+            new_tree = self._create_tree(shared, weight, k)
+            cur_tree._adopt(new_tree)
             cur_tree = new_tree
 
-        cur_tree.subtrees.append(self._create_tree(value, weight))
+        leaf = self._create_tree(value, weight)
+        cur_tree.subtrees.append(leaf)
+        return cur_tree, leaf
+
+    def _adopt(self, subtree: SimplePrefixTree) -> None:
+        """
+        helper method to append the non-leaf <subtree> to subtrees, indexing
+        it in _children
+        """
+        self.subtrees.append(subtree)
+        self._children[subtree._value[self._depth]] = subtree
+
+    def _detach(self, subtree: SimplePrefixTree) -> None:
+        """
+        helper method to take the non-leaf <subtree> out of subtrees, found by
+        _find_position, and _children
+        """
+        del self.subtrees[_find_position(self.subtrees, subtree)]
+        del self._children[subtree._value[self._depth]]
 
     def _is_subprefix(self, prefix: List[Any]) -> bool:
         """
         helper method to determine whether value is a sub-prefix of the prefix
         """
-        if len(prefix) < len(self.value):
+        if len(prefix) < self._depth:
             return False
 
-        for i in range(len(self.value)):
-            if self.value[i] != prefix[i]:
+        for i in range(self._depth):
+            if self._value[i] != prefix[i]:
                 return False
         return True
 
-    def _create_tree(self, value: Any, weight: float) -> SimplePrefixTree:
+    def _create_tree(self, value: Any, weight: float,
+                     depth: Optional[int] = None) -> SimplePrefixTree:
         """
         helper method to create a tree with simply given value and weight
+        if <depth> is given, the tree is not a leaf: <value> is a prefix
+        sequence (tuple) to share, whose first <depth> elements are its value
+        (every slot is set here instead of by __init__, since bulk-loading
+        creates a tree per value and per prefix)
         """
-        tree = SimplePrefixTree(self.weight_type)
-        tree.value = value
+        tree = SimplePrefixTree.__new__(SimplePrefixTree)
+        tree._value = value
+        tree._depth = depth
         tree.weight = weight
+        tree.subtrees = []
+        tree.weight_type = self.weight_type
         tree._size = 1
+        tree._children = {}
+        tree._lazy = False
+        tree._dirty = False
+        tree._max_weight = weight
+        tree._generation = 0
+        tree._cache = None
+        tree._stats = None
+        tree._index = None
+        tree._sum = weight
+        tree._sibling_index = 0
         return tree
 
     def autocomplete(self, prefix: List, limit: Optional[int] = None) -> \
@@ -326,10 +1652,12 @@ class SimplePrefixTree(Autocompleter):
         """
         AUTOCOMPLETE method
         from root, trace down prefix tree following the corresponding prefix
-        path update initial_tree which records current tree
+        path by _children, update initial_tree which records current tree
         after loop ended, collect leafs of current tree
-        if limitless, call _limitless_leaf_collector()
-        else call _limited_leaf_collector(limit) with limit
+        if limitless, call _limitless_leaf_collector() and sort
+        else take the first limit leaves of _iter_best_first, which finds the
+        heaviest leaves by their max leaf weight, already in order
+        (see _collect_matches); with the result cache on, ask it first
         >>> t = SimplePrefixTree('average')
         >>> t.insert("ca", 3, ["c", "a"])
         >>> t.insert("cb", 1, ["c", "b"])
@@ -337,91 +1665,266 @@ class SimplePrefixTree(Autocompleter):
         >>> t.insert("caa", 2, ["c", "a", "c"])
         >>> t.insert("cab", 4, ["c", "a", "d"])
         >>> t.autocomplete(["c"], None)
-        ['cbb', 'cb', 'cab', 'ca', 'caa']
+        [('cbb', 9999), ('cab', 4), ('ca', 3), ('caa', 2), ('cb', 1)]
         >>> t.autocomplete(["c"], 3)
-        ['cbb', 'cb', 'cab']
+        [('cbb', 9999), ('cab', 4), ('ca', 3)]
         >>> t.autocomplete(["d"], None)
         []
         >>> t.insert("app", 4000000, ["a", "p", "p"])
         >>> t.insert("ask", 1234, [])
         >>> t.autocomplete(["a"], 10)
-        ['app']
+        [('app', 4000000)]
         """
+        if self._stats is not None:
+            return _traced_autocomplete(self, prefix, limit)
+
         if self.is_empty():
             return []
 
-        initial_tree = self
+        initial_tree = self._find_initial_tree(prefix)
+
+        if initial_tree is None:
+            return []
 
-        for k in range(1, len(prefix) + 1):
-            lvl_prefix = prefix[0:k]
-            found = False
+        if self._cache is not None:
+            return self._cache.lookup(prefix, limit, initial_tree)
+        return _collect_matches(initial_tree, limit)
 
-            for subtree in initial_tree.subtrees:
-                if subtree.value == lvl_prefix:
-                    initial_tree = subtree
-                    found = True
-                    break
+    def iter_autocomplete(self, prefix: List) -> Iterator[Tuple[Any, float]]:
+        """
+        ITER_AUTOCOMPLETE method
+        lazily yield the matches for prefix as (value, weight) in
+        non-increasing order of weight, by _iter_best_first from the initial
+        tree, so nothing is collected or sorted up front
 
-            if not found:
-                return []
+        this tree must not be changed while the iterator is in use
 
-        if limit is None:
-            collected = initial_tree._limitless_leaf_collector()
-        else:
-            collected = initial_tree._limited_leaf_collector(limit)
+        >>> t = SimplePrefixTree('sum')
+        >>> t.insert("ca", 3, ["c", "a"])
+        >>> t.insert("cb", 5, ["c", "b"])
+        >>> matches = t.iter_autocomplete(["c"])
+        >>> next(matches)
+        ('cb', 5)
+        >>> list(matches)
+        [('ca', 3)]
+        """
+        if self.is_empty():
+            return
 
-        return _sort_auto_collection(collected)
+        initial_tree = self._find_initial_tree(prefix)
 
-    def _limitless_leaf_collector(self) -> List[Tuple[Any, float]]:
+        if initial_tree is not None:
+            yield from _iter_best_first(initial_tree)
+
+    def autocomplete_many(self, prefixes: List[List],
+                          limit: Optional[int] = None) -> List[
+                              List[Tuple[Any, float]]]:
+        """
+        AUTOCOMPLETE_MANY method
+        return the result of autocomplete(prefix, limit) for every prefix in
+        prefixes, in the same order, by _autocomplete_many: prefixes sharing
+        a path walk it once, and a prefix reuses the matches of the prefixes
+        nested under it (ties may be broken differently than by autocomplete)
+
+        >>> t = SimplePrefixTree('sum')
+        >>> t.insert("cat", 3, ["c", "a", "t"])
+        >>> t.insert("cow", 5, ["c", "o", "w"])
+        >>> t.autocomplete_many([["c", "a"], ["d"], ["c"]], 1)
+        [[('cat', 3)], [], [('cow', 5)]]
         """
-        helper method for limitless leaf collection
-        base case: if it's a leaf return tuple of value and weight
-        recursive step: for every subtree in current tree's subtrees, call
-        leaf collector
+        return _autocomplete_many(self, prefixes, limit)
 
-        overall, information about all leafs under the given very parent tree
-        is returned
+    def autocomplete_fuzzy(self, prefix: List, max_edits: int = 1,
+                           limit: Optional[int] = None) -> List[
+                               Tuple[Any, float, int]]:
         """
-        if self.is_leaf():
-            return [(self.value, self.weight)]
-        else:
-            lst = []
-            for subtree in self.subtrees:
-                lst.extend(subtree._limitless_leaf_collector())
+        AUTOCOMPLETE_FUZZY method
+        return up to limit (value, weight, edits) for the values whose prefix
+        starts with a sequence within max_edits edits of prefix, fewest edits
+        first, then heaviest: the first limit of _iter_fuzzy, which keeps an
+        edit distance row per tree and prunes a subtree as soon as no value
+        under it can be close enough
+
+        >>> t = SimplePrefixTree('sum')
+        >>> t.insert("frodo", 5, list("frodo"))
+        >>> t.insert("fred", 3, list("fred"))
+        >>> t.insert("sam", 4, list("sam"))
+        >>> t.autocomplete(list("frdo"))
+        []
+        >>> t.autocomplete_fuzzy(list("frdo"), 1)
+        [('frodo', 5, 1)]
+        >>> t.autocomplete_fuzzy(list("frdo"), 2)
+        [('frodo', 5, 1), ('fred', 3, 2)]
+        """
+        return list(islice(_iter_fuzzy(self, prefix, max_edits), limit))
 
-            return lst
+    def cursor(self) -> PrefixCursor:
+        """
+        return a cursor with an empty prefix into this tree, to type a prefix
+        into one element at a time (see PrefixCursor)
+        """
+        return PrefixCursor(self)
 
-    def _limited_leaf_collector(self, limit: int) -> List[Tuple[Any, float]]:
+    def _start(self) -> Tuple[SimplePrefixTree, int]:
         """
-        helper method for limitless leaf collection
-        base case: if it's a leaf return tuple of value and weight
-        recursive step: for every subtree in current tree's subtrees, call
-        leaf collector
+        helper method returning where the empty prefix leads, for PrefixCursor
+        """
+        return self, 0
 
-        overall, information about given limit number of leafs under the
-        given very parent tree is returned
+    def _step(self, position: Tuple[SimplePrefixTree, int],
+              element: Any) -> Optional[Tuple[SimplePrefixTree, int]]:
         """
-        if limit <= 0:
-            return []
-        elif self.is_leaf():
-            return [(self.value, self.weight)]
-        else:
-            lst = []
+        helper method returning where the prefix that led to <position> leads
+        once <element> is added, for PrefixCursor (see _step)
+        """
+        return _step(position, element)
 
-            for subtree in self.subtrees:
-                size = len(subtree)
+    def _matches_at(self, position: Tuple[SimplePrefixTree, int],
+                    prefix: List[Any], limit: Optional[int]) -> List[
+                        Tuple[Any, float]]:
+        """
+        helper method returning the result of autocomplete for <prefix> and
+        <limit>, where prefix leads to <position>, for PrefixCursor
+        """
+        if self._cache is not None:
+            return self._cache.lookup(prefix, limit, position[0])
+        return _collect_matches(position[0], limit)
+
+    def _matches_reusing(self, position: Tuple[SimplePrefixTree, int],
+                         limit: Optional[int],
+                         memo: Dict[Any, List[Tuple[Any, float]]]) -> List[
+                             Tuple[Any, float]]:
+        """
+        helper method returning the matches with <limit> at <position>, for
+        _autocomplete_many: from <memo> if they are already there, else by
+        _collect_reusing
+        """
+        tree = position[0]
 
-                if size > limit:
-                    lst.extend(subtree._limited_leaf_collector(limit))
-                    break
-                else:
-                    lst.extend(subtree._limitless_leaf_collector())
-                    limit -= size
+        if tree in memo:
+            return memo[tree]
+        return _collect_reusing(tree, limit, memo)
+
+    def _find_initial_tree(self, prefix: List[Any]) -> Optional[
+            SimplePrefixTree]:
+        """
+        helper method finding the initial tree by tracing down the prefix path
+        through _children, or None if the path is not in this tree
+        """
+        initial_tree = self
+
+        for element in prefix:
+            initial_tree = initial_tree._children.get(element)
+
+            if initial_tree is None:
+                return None
+
+        return initial_tree
+
+    def _trace_initial_tree(self, prefix: List[Any],
+                            counts: Dict[str, int]) -> Optional[
+                                SimplePrefixTree]:
+        """
+        helper method doing what _find_initial_tree does, adding the trees
+        it visits and the prefix elements it compares to <counts>
+        """
+        initial_tree = self
+        counts['nodes_visited'] += 1
+
+        for element in prefix:
+            counts['comparisons'] += 1
+            initial_tree = initial_tree._children.get(element)
+
+            if initial_tree is None:
+                return None
+            counts['nodes_visited'] += 1
+
+        return initial_tree
+
+    def _limitless_leaf_collector(self) -> List[Tuple[Any, float]]:
+        """
+        helper method for limitless leaf collection: walk this tree with an
+        explicit stack and return (value, weight) of every leaf under it
+        """
+        lst = []
+        stack = [self]
+
+        while stack:
+            tree = stack.pop()
 
-            return lst
+            if tree.is_leaf():
+                lst.append((tree.value, tree.weight))
+            else:
+                stack.extend(tree.subtrees)
+
+        return lst
+
+    def aggregate_weight(self, weight_type: Optional[str] = None) -> float:
+        """
+        return the aggregate weight of this tree under <weight_type> ('sum'
+        or 'average'), or under its own weight type if None, so one tree
+        gives both without being built twice; this is the same as weight
+        under its own weight type
+
+        the order of subtrees, and so which of two leaves of equal weight
+        comes first, is still that of this tree's own weight type; the
+        leaves autocomplete returns, found by their own weights, are the same
+        under either
+
+        >>> t = SimplePrefixTree('sum')
+        >>> t.insert("ca", 3, ["c", "a"])
+        >>> t.insert("cb", 4, ["c", "b"])
+        >>> t.aggregate_weight(), t.aggregate_weight('average')
+        (7, 3.5)
+        """
+        return _aggregate(self, weight_type or self.weight_type)
+
+    def update_weight(self, value: Any, delta: float) -> None:
+        """
+        UPDATE_WEIGHT method
+        add delta to the weight of value, found by the value index, and to
+        the aggregates of only the trees on its path (see _update_weight)
+        raise KeyError if value is not in this tree, ValueError if its
+        weight would not stay above 0
+
+        >>> t = SimplePrefixTree('sum')
+        >>> t.insert("ca", 3, ["c", "a"])
+        >>> t.insert("cb", 5, ["c", "b"])
+        >>> t.update_weight("ca", 4)
+        >>> t.autocomplete(["c"])
+        [('ca', 7), ('cb', 5)]
+        >>> t.weight
+        12
+        """
+        _update_weight(self, value, delta)
 
     def remove(self, prefix: List[Any]) -> None:
         """
+        REMOVE method
+        if empty, return
+        if is leaf, return
+
+        parent_tree: record latest parent tree
+        ancestors: record all trees down in the tracing prefix path
+        deleted_tree: store deleted tree
+
+        loop through prefix but the last element, going down one level by
+        _children and storing each tree into ancestors
+        then look up the last element in the parent's _children, and if found
+        remove the target from its parent
+
+        then update each ancestor's generation and size
+        find all zombie ancestors (ancestors with size 0
+        which means no leaf under it)
+        and set weight to 0
+        delete them from their parent's subtrees
+
+        update all legal ancestors' weight, by taking the deleted tree's leaf
+        weight total out of theirs, and their max leaf weight if the deleted
+        tree held it
+        fix the order of each ancestor's subtrees by _fix_order, since the
+        weight of the next tree down the prefix path changed
+
         >>> t = SimplePrefixTree('average')
         >>> t.insert("a", 1, ["a"])
         >>> t.insert("ab", 2, ["a", "b"])
@@ -437,87 +1940,195 @@ class SimplePrefixTree(Autocompleter):
         >>> t.remove(["a", "b"])
         >>> len(t)
         1
-        REMOVE method
-        if empty, return
-        if is leaf, return
-
-        parent_tree: record latest parent tree
-        ancestors: record all trees down in the tracing prefix path
-        deleted_tree: store deleted tree
-
-        outer loop through by slice of prefix
-        inner loop,
-        if found target, remove it from its parent's subtrees
-        if not found, store this parent into ancestor and going down one level
-
-        then update each ancestor's size
-        find all zombie ancestors (ancestors with size 0
-        which means no leaf under it)
-        and set weight to 0
-        delete them from their parent's subtrees
-
-        update all legal ancestors' weight
-        sort all trees involving prefix path again at each level
-        since change in subtrees may cause change in weight order
         """
         if self.is_empty():
             return
 
         if not prefix:
-            self.weight = 0
+            self._generation += 1
+            self.weight = self._sum = 0
             self.subtrees = []
-            self.value = []
+            self._value = ()
+            self._depth = 0
             self._size = 0
+            self._children = {}
+            self._max_weight = 0
+            if self._index is not None:
+                self._index.clear()
             return
 
         parent_tree = self
         ancestors = [self]
-        found = False
-        deleted_tree = None
 
-        for k in range(1, len(prefix) + 1):
-            lvl_prefix = prefix[0:k]
+        for element in prefix[:-1]:
+            parent_tree = parent_tree._children.get(element)
 
-            for subtree in parent_tree.subtrees:
-                if subtree.value == prefix:
-                    deleted_tree = subtree
-                    parent_tree.subtrees.remove(subtree)
-                    found = True
-                    break
+            if parent_tree is None:
+                return
+            ancestors.append(parent_tree)
 
-                if subtree.value == lvl_prefix:
-                    ancestors.append(subtree)
-                    parent_tree = subtree
-                    break
+        deleted_tree = parent_tree._children.get(prefix[-1])
 
-        if not found or deleted_tree is None:
+        if deleted_tree is None:
             return
+        parent_tree._detach(deleted_tree)
+        if self._index is not None:
+            _unindex(self._index, deleted_tree)
 
         zombie_ancestor = None
+        changed = None
         for ancestor in reversed(ancestors):
+            ancestor._generation += 1
             ancestor._size -= len(deleted_tree)
 
             if ancestor._size == 0:
                 zombie_ancestor = ancestor
-                ancestor.weight = 0
+                ancestor.weight = ancestor._sum = 0
                 continue
             else:
                 if zombie_ancestor is not None:
-                    ancestor.subtrees.remove(zombie_ancestor)
+                    ancestor._detach(zombie_ancestor)
                     zombie_ancestor = None
 
-            if self.weight_type == 'average':
-                sum_ = 0
-                count = 0
-                for subtree in ancestor.subtrees:
-                    sum_ += subtree.weight * len(subtree)
-                    count += len(subtree)
-                ancestor.weight = sum_ / count
-            elif self.weight_type == 'sum':
-                ancestor.weight -= deleted_tree.weight
+            ancestor._add_weight(-deleted_tree._sum)
+
+            if deleted_tree._max_weight >= ancestor._max_weight:
+                ancestor._max_weight = max(subtree._max_weight
+                                           for subtree in ancestor.subtrees)
+
+            if changed is not None:
+                ancestor._fix_order(changed, self._lazy)
+            changed = ancestor
+
+        if self.is_empty():
+            # every value was removed, so drop the zombie path as well
+            self.subtrees = []
+            self._children = {}
+            self._max_weight = 0
+
+    def remove_value(self, value: Any) -> None:
+        """
+        REMOVE_VALUE method
+        remove only the leaf of value, found by the value index, and update
+        only the trees on its path, pruning the ones it leaves empty (see
+        _remove_value)
+        raise KeyError if value is not in this tree
+
+        >>> t = SimplePrefixTree('sum')
+        >>> t.insert("ca", 3, ["c", "a"])
+        >>> t.insert("cab", 5, ["c", "a", "b"])
+        >>> t.insert("cb", 2, ["c", "b"])
+        >>> t.remove_value("cab")
+        >>> t.autocomplete(["c"])
+        [('ca', 3), ('cb', 2)]
+        >>> len(t), t.weight
+        (2, 5)
+        """
+        _remove_value(self, value)
+
+    def graft(self, other: SimplePrefixTree) -> None:
+        """
+        move every value of <other> into this tree, leaving other empty, by
+        adopting the subtrees of its root in one step; this root's size,
+        weights and max leaf weight are added to from each subtree adopted,
+        the way from_items does
+
+        Precondition: other has the same weight type as this tree, and no
+        value in other has an empty prefix or a prefix that begins with the
+        same element as the prefix of a value in this tree (as when the two
+        trees are built from items partitioned by their first prefix
+        element).
+
+        >>> t = SimplePrefixTree.from_items([("ab", 2, ["a", "b"])], 'average')
+        >>> part = SimplePrefixTree.from_items([("c", 4, ["c"])], 'average')
+        >>> t.graft(part)
+        >>> len(t), t.weight
+        (2, 3.0)
+        >>> t.autocomplete([])
+        [('c', 4), ('ab', 2)]
+        """
+        if self._index is not None:
+            self._index.update(other._index if other._index is not None
+                               else _build_index(other))
+        for subtree in other.subtrees:
+            _add_bulk_node(self, subtree)
+        other.remove([])
+
+        self._generation += 1
+        if self.subtrees:
+            _finish_bulk_node(self)
+
+    def to_compressed(self) -> CompressedPrefixTree:
+        """
+        return a CompressedPrefixTree holding the same values as this tree,
+        made in one pass over it instead of inserting every value again
+
+        a tree of this one becomes a tree of the new one only if it is the
+        root, holds leaves or branches; a chain of other trees is skipped
+        down to the first tree that is one, which keeps its shared prefix,
+        size, weights and (already sorted) order of subtrees
+
+        this tree is left unchanged
+
+        >>> t = SimplePrefixTree('sum')
+        >>> t.insert("abc", 2, ["a", "b", "c"])
+        >>> t.insert("abd", 3, ["a", "b", "d"])
+        >>> c = t.to_compressed()
+        >>> c.subtrees[0].value
+        ['a', 'b']
+        >>> c.autocomplete(["a"]) == t.autocomplete(["a"])
+        True
+        """
+        root = CompressedPrefixTree(self.weight_type)
+        root._copy_aggregates(self)
+        root._lazy = self._lazy
+        stack = [(self, root)]
+
+        while stack:
+            source, target = stack.pop()
+
+            for subtree in source.subtrees:
+                if subtree._depth is None:
+                    leaf = target._create_tree(subtree._value, subtree.weight)
+                    target.subtrees.append(leaf)
+                    root._index[subtree._value] = (target, leaf)
+                    continue
+
+                while len(subtree.subtrees) == 1 and \
+                        subtree.subtrees[0]._depth is not None:
+                    subtree = subtree.subtrees[0]
+                node = target._create_tree(subtree._value, 0, subtree._depth)
+                node._copy_aggregates(subtree)
+                target._adopt(node)
+                stack.append((subtree, node))
+
+        return root
+
+    def versioned(self) -> VersionedPrefixTree:
+        """
+        return a VersionedPrefixTree whose first version is a copy of this
+        tree, so one thread can change it while others query; this tree is
+        left as it is
+        """
+        return VersionedPrefixTree(self)
+
+    def freeze(self) -> FrozenPrefixTree:
+        """
+        return a read-only snapshot of this tree, stored in flat arrays
+        instead of one object per tree, that answers autocomplete the same way
+
+        the snapshot does not change when this tree does
 
-            ancestor.subtrees.sort(key=SimplePrefixTree._get_weight,
-                                   reverse=True)
+        >>> t = SimplePrefixTree('sum')
+        >>> t.insert("ca", 3, ["c", "a"])
+        >>> t.insert("cb", 5, ["c", "b"])
+        >>> frozen = t.freeze()
+        >>> len(frozen)
+        2
+        >>> frozen.autocomplete(["c"], 1)
+        [('cb', 5)]
+        """
+        return FrozenPrefixTree(self)
 
     def is_empty(self) -> bool:
         """Return whether this simple prefix tree is empty."""
@@ -541,11 +2152,17 @@ class SimplePrefixTree(Autocompleter):
         """
         if self.is_empty():
             return ''
-        else:
-            s = '  ' * depth + f'{self.value} ({self.weight})\n'
-            for subtree in self.subtrees:
-                s += subtree._str_indented(depth + 1)
-            return s
+
+        lines = []
+        stack = [(self, depth)]
+        while stack:
+            tree, level = stack.pop()
+            tree._ensure_sorted()
+            lines.append('  ' * level + f'{tree.value} ({tree.weight})\n')
+            stack.extend((subtree, level + 1)
+                         for subtree in reversed(tree.subtrees))
+
+        return ''.join(lines)
 
 
 ################################################################################
@@ -605,12 +2222,77 @@ class CompressedPrefixTree(Autocompleter):
       Note that this applies to both leaves and non-leaf subtrees:
       both can appear in the same self.subtrees list, and both have a `weight`
       attribute.
+
+    === Private Attributes ===
+    _value:
+        The value of a leaf. For any other tree, a prefix sequence (tuple)
+        shared with the other trees created along with it, of which
+        self.value is the first self._depth elements.
+    _depth:
+        None for a leaf, otherwise the length of self.value.
+    _size:
+        The number of values stored in this prefix tree.
+    _children:
+        The non-leaf subtrees of this prefix tree, keyed by the prefix element
+        that follows self.value on the way down to them. This holds exactly
+        the non-leaf trees in self.subtrees.
+    _lazy:
+        Whether insert and remove on this tree defer sorting subtrees.
+        (Only read on the tree they are called on.)
+    _dirty:
+        Whether a lazy mutation may have left self.subtrees out of order.
+    _max_weight:
+        The largest leaf weight in this prefix tree (the weight itself for a
+        leaf, 0 for an empty tree).
+    _generation:
+        Goes up by one whenever an insert or remove passes through this tree,
+        which tells a cached result for this tree that it is stale.
+    _cache:
+        The result cache turned on by set_result_cache, or None.
+        (Only read on the tree autocomplete is called on.)
+    _stats:
+        The totals of the work of autocomplete, while set_stats has counting
+        turned on, or None. (Only read on the tree autocomplete is called on.)
+    _index:
+        Maps every value in this tree to (the tree whose subtrees hold its
+        leaf, the leaf), so a value is found without walking the tree or
+        scanning leaves. None for any tree but the root, and for a root that
+        keeps no index (see VersionedPrefixTree).
+    _sum:
+        The total of the leaf weights in this prefix tree (the weight itself
+        for a leaf, 0 for an empty tree). With _size, it gives the aggregate
+        weight under either weight type (see aggregate_weight).
+    _sibling_index:
+        The index of this tree in its parent's subtrees when it was last
+        moved, so the tree is found there without a scan (see
+        _find_position).
+    _auto_compact:
+        Whether remove and remove_value on this tree lift out the tree they
+        leave compressible (see set_auto_compact). (Only read on the tree
+        they are called on.)
     """
+    __slots__ = ('_value', '_depth', 'weight', 'subtrees', 'weight_type',
+                 '_size', '_children', '_lazy', '_dirty', '_max_weight',
+                 '_generation', '_cache', '_stats', '_index', '_sum',
+                 '_sibling_index', '_auto_compact')
     value: Optional[Any]
     weight: float
     subtrees: List[CompressedPrefixTree]
     weight_type: str
+    _value: Any
+    _depth: Optional[int]
     _size: int
+    _children: Dict[Any, CompressedPrefixTree]
+    _lazy: bool
+    _dirty: bool
+    _max_weight: float
+    _generation: int
+    _cache: Optional[_ResultCache]
+    _stats: Optional[_QueryStats]
+    _index: Optional[Dict[Any, Tuple[Any, Any]]]
+    _sum: float
+    _sibling_index: int
+    _auto_compact: bool
 
     def __init__(self, weight_type: str) -> None:
         """Initialize an empty compressed prefix tree.
@@ -620,11 +2302,46 @@ class CompressedPrefixTree(Autocompleter):
         of non-leaf trees should be calculated (see the assignment handout
         for details).
         """
-        self.value = []
+        self._value = ()
+        self._depth = 0
         self.weight = 0
         self.subtrees = []
         self.weight_type = weight_type
         self._size = 0
+        self._children = {}
+        self._lazy = False
+        self._dirty = False
+        self._max_weight = 0
+        self._generation = 0
+        self._cache = None
+        self._stats = None
+        self._index = {}
+        self._sum = 0
+        self._sibling_index = 0
+        self._auto_compact = False
+
+    @property
+    def value(self) -> Any:
+        """
+        the value of a leaf, or the common prefix of any other tree, rebuilt
+        as a list from the shared prefix sequence
+        """
+        if self._depth is None:
+            return self._value
+        return list(self._value[:self._depth])
+
+    @value.setter
+    def value(self, value: Any) -> None:
+        """
+        set the value of a leaf, or the prefix of any other tree, which gets
+        a prefix sequence of its own; only this tree changes, not its
+        subtrees, its parent's _children or the root's value index
+        """
+        if self._depth is None:
+            self._value = value
+        else:
+            self._value = tuple(value)
+            self._depth = len(self._value)
 
     def __len__(self) -> int:
         """
@@ -632,6 +2349,61 @@ class CompressedPrefixTree(Autocompleter):
         """
         return self._size
 
+    def __reduce__(self) -> Tuple[Any, Tuple[Any, ...]]:
+        """
+        pickle this tree as its flat preorder records (see _flatten), so deep
+        trees do not run into the recursion limit
+
+        >>> import pickle
+        >>> t = CompressedPrefixTree('average')
+        >>> t.insert("ca", 3, ["c", "a"])
+        >>> t.insert("cb", 5, ["c", "b"])
+        >>> copy = pickle.loads(pickle.dumps(t))
+        >>> str(copy) == str(t)
+        True
+        >>> copy.autocomplete(["c"])
+        [('cb', 5), ('ca', 3)]
+        """
+        return _unflatten, (CompressedPrefixTree, self.weight_type, self._lazy,
+                            _flatten(self), self._auto_compact)
+
+    @classmethod
+    def from_items(cls, items: Iterable[Tuple[Any, float, List]],
+                   weight_type: str) -> CompressedPrefixTree:
+        """
+        BULK-LOAD constructor for CompressedPrefixTree
+        return a new tree holding every (value, weight, prefix) in <items>,
+        built bottom-up in one pass like SimplePrefixTree.from_items, but
+        only creating the nodes that hold leaves or branch, so no internal
+        value is compressible
+
+        Precondition: weight_type == 'sum' or weight_type == 'average'.
+                      Every value is hashable, and the elements of the
+                      prefixes can be compared with each other.
+
+        >>> t = CompressedPrefixTree.from_items([("cab", 1, ["c", "a", "b"]),
+        ...                                      ("cad", 3, ["c", "a", "d"])],
+        ...                                     'average')
+        >>> t.subtrees[0].value
+        ['c', 'a']
+        >>> t.subtrees[0].weight
+        2.0
+
+        a value given more than once adds up its weights, as repeated inserts
+        do, and the tree is the same as theirs
+
+        >>> items = [("cat", 1, ["c", "a", "t"]), ("car", 2, ["c", "a", "r"]),
+        ...          ("cat", 3, ["c", "a", "t"])]
+        >>> inserted = CompressedPrefixTree('sum')
+        >>> for value, weight, prefix in items:
+        ...     inserted.insert(value, weight, prefix)
+        >>> str(CompressedPrefixTree.from_items(items, 'sum')) == str(inserted)
+        True
+        """
+        tree = cls(weight_type)
+        _build_bulk(tree, _collapse_items(items), True)
+        return tree
+
     def insert(self, value: Any, weight: float, prefix: List) -> None:
         """
         INSERT method for SimplePrefixTree
@@ -640,56 +2412,185 @@ class CompressedPrefixTree(Autocompleter):
         else call _insert_helper to insert
         """
         if self.is_empty():
+            self._generation += 1
             self._size += 1
-            self.weight = weight
-            self._do_insertion(prefix, value, weight)
+            self.weight = self._sum = weight
+            self._max_weight = weight
+            new = self._do_insertion(prefix, value, weight)
+            if self._index is not None:
+                self._index[value] = new
         else:
-            self._insert_helper(value, weight, prefix)
+            self._insert_helper(value, weight, prefix, self._lazy)
 
     def _insert_helper(self, value: Any, weight: float,
-                       prefix: List[Any]) -> bool:
+                       prefix: List[Any], lazy: bool) -> None:
 
         """
         INSERT while tree is not empty
-        loop through the subtrees list,
 
-        if subtree is a leaf, check whether value == subtree,
-        if True, simply add weight and redo the size increment then break out
+        walk down the prefix path by _children, keeping every tree on it in
+        path, until prefix ends or the next tree is missing or its value is
+        not a sub-prefix of prefix
 
-        if subtree is a prefix, recursively do _insert_helper to trace down the
-        tree until there's no duplicate prefix path then break set found
+        if the path stops short, call _do_insertion on its last tree;
+        otherwise call _insert_leaf on its last tree
 
-        if found is False, go down a level and call _do_insertion
-        update weight
+        then walk path back up, updating generation, size, weight and max
+        leaf weight of each tree, and restore the order of its subtrees by
+        _fix_order
         """
-        self._size += 1
-        found = False
-        is_dup = False
+        path = [self]
+        tree = self
 
-        for subtree in self.subtrees:
-            if subtree.is_leaf():
-                if subtree.value == value:
-                    subtree.weight += weight
-                    found = True
-                    is_dup = True
-                    self._size -= 1
-                    break
-                continue
-            elif subtree._is_subprefix(prefix):
+        while len(prefix) > tree._depth:
+            tree = tree._children.get(prefix[tree._depth])
 
-                if subtree._insert_helper(value, weight, prefix):
-                    self._size -= 1
-                    is_dup = True
-                found = True
+            if tree is None or not tree._is_subprefix(prefix):
                 break
+            path.append(tree)
+
+        tree = path[-1]
+        if len(prefix) > tree._depth:
+            new = tree._do_insertion(prefix, value, weight)
+            if self._index is not None:
+                self._index[value] = new
+            changed, is_dup = tree.subtrees[-1], False
+        else:
+            changed, is_dup = tree._insert_leaf(value, weight, self._index)
+
+        for tree in reversed(path):
+            tree._generation += 1
+            if not is_dup:
+                tree._size += 1
+            tree._add_weight(weight)
+            tree._fix_order(changed, lazy)
+            tree._max_weight = max(tree._max_weight, changed._max_weight)
+            changed = tree
+
+    def _insert_leaf(self, value: Any, weight: float,
+                     index: Optional[Dict[Any, Tuple[Any, Any]]]) -> Tuple[
+                         CompressedPrefixTree, bool]:
+        """
+        add weight to the leaf of value, found by the root's value <index> or
+        among the leaves of this tree, or append a new one; return it and
+        whether it was already there
+        """
+        if index is not None:
+            entry = index.get(value)
+            if entry is not None:
+                subtree = entry[1]
+                subtree.weight += weight
+                subtree._sum = subtree._max_weight = subtree.weight
+                return subtree, True
+        else:
+            for subtree in self.subtrees:
+                if subtree.is_leaf() and subtree._value == value:
+                    subtree.weight += weight
+                    subtree._sum = subtree._max_weight = subtree.weight
+                    return subtree, True
+
+        subtree = self._create_tree(value, weight)
+        self.subtrees.append(subtree)
+        if index is not None:
+            index[value] = (self, subtree)
+        return subtree, False
+
+    def _fix_order(self, subtree: CompressedPrefixTree, lazy: bool) -> None:
+        """
+        helper method to move <subtree> to its place after its weight changed,
+        or if <lazy>, just mark this tree dirty
+        """
+        if lazy or self._dirty:
+            self._dirty = True
+        else:
+            _reposition(self.subtrees,
+                        _find_position(self.subtrees, subtree))
+
+    def _ensure_sorted(self) -> None:
+        """
+        helper method to sort subtrees if a lazy mutation left them dirty
+        """
+        if self._dirty:
+            self.subtrees.sort(key=CompressedPrefixTree._get_weight,
+                               reverse=True)
+            self._dirty = False
+
+    def set_result_cache(self, maxsize: Optional[int]) -> None:
+        """
+        keep the results of the last <maxsize> distinct autocomplete calls,
+        keyed by prefix and limit, or stop caching if maxsize is None
+
+        a result is reused only while its prefix leads to the same tree and
+        no insert or remove has passed through that tree since, so a
+        mutation only invalidates the results under the prefixes it touched.
+        turning the cache on again starts an empty one.
+
+        >>> t = CompressedPrefixTree('sum')
+        >>> t.set_result_cache(2)
+        >>> t.insert("ca", 3, ["c", "a"])
+        >>> t.insert("db", 5, ["d", "b"])
+        >>> t.autocomplete(["c"])
+        [('ca', 3)]
+        >>> t.insert("dc", 1, ["d", "c"])
+        >>> t.autocomplete(["c"])
+        [('ca', 3)]
+        >>> t.cache_info()['hits']
+        1
+        """
+        self._cache = None if maxsize is None else _ResultCache(maxsize)
+
+    def cache_info(self) -> Dict[str, Optional[int]]:
+        """
+        return the statistics of the result cache: the number of hits,
+        misses and evictions, maxsize and the number of results held
+        (all None if the cache is off)
+        """
+        return _ResultCache.info(self._cache)
+
+    def set_stats(self, enabled: bool,
+                  callback: Optional[Callable[[List, Dict[str, int]],
+                                              None]] = None) -> None:
+        """
+        turn counting the work of autocomplete on or off (see
+        Autocompleter.set_stats); turning it on again starts from zero
+        while it is off, autocomplete only checks that it is off
+        """
+        self._stats = _QueryStats(callback) if enabled else None
+
+    def stats_info(self) -> Dict[str, Optional[int]]:
+        """
+        return the totals counted by autocomplete (see
+        Autocompleter.stats_info)
+        """
+        return _QueryStats.info(self._stats)
+
+    def set_lazy_sorting(self, lazy: bool) -> None:
+        """
+        turn lazy sorting of subtrees on or off for insert and remove
+
+        with lazy sorting off (the default), a mutation moves only the subtree
+        whose weight changed to its new place at every level of its path.
+        with it on, a mutation only marks the trees on its path dirty, and a
+        dirty tree's subtrees are sorted the next time a query needs their
+        order, so write-heavy ingestion stops paying for sorts nobody reads.
+        (self.subtrees of a dirty tree is not sorted until then.)
 
-        if not found:
-            self._do_insertion(prefix, value, weight)
+        turning lazy sorting off sorts every dirty tree right away.
 
-        self._add_weight(weight, is_dup)
-        self.subtrees.sort(key=CompressedPrefixTree._get_weight, reverse=True)
+        >>> t = CompressedPrefixTree('sum')
+        >>> t.set_lazy_sorting(True)
+        >>> t.insert("a", 1, ["a"])
+        >>> t.insert("b", 2, ["b"])
+        >>> t.autocomplete(["b"])
+        [('b', 2)]
+        >>> t.set_lazy_sorting(False)
+        >>> t.subtrees[0].value
+        ['b']
+        """
+        self._lazy = lazy
 
-        return is_dup
+        if not lazy:
+            _sort_dirty(self)
 
     def _get_weight(self) -> float:
         """
@@ -697,95 +2598,142 @@ class CompressedPrefixTree(Autocompleter):
         """
         return self.weight
 
-    def _add_weight(self, weight: float, same_size: bool) -> float:
+    def _add_weight(self, weight: float) -> float:
         """
-        helper method to add weight according to weight_type
+        helper method to add weight to the leaf weight total, and find the
+        aggregate weight again by _aggregate
         """
-        if self.weight_type == 'sum':
-            self.weight += weight
-        elif self.weight_type == 'average':
-            if same_size:
-                self.weight = (self.weight * len(self) + weight) / len(self)
-            else:
-                self.weight = ((self.weight * (len(self) - 1) + weight) / len(
-                    self))
-
+        self._sum += weight
+        self.weight = _aggregate(self, self.weight_type)
         return self.weight
 
     def _do_insertion(self, prefix: List[Any], value: Any,
-                      weight: float) -> None:
-        """
-        compressed version of _do_insertion
-        ignore all the shared part by help of _count_share
-        """
-        for subtree in self.subtrees:
-            share = subtree._count_share(prefix)
-
-            if share > len(self.value):
-                new_pref = prefix[0:share]
-
-                if self.weight_type == 'average':
-                    new_weight = (subtree.weight *
-                                  (len(subtree) - 1) + weight) / len(subtree)
-                else:
-                    new_weight = subtree.weight + weight
-
-                new_parent = self._create_tree(new_pref, new_weight)
-                new_parent.subtrees.append(subtree)
-                self.subtrees.remove(subtree)
-                new_parent.subtrees.append(
-                    self._get_last_parent(prefix, value, weight))
-                new_parent._size += 1
-                self.subtrees.append(new_parent)
-                return
+                      weight: float) -> Tuple[CompressedPrefixTree,
+                                              CompressedPrefixTree]:
+        """
+        compressed version of _do_insertion: split the subtree sharing part of
+        prefix (see _count_share) under a new parent if needed, and return the
+        parent of the new leaf and the leaf
+        """
+        if len(prefix) == self._depth:
+            leaf = self._create_tree(value, weight)
+            self.subtrees.append(leaf)
+            return self, leaf
+
+        subtree = self._children.get(prefix[self._depth])
+
+        if subtree is None:
+            parent = self._get_last_parent(prefix, value, weight)
+            self._adopt(parent)
+            return parent, parent.subtrees[0]
+
+        share = subtree._count_share(prefix)
+
+        new_parent = self._create_tree(subtree._value, 0, share)
+        new_parent._size = len(subtree) + 1
+        new_parent._sum = subtree._sum
+        new_parent._add_weight(weight)
+        new_parent._max_weight = max(subtree._max_weight, weight)
+        # a dirty tree must stay under dirty ones, or _sort_dirty misses it
+        new_parent._dirty = subtree._dirty
+        self._detach(subtree)
+        new_parent._adopt(subtree)
+
+        if share == len(prefix):
+            parent = new_parent
+            parent.subtrees.append(self._create_tree(value, weight))
+        else:
+            parent = self._get_last_parent(prefix, value, weight)
+            new_parent._adopt(parent)
+        leaf = parent.subtrees[-1]
 
-        self.subtrees.append(self._get_last_parent(prefix, value, weight))
+        new_parent.subtrees.sort(key=CompressedPrefixTree._get_weight,
+                                 reverse=True)
+        self._adopt(new_parent)
+        return parent, leaf
 
     def _get_last_parent(self, prefix: List[Any], value: Any,
                          weight: float) -> CompressedPrefixTree:
         """
         helper method getting latest parent tree by create a same one by prefix
         """
-        parent = self._create_tree(prefix, weight)
+        parent = self._create_tree(tuple(prefix), weight, len(prefix))
         leaf = self._create_tree(value, weight)
         parent.subtrees.append(leaf)
         return parent
 
+    def _adopt(self, subtree: CompressedPrefixTree) -> None:
+        """
+        helper method to append the non-leaf <subtree> to subtrees, indexing
+        it in _children
+        """
+        self.subtrees.append(subtree)
+        self._children[subtree._value[self._depth]] = subtree
+
+    def _detach(self, subtree: CompressedPrefixTree) -> None:
+        """
+        helper method to take the non-leaf <subtree> out of subtrees, found by
+        _find_position, and _children
+        """
+        del self.subtrees[_find_position(self.subtrees, subtree)]
+        del self._children[subtree._value[self._depth]]
+
     def _count_share(self, prefix: List[Any]) -> int:
         """
         return the count of the length of shared part of prefix and value
         """
-        if len(self.value) < len(prefix):
-            return 0
+        return min(_count_common(self._value, prefix), self._depth)
 
-        count = 0
-        for i in range(len(prefix)):
-            if prefix[i] == self.value[i]:
-                count += 1
-            else:
-                break
-        return count
+    def _copy_aggregates(self, tree: SimplePrefixTree) -> None:
+        """
+        helper method to take the weight, leaf weight total, size, max leaf
+        weight and dirtiness of the non-leaf <tree> (see to_compressed)
+        """
+        self.weight = tree.weight
+        self._sum = tree._sum
+        self._size = tree._size
+        self._max_weight = tree._max_weight
+        self._dirty = tree._dirty
 
     def _is_subprefix(self, prefix: List[Any]) -> bool:
         """
         helper method determining sub-prefix relationship
         """
-        if len(prefix) < len(self.value):
+        if len(prefix) < self._depth:
             return False
 
-        for i in range(len(self.value)):
-            if self.value[i] != prefix[i]:
+        for i in range(self._depth):
+            if self._value[i] != prefix[i]:
                 return False
         return True
 
-    def _create_tree(self, value: Any, weight: float) -> CompressedPrefixTree:
+    def _create_tree(self, value: Any, weight: float,
+                     depth: Optional[int] = None) -> CompressedPrefixTree:
         """
         helper method to create a tree simply with given value and weight
+        if <depth> is given, the tree is not a leaf: <value> is a prefix
+        sequence (tuple) to share, whose first <depth> elements are its value
+        (every slot is set here instead of by __init__, since bulk-loading
+        creates a tree per value and per prefix)
         """
-        tree = CompressedPrefixTree(self.weight_type)
-        tree.value = value
+        tree = CompressedPrefixTree.__new__(CompressedPrefixTree)
+        tree._value = value
+        tree._depth = depth
         tree.weight = weight
+        tree.subtrees = []
+        tree.weight_type = self.weight_type
         tree._size = 1
+        tree._children = {}
+        tree._lazy = False
+        tree._dirty = False
+        tree._max_weight = weight
+        tree._generation = 0
+        tree._cache = None
+        tree._stats = None
+        tree._index = None
+        tree._sum = weight
+        tree._sibling_index = 0
+        tree._auto_compact = False
         return tree
 
     def autocomplete(self, prefix: List[Any], limit: Optional[int] = None) -> \
@@ -793,11 +2741,16 @@ class CompressedPrefixTree(Autocompleter):
         """
          AUTOCOMPLETE method
         from root, trace down prefix tree following the corresponding prefix
-        path update initial_tree which records current tree
+        path by _children, update initial_tree which records current tree
         after loop ended, collect leafs of current tree
-        if limitless, call _limitless_leaf_collector()
-        else call _limited_leaf_collector(limit) with limit
+        if limitless, call _limitless_leaf_collector() and sort
+        else take the first limit leaves of _iter_best_first, which finds the
+        heaviest leaves by their max leaf weight, already in order
+        (see _collect_matches); with the result cache on, ask it first
         """
+        if self._stats is not None:
+            return _traced_autocomplete(self, prefix, limit)
+
         if self.is_empty():
             return []
 
@@ -806,105 +2759,228 @@ class CompressedPrefixTree(Autocompleter):
         if initial_tree is None:
             return []
 
-        if limit is None:
-            collected = initial_tree._limitless_leaf_collector()
-        else:
-            collected = initial_tree._limited_leaf_collector(limit)
-
-        return _sort_auto_collection(collected)
+        if self._cache is not None:
+            return self._cache.lookup(prefix, limit, initial_tree)
+        return _collect_matches(initial_tree, limit)
 
-    def _find_initial_tree(self, prefix: List[Any]) -> Optional[
-            CompressedPrefixTree]:
-        """
-        helper method finding the initial tree
+    def iter_autocomplete(self, prefix: List) -> Iterator[Tuple[Any, float]]:
         """
-        for subtree in self.subtrees:
-            if subtree.is_leaf():
-                continue
+        ITER_AUTOCOMPLETE method
+        lazily yield the matches for prefix as (value, weight) in
+        non-increasing order of weight, by _iter_best_first from the initial
+        tree, so nothing is collected or sorted up front
 
-            if len(subtree.value) >= len(prefix) and _is_sublist(subtree.value,
-                                                                 prefix):
-                return subtree
-
-            elif len(subtree.value) < len(prefix) and \
-                    _is_sublist(prefix, subtree.value):
-                return subtree._find_initial_tree(prefix)
-
-        return None
+        this tree must not be changed while the iterator is in use
 
-    def _limitless_leaf_collector(self) -> List[Tuple[Any, float]]:
+        >>> t = CompressedPrefixTree('sum')
+        >>> t.insert("ca", 3, ["c", "a"])
+        >>> t.insert("cb", 5, ["c", "b"])
+        >>> matches = t.iter_autocomplete(["c"])
+        >>> next(matches)
+        ('cb', 5)
+        >>> list(matches)
+        [('ca', 3)]
         """
-        helper method for limitless leaf collection
-        base case: if it's a leaf return tuple of value and weight
-        recursive step: for every subtree in current tree's subtrees, call
-        leaf collector
+        if self.is_empty():
+            return
+
+        initial_tree = self._find_initial_tree(prefix)
+
+        if initial_tree is not None:
+            yield from _iter_best_first(initial_tree)
 
-        overall, information about all leafs under the
-        given very parent tree is returned
+    def autocomplete_many(self, prefixes: List[List],
+                          limit: Optional[int] = None) -> List[
+                              List[Tuple[Any, float]]]:
         """
-        if self.is_leaf():
-            return [(self.value, self.weight)]
-        else:
-            lst = []
-            for subtree in self.subtrees:
-                lst.extend(subtree._limitless_leaf_collector())
+        AUTOCOMPLETE_MANY method
+        return the result of autocomplete(prefix, limit) for every prefix in
+        prefixes, in the same order, by _autocomplete_many: prefixes sharing
+        a path walk it once, and a prefix reuses the matches of the prefixes
+        nested under it (ties may be broken differently than by autocomplete)
+
+        >>> t = CompressedPrefixTree('sum')
+        >>> t.insert("cat", 3, ["c", "a", "t"])
+        >>> t.insert("cow", 5, ["c", "o", "w"])
+        >>> t.autocomplete_many([["c", "a"], ["d"], ["c"]], 1)
+        [[('cat', 3)], [], [('cow', 5)]]
+        """
+        return _autocomplete_many(self, prefixes, limit)
 
-            return lst
+    def autocomplete_fuzzy(self, prefix: List, max_edits: int = 1,
+                           limit: Optional[int] = None) -> List[
+                               Tuple[Any, float, int]]:
+        """
+        AUTOCOMPLETE_FUZZY method
+        return up to limit (value, weight, edits) for the values whose prefix
+        starts with a sequence within max_edits edits of prefix, fewest edits
+        first, then heaviest: the first limit of _iter_fuzzy, which keeps an
+        edit distance row per tree and prunes a subtree as soon as no value
+        under it can be close enough
+        """
+        return list(islice(_iter_fuzzy(self, prefix, max_edits), limit))
 
-    def _limited_leaf_collector(self, limit: int) -> List[Tuple[Any, float]]:
+    def cursor(self) -> PrefixCursor:
+        """
+        return a cursor with an empty prefix into this tree, to type a prefix
+        into one element at a time (see PrefixCursor)
         """
-        helper method for limitless leaf collection
-        base case: if it's a leaf return tuple of value and weight
-        recursive step: for every subtree in current tree's subtrees, call
-        leaf collector
+        return PrefixCursor(self)
 
-        overall, information about given limit number of leafs under the
-        given very parent tree is returned
+    def _start(self) -> Tuple[CompressedPrefixTree, int]:
         """
-        if limit <= 0:
-            return []
-        elif self.is_leaf():
-            return [(self.value, self.weight)]
-        else:
-            lst = []
+        helper method returning where the empty prefix leads, for PrefixCursor
+        """
+        return self, 0
 
-            for subtree in self.subtrees:
-                size = len(subtree)
+    def _step(self, position: Tuple[CompressedPrefixTree, int],
+              element: Any) -> Optional[Tuple[CompressedPrefixTree, int]]:
+        """
+        helper method returning where the prefix that led to <position> leads
+        once <element> is added, for PrefixCursor (see _step)
+        """
+        return _step(position, element)
 
-                if size > limit:
-                    lst.extend(subtree._limited_leaf_collector(limit))
-                    break
-                else:
-                    lst.extend(subtree._limitless_leaf_collector())
-                    limit -= size
+    def _matches_at(self, position: Tuple[CompressedPrefixTree, int],
+                    prefix: List[Any], limit: Optional[int]) -> List[
+                        Tuple[Any, float]]:
+        """
+        helper method returning the result of autocomplete for <prefix> and
+        <limit>, where prefix leads to <position>, for PrefixCursor
+        """
+        if self._cache is not None:
+            return self._cache.lookup(prefix, limit, position[0])
+        return _collect_matches(position[0], limit)
+
+    def _matches_reusing(self, position: Tuple[CompressedPrefixTree, int],
+                         limit: Optional[int],
+                         memo: Dict[Any, List[Tuple[Any, float]]]) -> List[
+                             Tuple[Any, float]]:
+        """
+        helper method returning the matches with <limit> at <position>, for
+        _autocomplete_many: from <memo> if they are already there, else by
+        _collect_reusing
+        """
+        tree = position[0]
 
-            return lst
+        if tree in memo:
+            return memo[tree]
+        return _collect_reusing(tree, limit, memo)
 
-    def _get_deletion_info(self, prefix: List[Any]) -> Optional[Tuple[
-            List[CompressedPrefixTree], CompressedPrefixTree,
-            CompressedPrefixTree]]:
+    def _find_initial_tree(self, prefix: List[Any]) -> Optional[
+            CompressedPrefixTree]:
         """
-        get the deletion info
+        helper method finding the initial tree by tracing down the prefix path
+        through _children, or None if the path is not in this tree
         """
-        for subtree in self.subtrees:
-            if subtree.is_leaf():
-                continue
+        tree = self
 
-            if len(subtree.value) >= len(prefix) and _is_sublist(subtree.value,
-                                                                 prefix):
-                return [subtree], subtree, self
+        while len(prefix) > tree._depth:
+            subtree = tree._children.get(prefix[tree._depth])
 
-            elif len(subtree.value) < len(prefix) and \
-                    _is_sublist(prefix, subtree.value):
-                result = subtree._get_deletion_info(prefix)
+            if subtree is None:
+                return None
+            elif subtree._depth >= len(prefix):
+                if _is_sublist(subtree._value, prefix):
+                    return subtree
+                return None
+            elif not subtree._is_subprefix(prefix):
+                return None
+            tree = subtree
 
-                if result is None:
-                    return None
+        return tree
 
-                result[0].append(subtree)
-                return result[0], result[1], result[2]
+    def _trace_initial_tree(self, prefix: List[Any],
+                            counts: Dict[str, int]) -> Optional[
+                                CompressedPrefixTree]:
+        """
+        helper method doing what _find_initial_tree does, adding the trees
+        it visits and the prefix elements it compares to <counts>: a
+        candidate's value is compared up to its first mismatch with prefix
+        """
+        tree = self
+        counts['nodes_visited'] += 1
 
-        return None
+        while len(prefix) > tree._depth:
+            counts['comparisons'] += 1
+            subtree = tree._children.get(prefix[tree._depth])
+
+            if subtree is None:
+                return None
+            counts['nodes_visited'] += 1
+
+            length = min(subtree._depth, len(prefix))
+            common = _count_common(subtree._value, prefix)
+            counts['comparisons'] += min(common + 1, length)
+
+            if common < length:
+                return None
+            elif subtree._depth >= len(prefix):
+                return subtree
+            tree = subtree
+
+        return tree
+
+    def _limitless_leaf_collector(self) -> List[Tuple[Any, float]]:
+        """
+        helper method for limitless leaf collection: walk this tree with an
+        explicit stack and return (value, weight) of every leaf under it
+        """
+        lst = []
+        stack = [self]
+
+        while stack:
+            tree = stack.pop()
+
+            if tree.is_leaf():
+                lst.append((tree.value, tree.weight))
+            else:
+                stack.extend(tree.subtrees)
+
+        return lst
+
+    def _get_deletion_info(self, prefix: List[Any]) -> Optional[Tuple[
+            List[CompressedPrefixTree], CompressedPrefixTree]]:
+        """
+        get the deletion info: the trees on the prefix path from this tree down
+        to the parent of the deleted tree, and the deleted tree
+
+        Precondition: len(prefix) > len(self.value)
+        """
+        ancestors = [self]
+
+        while True:
+            tree = ancestors[-1]
+            subtree = tree._children.get(prefix[tree._depth])
+
+            if subtree is None:
+                return None
+            elif subtree._depth >= len(prefix):
+                if _is_sublist(subtree._value, prefix):
+                    return ancestors, subtree
+                return None
+            elif not subtree._is_subprefix(prefix):
+                return None
+            ancestors.append(subtree)
+
+    def aggregate_weight(self, weight_type: Optional[str] = None) -> float:
+        """
+        return the aggregate weight of this tree under <weight_type> ('sum'
+        or 'average'), or under its own weight type if None, so one tree
+        gives both without being built twice; this is the same as weight
+        under its own weight type
+        """
+        return _aggregate(self, weight_type or self.weight_type)
+
+    def update_weight(self, value: Any, delta: float) -> None:
+        """
+        UPDATE_WEIGHT method
+        add delta to the weight of value, found by the value index, and to
+        the aggregates of only the trees on its path (see _update_weight)
+        raise KeyError if value is not in this tree, ValueError if its
+        weight would not stay above 0
+        """
+        _update_weight(self, value, delta)
 
     def remove(self, prefix: List[Any]) -> None:
         """
@@ -912,33 +2988,41 @@ class CompressedPrefixTree(Autocompleter):
         if empty, return
         if is leaf, return
 
-        parent_tree: record latest parent tree
         ancestors: record all trees down in the tracing prefix path
         deleted_tree: store deleted tree
 
-        outer loop through by slice of prefix
-        inner loop,
-        if found target, remove it from its parent's subtrees
-        if not found, store this parent into ancestor and going down one level
+        trace down the prefix path by _children in _get_deletion_info,
+        then remove the target from its parent
 
-        then update each ancestor's size
+        then update each ancestor's generation and size
         find all zombie ancestors (ancestors with size 0
         which means no leaf under it)
         and set weight to 0
         delete them from their parent's subtrees
 
-        update all legal ancestors' weight
-        sort all trees involving prefix path again at each level
-        since change in subtrees may cause change in weight order
+        update all legal ancestors' weight, by taking the deleted tree's leaf
+        weight total out of theirs, and their max leaf weight if the deleted
+        tree held it
+        fix the order of each ancestor's subtrees by _fix_order, since the
+        weight of the next tree down the prefix path changed
+
+        with auto compaction on, lift out the ancestor left compressible, if
+        any (see _compact_path)
         """
         if self.is_empty():
             return
 
         if not prefix:
-            self.weight = 0
+            self._generation += 1
+            self.weight = self._sum = 0
             self.subtrees = []
-            self.value = None
+            self._value = ()
+            self._depth = 0
             self._size = 0
+            self._children = {}
+            self._max_weight = 0
+            if self._index is not None:
+                self._index.clear()
             return
 
         deletion_info = self._get_deletion_info(prefix)
@@ -946,36 +3030,199 @@ class CompressedPrefixTree(Autocompleter):
         if deletion_info is None:
             return
 
-        ancestors = [self] + deletion_info[0]
-        deleted_tree = deletion_info[1]
-
-        deletion_info[2].subtrees.remove(deletion_info[1])
+        ancestors, deleted_tree = deletion_info
+        ancestors[-1]._detach(deleted_tree)
+        if self._index is not None:
+            _unindex(self._index, deleted_tree)
 
         zombie_ancestor = None
+        changed = None
         for ancestor in reversed(ancestors):
+            ancestor._generation += 1
             ancestor._size -= len(deleted_tree)
 
             if ancestor._size == 0:
                 zombie_ancestor = ancestor
-                ancestor.weight = 0
+                ancestor.weight = ancestor._sum = 0
                 continue
             else:
                 if zombie_ancestor is not None:
-                    ancestor.subtrees.remove(zombie_ancestor)
+                    ancestor._detach(zombie_ancestor)
                     zombie_ancestor = None
 
-            if self.weight_type == 'average':
-                sum_ = 0
-                count = 0
-                for subtree in ancestor.subtrees:
-                    sum_ += subtree.weight * len(subtree)
-                    count += len(subtree)
-                ancestor.weight = sum_ / count
-            elif self.weight_type == 'sum':
-                ancestor.weight -= deleted_tree.weight
+            ancestor._add_weight(-deleted_tree._sum)
 
-            ancestor.subtrees.sort(key=CompressedPrefixTree._get_weight,
-                                   reverse=True)
+            if deleted_tree._max_weight >= ancestor._max_weight:
+                ancestor._max_weight = max(subtree._max_weight
+                                           for subtree in ancestor.subtrees)
+
+            if changed is not None:
+                ancestor._fix_order(changed, self._lazy)
+            changed = ancestor
+
+        if self.is_empty():
+            # every value was removed, so drop the zombie path as well
+            self.subtrees = []
+            self._children = {}
+            self._max_weight = 0
+        elif self._auto_compact:
+            self._compact_path(ancestors)
+
+    def remove_value(self, value: Any) -> None:
+        """
+        REMOVE_VALUE method
+        remove only the leaf of value, found by the value index, and update
+        only the trees on its path, pruning the ones it leaves empty (see
+        _remove_value)
+        raise KeyError if value is not in this tree
+        with auto compaction on, lift out the tree it left compressible, if
+        any (see _compact_path)
+        """
+        path = _remove_value(self, value)
+        if self._auto_compact and not self.is_empty():
+            self._compact_path(path)
+
+    def _compact_path(self, path: List[CompressedPrefixTree]) -> None:
+        """
+        helper method to lift out, by _lift, the deepest tree on <path> that
+        still holds values, the only one a removal can have left compressible
+        """
+        for i in range(len(path) - 1, 0, -1):
+            if len(path[i]) > 0:
+                path[i - 1]._lift(path[i])
+                return
+
+    def _lift(self, subtree: CompressedPrefixTree) -> int:
+        """
+        helper method to put the only subtree of the compressible <subtree> in
+        its place, for as long as that subtree is not a leaf
+
+        return the number of trees lifted out
+        """
+        count = 0
+        while len(subtree.subtrees) == 1 and \
+                subtree.subtrees[0]._depth is not None:
+            child = subtree.subtrees[0]
+            index = _find_position(self.subtrees, subtree)
+            self.subtrees[index] = child
+            child._sibling_index = index
+            self._children[child._value[self._depth]] = child
+            subtree = child
+            count += 1
+
+        if count:
+            self._generation += 1
+        return count
+
+    def compact(self) -> int:
+        """
+        COMPACT method
+        lift out every compressible tree in this tree (see _lift), which
+        remove leaves behind unless auto compaction is on, so that this tree
+        holds no compressible internal values again; return the number of
+        trees lifted out
+        every tree is visited once, in place, and none is created
+
+        >>> t = CompressedPrefixTree('sum')
+        >>> t.insert("a", 1, ["a"])
+        >>> t.insert("abc", 2, ["a", "b", "c"])
+        >>> t.insert("abd", 3, ["a", "b", "d"])
+        >>> t.remove(["a", "b", "d"])
+        >>> t.compact()
+        1
+        >>> t.subtrees[0].subtrees[0].value
+        ['a', 'b', 'c']
+        >>> t.compact()
+        0
+        """
+        count = 0
+        stack = [self]
+        while stack:
+            tree = stack.pop()
+
+            for subtree in list(tree._children.values()):
+                count += tree._lift(subtree)
+            stack.extend(tree._children.values())
+
+        if count:
+            self._generation += 1
+        return count
+
+    def set_auto_compact(self, enabled: bool) -> None:
+        """
+        turn auto compaction on or off for remove and remove_value
+
+        with it on, a removal lifts out the one tree it can leave
+        compressible, in constant time on top of the removal, so a tree that
+        sees many removals never grows back into an uncompressed one; with it
+        off (the default), compact does it for the whole tree when asked
+
+        turning auto compaction on compacts the tree right away.
+        """
+        self._auto_compact = enabled
+
+        if enabled:
+            self.compact()
+
+    def graft(self, other: CompressedPrefixTree) -> None:
+        """
+        move every value of <other> into this tree, leaving other empty, by
+        adopting the subtrees of its root in one step; this root's size,
+        weights and max leaf weight are added to from each subtree adopted,
+        the way from_items does
+
+        Precondition: other has the same weight type as this tree, and no
+        value in other has an empty prefix or a prefix that begins with the
+        same element as the prefix of a value in this tree (as when the two
+        trees are built from items partitioned by their first prefix
+        element).
+
+        >>> t = CompressedPrefixTree.from_items([("ab", 2, ["a", "b"])],
+        ...                                     'average')
+        >>> part = CompressedPrefixTree.from_items([("c", 4, ["c"])],
+        ...                                        'average')
+        >>> t.graft(part)
+        >>> len(t), t.weight
+        (2, 3.0)
+        >>> t.autocomplete([])
+        [('c', 4), ('ab', 2)]
+        """
+        if self._index is not None:
+            self._index.update(other._index if other._index is not None
+                               else _build_index(other))
+        for subtree in other.subtrees:
+            _add_bulk_node(self, subtree)
+        other.remove([])
+
+        self._generation += 1
+        if self.subtrees:
+            _finish_bulk_node(self)
+
+    def versioned(self) -> VersionedPrefixTree:
+        """
+        return a VersionedPrefixTree whose first version is a copy of this
+        tree, so one thread can change it while others query; this tree is
+        left as it is
+        """
+        return VersionedPrefixTree(self)
+
+    def freeze(self) -> FrozenPrefixTree:
+        """
+        return a read-only snapshot of this tree, stored in flat arrays
+        instead of one object per tree, that answers autocomplete the same way
+
+        the snapshot does not change when this tree does
+
+        >>> t = CompressedPrefixTree('sum')
+        >>> t.insert("ca", 3, ["c", "a"])
+        >>> t.insert("cb", 5, ["c", "b"])
+        >>> frozen = t.freeze()
+        >>> len(frozen)
+        2
+        >>> frozen.autocomplete(["c"], 1)
+        [('cb', 5)]
+        """
+        return FrozenPrefixTree(self)
 
     def is_empty(self) -> bool:
         """Return whether this compressed prefix tree is empty."""
@@ -999,11 +3246,1036 @@ class CompressedPrefixTree(Autocompleter):
         """
         if self.is_empty():
             return ''
+
+        lines = []
+        stack = [(self, depth)]
+        while stack:
+            tree, level = stack.pop()
+            tree._ensure_sorted()
+            lines.append('  ' * level + f'{tree.value} ({tree.weight})\n')
+            stack.extend((subtree, level + 1)
+                         for subtree in reversed(tree.subtrees))
+
+        return ''.join(lines)
+
+
+################################################################################
+# VersionedPrefixTree
+################################################################################
+def _copy_node(tree: Union[SimplePrefixTree, CompressedPrefixTree]) -> Union[
+        SimplePrefixTree, CompressedPrefixTree]:
+    """
+    a helper function returning a shallow copy of <tree>, with a list of
+    subtrees and a _children of its own (the subtrees themselves are shared)
+    """
+    copy = type(tree).__new__(type(tree))
+    for name in tree.__slots__:
+        setattr(copy, name, getattr(tree, name))
+    copy.subtrees = list(tree.subtrees)
+    copy._children = dict(tree._children)
+    return copy
+
+
+def _copy_path(tree: Union[SimplePrefixTree, CompressedPrefixTree],
+               prefix: List[Any]) -> Union[SimplePrefixTree,
+                                           CompressedPrefixTree]:
+    """
+    a helper function returning a copy of <tree> in which only the internal
+    trees on the path of <prefix> are fresh copies, sharing every other tree,
+    leaves included, with <tree>
+    """
+    root = _copy_node(tree)
+    root._index = None
+    node = root
+
+    while True:
+        if node._depth >= len(prefix):
+            return root
+
+        key = prefix[node._depth]
+        child = node._children.get(key)
+        if child is None or not child._is_subprefix(prefix):
+            return root
+
+        index = _find_position(node.subtrees, child)
+        copy = _copy_node(child)
+        node.subtrees[index] = copy
+        node._children[key] = copy
+        node = copy
+
+
+def _find_leaf(tree: Union[SimplePrefixTree, CompressedPrefixTree],
+               prefix: Tuple, value: Any) -> Tuple[
+                   Union[SimplePrefixTree, CompressedPrefixTree],
+                   Union[SimplePrefixTree, CompressedPrefixTree]]:
+    """
+    a helper function returning (parent, leaf) of <value>, whose prefix is
+    <prefix>, in <tree>, as the value index of tree would
+    """
+    parent = tree
+    while parent._depth < len(prefix):
+        parent = parent._children[prefix[parent._depth]]
+
+    for leaf in parent.subtrees:
+        if leaf._depth is None and leaf._value == value:
+            return parent, leaf
+    raise KeyError(value)
+
+
+class VersionedPrefixTree(Autocompleter):
+    """A SimplePrefixTree or CompressedPrefixTree that many threads can query
+    while a single thread inserts and removes.
+
+    Every version of the tree is left unchanged once it is published.
+    A writer copies the trees on the path that insert or remove changes,
+    makes the change to the copies, and publishes the new root by one
+    assignment; everything off the path is shared with the old version.
+    A reader queries whichever root it read, without taking a lock, so it
+    never sees a mutation half done (such as the zombie trees that remove
+    leaves for a moment), and it can keep a whole version with snapshot().
+
+    Calls to insert, remove, update_weight and remove_value must not
+    overlap; if more than one thread writes, they must take turns under a
+    lock of their own. Lazy sorting and the result cache are turned off,
+    since both change a tree while it is queried. The versions keep no value
+    index of their own, whose leaves would belong to one version; this tree
+    keeps the prefix of every value instead, which is the same in all.
+
+    === Private Attributes ===
+    _root:
+        The current version of the tree.
+    _index:
+        Maps every value in the current version to its prefix, as a tuple.
+
+    >>> t = SimplePrefixTree('sum').versioned()
+    >>> t.insert("cat", 3, ["c", "a", "t"])
+    >>> old = t.snapshot()
+    >>> t.insert("cow", 5, ["c", "o", "w"])
+    >>> t.autocomplete(["c"])
+    [('cow', 5), ('cat', 3)]
+    >>> old.autocomplete(["c"])
+    [('cat', 3)]
+    """
+    __slots__ = ('_root', '_index')
+    _root: Union[SimplePrefixTree, CompressedPrefixTree]
+    _index: Dict[Any, Tuple]
+
+    def __init__(self, tree: Union[SimplePrefixTree, CompressedPrefixTree]) \
+            -> None:
+        """Initialize a versioned tree whose first version is a copy of
+        <tree>, which is left unchanged.
+        """
+        compact = getattr(tree, '_auto_compact', None)
+        root = _unflatten(type(tree), tree.weight_type, False, _flatten(tree),
+                          compact)
+        _sort_dirty(root)
+        self._index = {value: tuple(parent._value[:parent._depth])
+                       for value, (parent, _) in root._index.items()}
+        root._index = None
+        self._root = root
+
+    def snapshot(self) -> Union[SimplePrefixTree, CompressedPrefixTree]:
+        """Return the current version of the tree, which never changes, so
+        that several queries can see the same one.
+
+        The version returned must only be queried, never changed.
+        """
+        return self._root
+
+    def __len__(self) -> int:
+        """Return the number of values stored in the current version."""
+        return len(self._root)
+
+    def insert(self, value: Any, weight: float, prefix: List) -> None:
+        """Insert the given value into a new version of the tree, as the
+        insert method of the tree does, and publish it.
+        """
+        if value in self._index:
+            root = self._copy_for(value)
         else:
-            s = '  ' * depth + f'{self.value} ({self.weight})\n'
-            for subtree in self.subtrees:
-                s += subtree._str_indented(depth + 1)
-            return s
+            root = _copy_path(self._root, prefix)
+        root.insert(value, weight, prefix)
+        root._index = None
+        self._index.setdefault(value, tuple(prefix))
+        self._root = root
+
+    def remove(self, prefix: List) -> None:
+        """Remove all values that match the given prefix from a new version
+        of the tree, and publish it.
+        """
+        for value, _ in self._root.iter_autocomplete(prefix):
+            del self._index[value]
+        root = _copy_path(self._root, prefix)
+        root.remove(prefix)
+        self._root = root
+
+    def update_weight(self, value: Any, delta: float) -> None:
+        """Add <delta> to the weight of the given value in a new version of
+        the tree, as the update_weight method of the tree does, and publish
+        it.
+        """
+        root = self._copy_for(value)
+        _update_weight(root, value, delta)
+        root._index = None
+        self._root = root
+
+    def remove_value(self, value: Any) -> None:
+        """Remove the given value from a new version of the tree, as the
+        remove_value method of the tree does, and publish it.
+        """
+        root = self._copy_for(value)
+        root.remove_value(value)
+        root._index = None
+        del self._index[value]
+        self._root = root
+
+    def _copy_for(self, value: Any) -> Union[SimplePrefixTree,
+                                             CompressedPrefixTree]:
+        """
+        helper method returning a copy of the path of <value> (see
+        _copy_path) and of its leaf, whose value index holds only value, or
+        raising KeyError if value is not in the current version
+        """
+        prefix = self._index[value]
+        root = _copy_path(self._root, list(prefix))
+        parent, leaf = _find_leaf(root, prefix, value)
+        copy = _copy_node(leaf)
+        parent.subtrees[_find_position(parent.subtrees, leaf)] = copy
+        root._index = {value: (parent, copy)}
+        return root
+
+    def autocomplete(self, prefix: List,
+                     limit: Optional[int] = None) -> List[Tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix in the current
+        version.
+
+        Precondition: limit is None or limit > 0.
+        """
+        return self._root.autocomplete(prefix, limit)
+
+    def iter_autocomplete(self, prefix: List) -> Iterator[Tuple[Any, float]]:
+        """Lazily yield every match for the given prefix in the version that
+        is current when the iteration starts, which may go on while new
+        versions are published.
+        """
+        return self._root.iter_autocomplete(prefix)
+
+    def autocomplete_many(self, prefixes: List[List],
+                          limit: Optional[int] = None) -> List[
+                              List[Tuple[Any, float]]]:
+        """Return the result of autocomplete(prefix, limit) for every prefix
+        in <prefixes>, in the same order, all from the same version.
+
+        Precondition: limit is None or limit > 0.
+        """
+        return self._root.autocomplete_many(prefixes, limit)
+
+    def autocomplete_fuzzy(self, prefix: List, max_edits: int = 1,
+                           limit: Optional[int] = None) -> List[
+                               Tuple[Any, float, int]]:
+        """Return the result of autocomplete_fuzzy in the current version.
+
+        Preconditions:
+            max_edits >= 0
+            limit is None or limit > 0
+        """
+        return self._root.autocomplete_fuzzy(prefix, max_edits, limit)
+
+    def set_stats(self, enabled: bool,
+                  callback: Optional[Callable[[List, Dict[str, int]],
+                                              None]] = None) -> None:
+        """Turn counting the work of autocomplete on or off, for the current
+        version and every version published after it (see
+        Autocompleter.set_stats).
+
+        All of these versions share one set of totals, so a reader still
+        holding an older version adds to the same totals as the newest one;
+        the totals are updated under a lock.
+        """
+        self._root.set_stats(enabled, callback)
+
+    def stats_info(self) -> Dict[str, Optional[int]]:
+        """Return the totals counted by autocomplete (see
+        Autocompleter.stats_info).
+        """
+        return self._root.stats_info()
+
+
+################################################################################
+# FrozenPrefixTree
+################################################################################
+def _collect_labels(tree: Union[SimplePrefixTree, CompressedPrefixTree]) \
+        -> List[Any]:
+    """
+    a helper function returning every distinct prefix element in <tree>, in
+    the order they are first found
+    """
+    labels = {}
+    stack = [tree]
+
+    while stack:
+        tree = stack.pop()
+        for subtree in tree.subtrees:
+            if not subtree.is_leaf():
+                labels.update(dict.fromkeys(
+                    subtree._value[tree._depth:subtree._depth]))
+                stack.append(subtree)
+
+    return list(labels)
+
+
+def _chain_end(tree: Union[SimplePrefixTree, CompressedPrefixTree]) -> Union[
+        SimplePrefixTree, CompressedPrefixTree]:
+    """
+    a helper function following <tree> down while it has exactly one subtree
+    and that subtree is not a leaf, returning the last tree reached
+    """
+    while len(tree.subtrees) == 1 and not tree.subtrees[0].is_leaf():
+        tree = tree.subtrees[0]
+    return tree
+
+
+class FrozenPrefixTree(Autocompleter):
+    """A read-only snapshot of a SimplePrefixTree or CompressedPrefixTree,
+    made by their freeze() method and stored as flat arrays.
+
+    The trees of the source that are not leaves become nodes numbered
+    breadth-first from the root (node 0), so the children of every node are
+    numbered consecutively; they are ordered by the label id of the first
+    prefix element on their edge, which lets a query find a child by
+    bisection. Label ids follow the sorted order of the labels whenever
+    they can be sorted. Each node keeps the leaves of its own prefix in one
+    range, heaviest first. Each array of weights holds integers if every
+    weight in it is one (as in a 'sum' tree of integer weights), and floats
+    otherwise, so a snapshot returns the weights its source would.
+
+    A chain of trees without leaves of their own, each with one subtree,
+    becomes a single node with a longer edge, the way CompressedPrefixTree
+    does it, so a SimplePrefixTree and a CompressedPrefixTree holding the
+    same values give the same snapshot.
+
+    === Attributes ===
+    weight_type:
+        The weight type of the tree this snapshot was taken from.
+
+    === Private Attributes ===
+    _label_ids:
+        Maps every prefix element in the snapshot to its label id.
+    _child_start:
+        The children of node i are the nodes from _child_start[i] up to
+        (not including) _child_start[i + 1].
+    _edge_start:
+        The label ids on the edge from its parent to node i are
+        _edge_labels[_edge_start[i]:_edge_start[i + 1]]. (The root has
+        an empty edge.)
+    _edge_labels:
+        The label ids of every edge, in node order.
+    _first_labels:
+        The first label id on the edge to node i, or -1 for the root.
+    _weights:
+        The weight of the tree node i was made from.
+    _max_weights:
+        The largest leaf weight under node i.
+    _sizes:
+        The number of leaves under node i.
+    _leaf_start:
+        The leaves of node i are leaves _leaf_start[i] up to (not including)
+        _leaf_start[i + 1].
+    _leaf_weights:
+        The weight of each leaf.
+    _values:
+        The value of each leaf. Values are distinct, so the index of a leaf
+        is also the id of its value.
+    _stats:
+        The totals of the work of autocomplete, while set_stats has counting
+        turned on, or None.
+    """
+    __slots__ = ('weight_type', '_label_ids', '_child_start', '_edge_start',
+                 '_edge_labels', '_first_labels', '_weights', '_max_weights',
+                 '_sizes', '_leaf_start', '_leaf_weights', '_values',
+                 '_stats')
+    weight_type: str
+    _label_ids: Dict[Any, int]
+    _child_start: array
+    _edge_start: array
+    _edge_labels: array
+    _first_labels: array
+    _weights: array
+    _max_weights: array
+    _sizes: array
+    _leaf_start: array
+    _leaf_weights: array
+    _values: List[Any]
+    _stats: Optional[_QueryStats]
+    # a snapshot never changes, so its generation is always the same
+    _generation = 0
+
+    def __init__(self, tree: Union[SimplePrefixTree, CompressedPrefixTree]) \
+            -> None:
+        """Take a snapshot of <tree>, which is left unchanged.
+        """
+        self.weight_type = tree.weight_type
+        labels = _collect_labels(tree)
+        try:
+            labels.sort()
+        except TypeError:
+            pass  # labels that cannot be compared keep the order found
+        self._label_ids = {label: i for i, label in enumerate(labels)}
+        self._child_start = array('q')
+        self._edge_start = array('q')
+        self._edge_labels = array('q')
+        self._first_labels = array('q')
+        self._weights = []
+        self._max_weights = []
+        self._sizes = array('q')
+        self._leaf_start = array('q')
+        self._leaf_weights = []
+        self._values = []
+        self._stats = None
+
+        queue = [(tree, 0)]
+        for tree, parent_depth in queue:
+            self._add_node(tree, parent_depth, len(queue))
+            queue.extend((subtree, tree._depth)
+                         for subtree in self._order_children(tree))
+
+        self._child_start.append(len(queue))
+        self._edge_start.append(len(self._edge_labels))
+        self._leaf_start.append(len(self._values))
+        self._weights = _weight_array(self._weights)
+        self._max_weights = _weight_array(self._max_weights)
+        self._leaf_weights = _weight_array(self._leaf_weights)
+
+    def _order_children(self, tree: Union[SimplePrefixTree,
+                                          CompressedPrefixTree]) \
+            -> List[Union[SimplePrefixTree, CompressedPrefixTree]]:
+        """
+        helper method returning the trees that become the children of <tree>:
+        its subtrees that are not leaves, each followed down to the end of its
+        chain, ordered by the label id of the first element of their edge
+        """
+        children = [(self._label_ids[subtree._value[tree._depth]],
+                     _chain_end(subtree))
+                    for subtree in tree.subtrees if not subtree.is_leaf()]
+        children.sort(key=lambda child: child[0])
+        return [subtree for _, subtree in children]
+
+    def _add_node(self, tree: Union[SimplePrefixTree, CompressedPrefixTree],
+                  parent_depth: int, child_start: int) -> None:
+        """
+        helper method appending <tree> as the next node, whose children will
+        be numbered from <child_start>, and its own leaves
+        """
+        edge = [self._label_ids[label]
+                for label in tree._value[parent_depth:tree._depth]]
+        self._child_start.append(child_start)
+        self._edge_start.append(len(self._edge_labels))
+        self._edge_labels.extend(edge)
+        self._first_labels.append(edge[0] if edge else -1)
+        self._weights.append(tree.weight)
+        self._max_weights.append(tree._max_weight)
+        self._sizes.append(len(tree))
+        self._leaf_start.append(len(self._values))
+
+        leaves = [subtree for subtree in tree.subtrees if subtree.is_leaf()]
+        leaves.sort(key=lambda leaf: leaf.weight, reverse=True)
+        for leaf in leaves:
+            self._values.append(leaf.value)
+            self._leaf_weights.append(leaf.weight)
+
+    def write_index(self, path: str) -> None:
+        """
+        write this snapshot to an index file at <path>, which MappedPrefixTree
+        answers queries from without loading it
+
+        the file is a header followed by the arrays of this snapshot, in the
+        byte order of this machine, then the labels and the values encoded
+        as UTF-8 one after another, each with an array of offsets; so only
+        snapshots whose labels and values are all strings can be written
+
+        >>> import os, tempfile
+        >>> t = SimplePrefixTree('sum')
+        >>> t.insert("cat", 3, ["c", "a", "t"])
+        >>> t.insert("car", 5, ["c", "a", "r"])
+        >>> path = os.path.join(tempfile.mkdtemp(), 'cars.idx')
+        >>> t.freeze().write_index(path)
+        >>> mapped = MappedPrefixTree(path)
+        >>> mapped.autocomplete(["c", "a"], 1)
+        [('car', 5)]
+        >>> mapped.close()
+        """
+        labels = [label for label in self._label_ids]
+        values = [value for value in self._values]
+
+        if not all(isinstance(item, str) for item in labels + values):
+            raise TypeError('only labels and values that are strings can be '
+                            'written to an index file')
+
+        label_offsets, label_data = _encode_strings(labels)
+        value_offsets, value_data = _encode_strings(values)
+        header = struct.pack(_INDEX_HEADER, _INDEX_MAGIC, _INDEX_VERSION,
+                             sys.byteorder == 'big',
+                             _WEIGHT_TYPES.index(self.weight_type),
+                             ord(memoryview(self._weights).format),
+                             ord(memoryview(self._max_weights).format),
+                             ord(memoryview(self._leaf_weights).format),
+                             len(self._first_labels), len(self._edge_labels),
+                             len(self._leaf_weights), len(labels),
+                             len(label_data), len(value_data))
+
+        with open(path, 'wb') as f:
+            f.write(header)
+            for section in (self._child_start, self._edge_start,
+                            self._edge_labels, self._first_labels,
+                            self._weights, self._max_weights, self._sizes,
+                            self._leaf_start, self._leaf_weights,
+                            label_offsets, value_offsets, label_data,
+                            value_data):
+                f.write(section)
+
+    @property
+    def weight(self) -> float:
+        """The weight of the tree this snapshot was taken from."""
+        return self._weights[0]
+
+    def __len__(self) -> int:
+        """Return the number of values stored in this snapshot."""
+        return self._sizes[0]
+
+    def insert(self, value: Any, weight: float, prefix: List) -> None:
+        """A snapshot is read-only, so this always raises TypeError.
+        """
+        raise TypeError('FrozenPrefixTree is read-only')
+
+    def remove(self, prefix: List) -> None:
+        """A snapshot is read-only, so this always raises TypeError.
+        """
+        raise TypeError('FrozenPrefixTree is read-only')
+
+    def remove_value(self, value: Any) -> None:
+        """A snapshot is read-only, so this always raises TypeError.
+        """
+        raise TypeError('FrozenPrefixTree is read-only')
+
+    def update_weight(self, value: Any, delta: float) -> None:
+        """A snapshot is read-only, so this always raises TypeError.
+        """
+        raise TypeError('FrozenPrefixTree is read-only')
+
+    def set_stats(self, enabled: bool,
+                  callback: Optional[Callable[[List, Dict[str, int]],
+                                              None]] = None) -> None:
+        """
+        turn counting the work of autocomplete on or off (see
+        Autocompleter.set_stats); turning it on again starts from zero
+
+        >>> t = SimplePrefixTree('sum')
+        >>> t.insert("ca", 3, ["c", "a"])
+        >>> t.insert("cb", 5, ["c", "b"])
+        >>> frozen = t.freeze()
+        >>> frozen.set_stats(True)
+        >>> frozen.autocomplete(["c"], 1)
+        [('cb', 5)]
+        >>> info = frozen.stats_info()
+        >>> info['calls'], info['comparisons'], info['leaves_collected']
+        (1, 1, 1)
+        """
+        self._stats = _QueryStats(callback) if enabled else None
+
+    def stats_info(self) -> Dict[str, Optional[int]]:
+        """
+        return the totals counted by autocomplete (see
+        Autocompleter.stats_info)
+        """
+        return _QueryStats.info(self._stats)
+
+    def autocomplete(self, prefix: List, limit: Optional[int] = None) -> \
+            List[Tuple[Any, float]]:
+        """
+        AUTOCOMPLETE method
+        find the node for prefix by bisecting the children of each node on
+        the way down, then call _matches_at
+
+        >>> t = CompressedPrefixTree('sum')
+        >>> t.insert("cat", 3, ["c", "a", "t"])
+        >>> t.insert("car", 5, ["c", "a", "r"])
+        >>> t.insert("c", 4, ["c"])
+        >>> frozen = t.freeze()
+        >>> frozen.autocomplete(["c", "a"])
+        [('car', 5), ('cat', 3)]
+        >>> frozen.autocomplete(["c"], 2)
+        [('car', 5), ('c', 4)]
+        >>> frozen.autocomplete(["d"])
+        []
+        """
+        if self._stats is not None:
+            return self._traced_autocomplete(prefix, limit)
+
+        node = self._find_node(prefix)
+
+        if node is None:
+            return []
+        return self._matches_at((node, 0), prefix, limit)
+
+    def iter_autocomplete(self, prefix: List) -> Iterator[Tuple[Any, float]]:
+        """
+        ITER_AUTOCOMPLETE method
+        lazily yield the matches for prefix as (value, weight) in
+        non-increasing order of weight, by _iter_best_first
+        """
+        node = self._find_node(prefix)
+
+        if node is not None:
+            yield from self._iter_best_first(node)
+
+    def autocomplete_many(self, prefixes: List[List],
+                          limit: Optional[int] = None) -> List[
+                              List[Tuple[Any, float]]]:
+        """
+        AUTOCOMPLETE_MANY method
+        return the result of autocomplete(prefix, limit) for every prefix in
+        prefixes, in the same order, by _autocomplete_many, so prefixes
+        sharing a path walk it once
+        """
+        return _autocomplete_many(self, prefixes, limit)
+
+    def autocomplete_fuzzy(self, prefix: List, max_edits: int = 1,
+                           limit: Optional[int] = None) -> List[
+                               Tuple[Any, float, int]]:
+        """
+        AUTOCOMPLETE_FUZZY method
+        return the first limit of _iter_fuzzy, as the autocomplete_fuzzy
+        method of the tree this snapshot was taken from does
+
+        >>> t = CompressedPrefixTree('sum')
+        >>> t.insert("frodo", 5, list("frodo"))
+        >>> t.insert("fred", 3, list("fred"))
+        >>> t.freeze().autocomplete_fuzzy(list("frdo"), 2)
+        [('frodo', 5, 1), ('fred', 3, 2)]
+        """
+        return list(islice(self._iter_fuzzy(prefix, max_edits), limit))
+
+    def cursor(self) -> PrefixCursor:
+        """
+        return a cursor with an empty prefix into this snapshot, to type a
+        prefix into one element at a time (see PrefixCursor)
+
+        >>> t = CompressedPrefixTree('sum')
+        >>> t.insert("cat", 3, ["c", "a", "t"])
+        >>> cursor = t.freeze().cursor()
+        >>> cursor.extend("c")
+        >>> cursor.extend("a")
+        >>> cursor.autocomplete()
+        [('cat', 3)]
+        """
+        return PrefixCursor(self)
+
+    def _start(self) -> Tuple[int, int]:
+        """
+        helper method returning where the empty prefix leads, for PrefixCursor,
+        as a pair (node, index of the next label in _edge_labels)
+        """
+        return 0, self._edge_start[1]
+
+    def _step(self, position: Tuple[int, int],
+              element: Any) -> Optional[Tuple[int, int]]:
+        """
+        helper method returning where the prefix that led to <position> leads
+        once <element> is added, for PrefixCursor
+        """
+        node, k = position
+        label = self._label_ids.get(element)
+
+        if label is None:
+            return None
+        elif k < self._edge_start[node + 1]:
+            if self._edge_labels[k] == label:
+                return node, k + 1
+            return None
+
+        start = self._child_start[node]
+        end = self._child_start[node + 1]
+        child = bisect_left(self._first_labels, label, start, end)
+
+        if child == end or self._first_labels[child] != label:
+            return None
+        return child, self._edge_start[child] + 1
+
+    def _matches_at(self, position: Tuple[int, int], prefix: List[Any],
+                    limit: Optional[int]) -> List[Tuple[Any, float]]:
+        """
+        helper method returning the result of autocomplete for <prefix> and
+        <limit>, where prefix leads to <position>, for PrefixCursor
+        """
+        node = position[0]
+
+        if self._sizes[0] == 0:
+            return []
+        elif limit is None:
+            return _sort_auto_collection(self._collect_leaves(node))
+        return list(islice(self._iter_best_first(node), limit))
+
+    def _matches_reusing(self, position: Tuple[int, int],
+                         limit: Optional[int],
+                         memo: Dict[int, List[Tuple[Any, float]]]) -> List[
+                             Tuple[Any, float]]:
+        """
+        helper method returning the matches with <limit> at <position>, for
+        _autocomplete_many, recording them in <memo> by node so prefixes that
+        end along the same edge share them
+        """
+        node = position[0]
+
+        if node not in memo:
+            memo[node] = self._matches_at(position, [], limit)
+        return memo[node]
+
+    def _traced_autocomplete(self, prefix: List, limit: Optional[int]) -> \
+            List[Tuple[Any, float]]:
+        """
+        helper method doing what autocomplete does, while counting its work for
+        self._stats
+        """
+        counts = dict.fromkeys(_QueryStats.COUNTERS, 0)
+        node = self._find_node(prefix, counts)
+        result = []
+
+        if node is not None and limit is None:
+            leaves = self._collect_leaves(node, counts)
+            counts['sorts'] += 1
+            result = _sort_auto_collection(leaves)
+        elif node is not None:
+            result = list(islice(self._iter_best_first(node, counts), limit))
+
+        counts['leaves_collected'] += len(result)
+        self._stats.record(prefix, counts)
+        return result
+
+    def _find_node(self, prefix: List[Any],
+                   counts: Optional[Dict[str, int]] = None) -> Optional[int]:
+        """
+        helper method returning the shortest node whose prefix starts with
+        <prefix>, or None, adding the nodes visited and the elements compared
+        to <counts>, if given
+        """
+        if self._sizes[0] == 0:
+            return None
+
+        node = 0
+        depth = 0
+
+        while depth < len(prefix):
+            label = self._label_ids.get(prefix[depth])
+            start = self._child_start[node]
+            end = self._child_start[node + 1]
+            node = bisect_left(self._first_labels, label, start, end) \
+                if label is not None else end
+            if counts is not None:
+                counts['nodes_visited'] += 1
+
+            if node == end or self._first_labels[node] != label:
+                return None
+
+            for k in range(self._edge_start[node], self._edge_start[node + 1]):
+                if depth == len(prefix):
+                    break
+                if counts is not None:
+                    counts['comparisons'] += 1
+                if self._label_ids.get(prefix[depth]) != \
+                        self._edge_labels[k]:
+                    return None
+                depth += 1
+
+        return node
+
+    def _collect_leaves(self, node: int,
+                        counts: Optional[Dict[str, int]] = None) -> List[
+                            Tuple[Any, float]]:
+        """
+        helper method gathering every leaf under <node> as (value, weight),
+        in no particular order, adding the nodes visited to <counts>, if given
+        """
+        lst = []
+        stack = [node]
+
+        while stack:
+            node = stack.pop()
+            if counts is not None:
+                counts['nodes_visited'] += 1
+            for leaf in range(self._leaf_start[node],
+                              self._leaf_start[node + 1]):
+                lst.append((self._values[leaf], self._leaf_weights[leaf]))
+            stack.extend(range(self._child_start[node],
+                               self._child_start[node + 1]))
+
+        return lst
+
+    def _iter_fuzzy(self, prefix: List[Any], max_edits: int) -> Iterator[
+            Tuple[Any, float, int]]:
+        """
+        helper generator yielding (value, weight, edits) by the same search as
+        the module level _iter_fuzzy, comparing label ids
+        """
+        if self._sizes[0] == 0:
+            return
+
+        query = [self._label_ids.get(element) for element in prefix]
+        row = list(range(len(query) + 1))
+        best = len(query)
+        if best == 0:
+            row = None
+        heap = [(0, -self._max_weights[0], 0, 0, -1, row, best)]
+        count = 0
+
+        while heap:
+            _, _, _, node, leaf, row, best = heapq.heappop(heap)
+
+            if leaf != -1:
+                yield self._values[leaf], self._leaf_weights[leaf], best
+                continue
+
+            if best <= max_edits:
+                for leaf in range(self._leaf_start[node],
+                                  self._leaf_start[node + 1]):
+                    count -= 1
+                    heapq.heappush(heap, (best, -self._leaf_weights[leaf],
+                                          count, node, leaf, None, best))
+
+            for child in range(self._child_start[node],
+                               self._child_start[node + 1]):
+                state = (None, best) if row is None else _fuzzy_edge(
+                    row, best, query, self._edge_labels[
+                        self._edge_start[child]:self._edge_start[child + 1]],
+                    max_edits)
+                if state is not None:
+                    count -= 1
+                    key = state[1] if state[0] is None else min(state[0])
+                    heapq.heappush(heap, (key, -self._max_weights[child],
+                                          count, child, -1) + state)
+
+    def _iter_best_first(self, node: int,
+                         counts: Optional[Dict[str, int]] = None) -> Iterator[
+                             Tuple[Any, float]]:
+        """
+        helper generator yielding the leaves under <node> as (value, weight),
+        heaviest first, adding the nodes visited to <counts>, if given
+        """
+        max_weights = self._max_weights
+        leaf_start = self._leaf_start
+        leaf_weights = self._leaf_weights
+        heap = [(-max_weights[node], 0, node, -1)]
+        count = 0
+
+        while heap:
+            _, _, node, leaf = heapq.heappop(heap)
+
+            if leaf == -1:
+                leaf = leaf_start[node]
+                if counts is not None:
+                    counts['nodes_visited'] += 1
+                for child in range(self._child_start[node],
+                                   self._child_start[node + 1]):
+                    count -= 1
+                    heapq.heappush(heap, (-max_weights[child], count, child,
+                                          -1))
+
+            end = leaf_start[node + 1]
+            while leaf < end and (not heap
+                                  or leaf_weights[leaf] >= -heap[0][0]):
+                yield self._values[leaf], leaf_weights[leaf]
+                leaf += 1
+
+            if leaf < end:
+                count -= 1
+                heapq.heappush(heap, (-leaf_weights[leaf], count, node, leaf))
+
+
+################################################################################
+# MappedPrefixTree
+################################################################################
+_INDEX_MAGIC = b'PFXINDEX'
+_INDEX_VERSION = 2
+# magic, version, big endian, weight type, the typecodes of the weights, max
+# weights and leaf weights, then the number of nodes, edge labels, leaves and
+# labels and the size in bytes of the labels and values
+_INDEX_HEADER = '<8s6q6q'
+_WEIGHT_TYPES = ('sum', 'average')
+
+
+def _weight_array(weights: List[float]) -> array:
+    """
+    a helper function returning <weights> as an array of integers if they
+    are all integers that fit in one, and of floats otherwise
+    """
+    if all(type(weight) is int for weight in weights):
+        try:
+            return array('q', weights)
+        except OverflowError:
+            pass
+    return array('d', weights)
+
+
+def _encode_strings(strings: List[str]) -> Tuple[array, bytes]:
+    """
+    a helper function encoding <strings> as UTF-8 one after another, returning
+    the offsets at which each starts (and the last ends) and the bytes
+    """
+    encoded = [string.encode('utf8') for string in strings]
+    offsets = array('q', [0])
+
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+
+    return offsets, b''.join(encoded)
+
+
+class _StringTable:
+    """A read-only sequence of the strings in an index file, decoded from the
+    mapped bytes one at a time as they are looked up.
+
+    === Private Attributes ===
+    _offsets:
+        String i is encoded in _data[_offsets[i]:_offsets[i + 1]].
+    _data:
+        The strings encoded as UTF-8, one after another.
+    """
+    __slots__ = ('_offsets', '_data')
+    _offsets: memoryview
+    _data: memoryview
+
+    def __init__(self, offsets: memoryview, data: memoryview) -> None:
+        """Initialize a table of the strings encoded in <data>."""
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self) -> int:
+        """Return the number of strings in this table."""
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        """Return string <index> of this table."""
+        if not 0 <= index < len(self):
+            raise IndexError('string table index out of range')
+        return str(self._encoded(index), 'utf8')
+
+    def _encoded(self, index: int) -> bytes:
+        """
+        helper method returning the bytes of string <index>
+        """
+        return bytes(self._data[self._offsets[index]:self._offsets[index + 1]])
+
+    def get(self, item: Any) -> Optional[int]:
+        """
+        return the index of <item> in this table, or None if it is not there,
+        by binary search, so this table must be sorted (a label table is)
+
+        UTF-8 bytes sort in the same order as the strings they encode
+        """
+        if not isinstance(item, str):
+            return None
+
+        key = item.encode('utf8')
+        low = 0
+        high = len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self._encoded(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < len(self) and self._encoded(low) == key:
+            return low
+        return None
+
+
+class MappedPrefixTree(FrozenPrefixTree):
+    """A FrozenPrefixTree answering queries straight from an index file
+    written by FrozenPrefixTree.write_index.
+
+    The file is mapped into memory and read through views of it, so opening
+    it takes the same time whatever its size, nothing in it is copied into
+    objects until a query returns it, and processes mapping the same file
+    share its pages.
+
+    === Private Attributes ===
+    _mmap:
+        The mapped index file.
+    _views:
+        Every view of _mmap in use, in the order they were made.
+    """
+    __slots__ = ('_mmap', '_views')
+    _mmap: mmap.mmap
+    _views: List[memoryview]
+
+    def __init__(self, path: str) -> None:
+        """Map the index file at <path>.
+
+        Raise ValueError if it is not an index file this version can read.
+        """
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        whole = memoryview(self._mmap)
+        self._views = [whole]
+        header_size = struct.calcsize(_INDEX_HEADER)
+        if len(whole) < header_size:
+            self.close()
+            raise ValueError(f'{path} is not an index file')
+
+        magic, version, big_endian, weight_type, weights, max_weights, \
+            leaf_weights, nodes, edge_labels, leaves, labels, label_bytes, \
+            value_bytes = struct.unpack_from(_INDEX_HEADER, whole)
+
+        if magic != _INDEX_MAGIC or version != _INDEX_VERSION:
+            self.close()
+            raise ValueError(f'{path} is not a version {_INDEX_VERSION} '
+                             f'index file')
+        elif big_endian != (sys.byteorder == 'big'):
+            self.close()
+            raise ValueError(f'{path} was written with another byte order')
+
+        self.weight_type = _WEIGHT_TYPES[weight_type]
+        self._stats = None
+        offset = header_size
+        sections = []
+        for typecode, count in (('q', nodes + 1), ('q', nodes + 1),
+                                ('q', edge_labels), ('q', nodes),
+                                (chr(weights), nodes),
+                                (chr(max_weights), nodes), ('q', nodes),
+                                ('q', nodes + 1), (chr(leaf_weights), leaves),
+                                ('q', labels + 1), ('q', leaves + 1),
+                                ('B', label_bytes), ('B', value_bytes)):
+            size = count * struct.calcsize(typecode)
+            sections.append(self._view(whole, offset, size, typecode))
+            offset += size
+
+        self._child_start, self._edge_start, self._edge_labels, \
+            self._first_labels, self._weights, self._max_weights, \
+            self._sizes, self._leaf_start, self._leaf_weights = sections[:9]
+        self._label_ids = _StringTable(sections[9], sections[11])
+        self._values = _StringTable(sections[10], sections[12])
+
+    def _view(self, whole: memoryview, offset: int, size: int,
+              typecode: str) -> memoryview:
+        """
+        helper method returning a view of <size> bytes of the file from
+        <offset> as an array of <typecode>, keeping it to release on close
+        """
+        part = whole[offset:offset + size]
+        self._views.append(part)
+        if typecode != 'B':
+            part = part.cast(typecode)
+            self._views.append(part)
+        return part
+
+    def close(self) -> None:
+        """Unmap the index file. This tree cannot be used afterwards.
+        """
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,241 @@
+"""Tests for the engines in autocomplete_engines.py that read their file
+again: following a growing file, and loading snapshots.
+"""
+import io
+import os
+import random
+import threading
+from collections import Counter
+
+import pytest
+
+import autocomplete_engines
+from autocomplete_engines import LetterAutocompleteEngine, \
+    SentenceAutocompleteEngine, _sanitize
+
+
+def _letter_engine(path, autocompleter='compressed'):
+    return LetterAutocompleteEngine({'file': path,
+                                     'autocompleter': autocompleter,
+                                     'weight_type': 'sum'})
+
+
+def _append(path, text):
+    with open(path, 'a', encoding='utf8') as f:
+        f.write(text)
+
+
+@pytest.mark.parametrize('autocompleter', ['simple', 'compressed'])
+def test_last_line_without_newline_is_kept(tmp_path, autocompleter):
+    path = str(tmp_path / 'words.txt')
+    _append(path, 'frodo baggins\nfrodo')
+    engine = _letter_engine(path, autocompleter)
+    assert sorted(engine.autocomplete('f')) == [('frodo', 1),
+                                                ('frodo baggins', 1)]
+
+
+def test_sentence_engine_keeps_a_last_row_without_newline(tmp_path):
+    path = str(tmp_path / 'searches.csv')
+    _append(path, 'how to cook,7\nhow to run,3')
+    engine = SentenceAutocompleteEngine({'file': path,
+                                         'autocompleter': 'simple',
+                                         'weight_type': 'sum'})
+    assert engine.autocomplete('how') == [('how to cook', 7.0),
+                                          ('how to run', 3.0)]
+
+
+@pytest.mark.parametrize('autocompleter', ['simple', 'compressed'])
+def test_refresh_waits_for_an_unfinished_line(tmp_path, autocompleter):
+    path = str(tmp_path / 'words.txt')
+    _append(path, 'abc\n')
+    engine = _letter_engine(path, autocompleter)
+
+    _append(path, 'ab')
+    assert engine.refresh() == 0
+    _append(path, 'x')
+    assert engine.refresh() == 0
+    _append(path, '\nabc\n')
+    assert engine.refresh() == 2
+    assert engine.autocomplete('a') == [('abc', 2), ('abx', 1)]
+
+
+def test_rotated_and_truncated_files_are_read_from_the_start(tmp_path):
+    path = str(tmp_path / 'words.txt')
+    _append(path, 'one\none\n')
+    engine = _letter_engine(path)
+
+    os.rename(path, path + '.1')
+    assert engine.refresh() == 0
+    _append(path, 'two\n')
+    engine.refresh()
+    assert engine.autocomplete('') == [('one', 2), ('two', 1)]
+
+    with open(path, 'w', encoding='utf8') as f:
+        f.write('o\n')
+    engine.refresh()
+    assert engine.autocomplete('o') == [('one', 2), ('o', 1)]
+
+
+def test_loaded_snapshot_follows_from_the_end_of_its_file(tmp_path):
+    path = str(tmp_path / 'words.txt')
+    _append(path, 'abc\nab')
+    _letter_engine(path).save(str(tmp_path / 'snapshot'))
+
+    engine = LetterAutocompleteEngine.load(str(tmp_path / 'snapshot'))
+    _append(path, '\nabx\n')
+    engine.refresh()
+    assert sorted(engine.autocomplete('a')) == [('ab', 1), ('abc', 1),
+                                                ('abx', 1)]
+
+
+def test_refreshed_engine_saves_a_snapshot_that_loads_as_is(tmp_path):
+    path = str(tmp_path / 'words.txt')
+    _append(path, 'abc\n')
+    engine = _letter_engine(path)
+    _append(path, 'abd\nab')
+    engine.refresh()
+    engine.save(str(tmp_path / 'snapshot'))
+
+    loaded = LetterAutocompleteEngine.load(str(tmp_path / 'snapshot'))
+    assert loaded.stats_info()['read'] is None  # not built again
+    assert sorted(loaded.autocomplete('a')) == [('abc', 1), ('abd', 1)]
+
+    # it goes on from the unfinished line the saved engine stopped at
+    _append(path, 'x\n')
+    loaded.refresh()
+    assert sorted(loaded.autocomplete('a')) == [('abc', 1), ('abd', 1),
+                                                ('abx', 1)]
+
+def test_follow_stops_when_asked(tmp_path):
+    path = str(tmp_path / 'words.txt')
+    _append(path, 'abc\n')
+    engine = _letter_engine(path)
+    stop = threading.Event()
+    follower = threading.Thread(target=engine.follow, args=(0.01, stop))
+    follower.start()
+    try:
+        _append(path, 'abd\n')
+        for _ in range(500):
+            if len(engine.autocomplete('ab')) == 2:
+                break
+            stop.wait(0.01)
+    finally:
+        stop.set()
+        follower.join()
+    assert not follower.is_alive()
+    assert sorted(engine.autocomplete('ab')) == [('abc', 1), ('abd', 1)]
+
+
+def test_engine_opened_from_index_counts_but_cannot_be_saved(tmp_path):
+    path = str(tmp_path / 'words.txt')
+    _append(path, 'abc\nabd\nabd\n')
+    _letter_engine(path).write_index(str(tmp_path / 'words.idx'))
+
+    engine = LetterAutocompleteEngine.from_index(str(tmp_path / 'words.idx'))
+    engine.set_stats(True)
+    assert engine.autocomplete('ab') == [('abd', 2), ('abc', 1)]
+    assert engine.stats_info()['calls'] == 1
+    with pytest.raises(TypeError):
+        engine.save(str(tmp_path / 'snapshot'))
+    assert not os.path.exists(str(tmp_path / 'snapshot'))
+    engine.autocompleter.close()
+
+
+@pytest.mark.parametrize('autocompleter', ['simple', 'compressed'])
+def test_snapshot_round_trip(tmp_path, autocompleter):
+    path = str(tmp_path / 'words.txt')
+    _append(path, 'abc\nabd\nabd\nb\n')
+    engine = _letter_engine(path, autocompleter)
+    engine.remove_value('b')
+    engine.save(str(tmp_path / 'snapshot'))
+
+    loaded = LetterAutocompleteEngine.load(str(tmp_path / 'snapshot'))
+    assert type(loaded.autocompleter) is type(engine.autocompleter)
+    assert loaded.autocomplete('') == engine.autocomplete('')
+    assert loaded.autocomplete('a', 1) == [('abd', 2)]
+
+    # the loaded tree keeps its index, so it can still be changed by value
+    loaded.remove_value('abd')
+    assert loaded.autocomplete('a') == [('abc', 1)]
+
+
+def test_stale_snapshot_is_built_again(tmp_path):
+    path = str(tmp_path / 'words.txt')
+    _append(path, 'abc\n')
+    _letter_engine(path).save(str(tmp_path / 'snapshot'))
+
+    with open(path, 'w', encoding='utf8') as f:
+        f.write('xyz\n')
+    engine = LetterAutocompleteEngine.load(str(tmp_path / 'snapshot'))
+    assert engine.autocomplete('') == [('xyz', 1)]
+    assert LetterAutocompleteEngine.load(
+        str(tmp_path / 'snapshot')).autocomplete('') == [('xyz', 1)]
+
+
+def test_snapshot_of_another_engine_is_refused(tmp_path):
+    path = str(tmp_path / 'words.txt')
+    _append(path, 'abc\n')
+    _letter_engine(path).save(str(tmp_path / 'snapshot'))
+
+    with pytest.raises(ValueError):
+        SentenceAutocompleteEngine.load(str(tmp_path / 'snapshot'))
+
+
+def test_unknown_autocompleter_is_refused(tmp_path):
+    path = str(tmp_path / 'words.txt')
+    _append(path, 'abc\n')
+    with pytest.raises(ValueError):
+        _letter_engine(path, 'trie')
+
+
+def test_stats_report_build_phases_and_query_counts(tmp_path):
+    path = str(tmp_path / 'words.txt')
+    _append(path, 'abc\nabd\nb\n')
+    engine = _letter_engine(path)
+    stats = engine.stats_info()
+    assert all(stats[phase] >= 0 for phase in ('read', 'sanitize', 'insert'))
+    assert stats['calls'] is None
+
+    engine.set_stats(True)
+    engine.autocomplete('ab')
+    engine.autocomplete('b', 1)
+    assert engine.stats_info()['calls'] == 2
+
+    engine.save(str(tmp_path / 'snapshot'))
+    loaded = LetterAutocompleteEngine.load(str(tmp_path / 'snapshot'))
+    assert loaded.stats_info()['insert'] is None
+
+
+def _reference_sanitize(line):
+    """Return <line> sanitized one character at a time, as the handout
+    describes it, or None if no alphanumeric character is left.
+    """
+    sanitized = ''.join(char for char in line.lower()
+                        if char.isalnum() or char == ' ')
+    return sanitized if sanitized.strip() else None
+
+
+def test_sanitize_table_matches_reference():
+    rng = random.Random(0)
+    alphabet = 'aZ9 .,!\t\u00e9\u00df\u0130\u0663\u2028\u00a0-'
+    for _ in range(500):
+        line = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 8)))
+        assert _sanitize(line) == _reference_sanitize(line)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 1 << 20])
+def test_chunk_boundaries_inside_lines_change_nothing(tmp_path, monkeypatch,
+                                                      chunk_size):
+    rng = random.Random(chunk_size)
+    lines = [''.join(rng.choice('ab C!\u00e9')
+                     for _ in range(rng.randint(0, 6))) for _ in range(200)]
+    text = '\n'.join(lines)
+    path = str(tmp_path / 'words.txt')
+    _append(path, text)
+
+    monkeypatch.setattr(autocomplete_engines, '_CHUNK_SIZE', chunk_size)
+    engine = _letter_engine(path)
+    expected = Counter(_reference_sanitize(line)
+                       for line in io.StringIO(text))
+    del expected[None]
+    assert sorted(engine.autocomplete('')) == sorted(expected.items())
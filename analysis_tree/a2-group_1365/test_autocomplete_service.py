@@ -0,0 +1,114 @@
+"""Tests for AutocompleteService: shared queries, deadlines and the line
+protocol.
+"""
+import asyncio
+import json
+import threading
+
+from autocomplete_service import AutocompleteService
+
+
+class SlowEngine:
+    """An engine whose queries wait until <release> is set, counting how
+    many times each prefix was collected.
+    """
+    def __init__(self) -> None:
+        self.release = threading.Event()
+        self.calls = []
+
+    def autocomplete(self, prefix, limit=None):
+        self.calls.append(prefix)
+        self.release.wait(5)
+        return [(f'{prefix}!', 1.0)][:limit]
+
+
+def test_identical_queries_share_one_collection():
+    engine = SlowEngine()
+    service = AutocompleteService(engine)
+
+    async def run():
+        waiting = [asyncio.ensure_future(service.autocomplete('ab'))
+                   for _ in range(5)]
+        await asyncio.sleep(0.05)
+        engine.release.set()
+        return await asyncio.gather(*waiting)
+
+    assert asyncio.run(run()) == [[('ab!', 1.0)]] * 5
+    assert engine.calls == ['ab']
+    assert service._in_flight == {}
+
+
+def test_deadline_does_not_cancel_the_shared_query():
+    engine = SlowEngine()
+    service = AutocompleteService(engine)
+
+    async def run():
+        patient = asyncio.ensure_future(service.autocomplete('ab', 1))
+        hurried = await service.answer(
+            json.dumps({'id': 3, 'prefix': 'ab', 'limit': 1,
+                        'timeout': 0.01}))
+        engine.release.set()
+        return hurried, await patient
+
+    hurried, patient = asyncio.run(run())
+    assert hurried == {'id': 3, 'error': 'deadline exceeded'}
+    assert patient == [('ab!', 1.0)]
+    assert engine.calls == ['ab']
+
+
+def test_bad_requests_are_answered():
+    engine = SlowEngine()
+    engine.release.set()
+    service = AutocompleteService(engine)
+
+    async def run():
+        return [await service.answer(line) for line in
+                [b'\xff\xfe\n', '{"id": 1}\n', '{"id": 2, "prefix"\n']]
+
+    answers = asyncio.run(run())
+    assert [answer['id'] for answer in answers] == [None, 1, None]
+    assert all(answer['error'].startswith('bad request: ')
+               for answer in answers)
+
+
+class BrokenEngine:
+    """An engine whose queries fail with an error no request could cause.
+    """
+    def autocomplete(self, prefix, limit=None):
+        return [][0]
+
+
+def test_engine_errors_are_answered():
+    service = AutocompleteService(BrokenEngine())
+
+    async def run():
+        return await service.answer('{"id": 4, "prefix": "ab"}\n')
+
+    answer = asyncio.run(run())
+    assert answer == {'id': 4, 'error': 'internal error: IndexError: '
+                                        'list index out of range'}
+
+
+def test_connection_survives_bad_utf8():
+    engine = SlowEngine()
+    engine.release.set()
+    service = AutocompleteService(engine)
+
+    async def run():
+        server = await service.serve('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'\xff\n' + b''.join(
+                json.dumps({'id': i, 'prefix': str(i)}).encode('utf8')
+                + b'\n' for i in range(20)))
+            await writer.drain()
+            lines = [await reader.readline() for _ in range(21)]
+            writer.close()
+        return [json.loads(line) for line in lines]
+
+    answers = asyncio.run(run())
+    assert sum('error' in answer for answer in answers) == 1
+    assert sorted(answer['results'][0][0] for answer in answers
+                  if 'results' in answer) == sorted(f'{i}!'
+                                                   for i in range(20))
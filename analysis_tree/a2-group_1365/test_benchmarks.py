@@ -0,0 +1,39 @@
+"""Tests for the benchmark suite: its corpora are reproducible, its removal
+prefixes are disjoint, and a small run measures every column.
+"""
+import pytest
+
+from benchmarks import CORPORA, LIMITS, _removal_prefixes, format_table, \
+    run_suite
+
+
+@pytest.mark.parametrize('corpus', list(CORPORA))
+def test_corpora_are_reproducible(corpus):
+    items = CORPORA[corpus](200, 3)
+    assert items == CORPORA[corpus](200, 3)
+    assert len(items) == 200
+    assert all(weight > 0 for _, weight, _ in items)
+
+
+@pytest.mark.parametrize('corpus', list(CORPORA))
+def test_removal_prefixes_are_disjoint(corpus):
+    prefixes = _removal_prefixes(CORPORA[corpus](500, 0), 20, 1)
+    assert prefixes and all(prefixes)
+    for i, prefix in enumerate(prefixes):
+        for other in prefixes[i + 1:]:
+            assert prefix[:len(other)] != other
+            assert other[:len(prefix)] != prefix
+
+
+def test_small_run_measures_every_column():
+    rows = run_suite(100, 1, 0, ['words'])
+    assert [(row['tree'], row['weight_type']) for row in rows] == [
+        ('SimplePrefixTree', 'sum'), ('SimplePrefixTree', 'average'),
+        ('CompressedPrefixTree', 'sum'), ('CompressedPrefixTree', 'average')]
+
+    columns = ['insert', 'from_items', 'bulk_speedup', 'unlimited', 'remove',
+               'insert_peak_mb', 'from_items_peak_mb'] + \
+        [f'top{limit}' for limit in LIMITS]
+    for row in rows:
+        assert all(row[column] > 0 for column in columns)
+    assert len(format_table(rows).splitlines()) == len(rows) + 1
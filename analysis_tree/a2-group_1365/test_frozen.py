@@ -0,0 +1,107 @@
+"""Tests for FrozenPrefixTree and MappedPrefixTree: a snapshot, or the
+index file written from it, answers every query as the tree it was taken
+from does.
+"""
+import random
+
+import pytest
+
+from prefix_tree import SimplePrefixTree, CompressedPrefixTree, \
+    MappedPrefixTree
+
+TREE_CLASSES = [SimplePrefixTree, CompressedPrefixTree]
+WEIGHT_TYPES = ['sum', 'average']
+
+
+def _random_tree(tree_class, weight_type, rng):
+    """Return a tree of <tree_class> holding a few short strings over a small
+    alphabet, with some of them removed again, and the prefixes to query.
+    """
+    tree = tree_class(weight_type)
+    for _ in range(rng.randint(1, 15)):
+        value = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 5)))
+        tree.insert(value, rng.randint(1, 4), list(value))
+    for value, _ in tree.autocomplete([])[:rng.randint(0, 2)]:
+        tree.remove_value(value)
+
+    prefixes = [list(value[:end]) for value, _ in tree.autocomplete([])
+                for end in range(len(value) + 1)]
+    return tree, prefixes + [['d'], ['a', 'd']]
+
+
+def _check_limited(limited, full, limit):
+    """Check that <limited> is a top <limit> of the matches <full>: the
+    heaviest weights, each with a value that has it.
+    """
+    weights = sorted((weight for _, weight in full), reverse=True)
+    assert [weight for _, weight in limited] == weights[:limit]
+    assert set(limited) <= set(full)
+
+
+def _check_same_answers(snapshot, tree, prefixes):
+    """Check that <snapshot> answers every query for <prefixes> as <tree>
+    does.
+    """
+    assert len(snapshot) == len(tree)
+    for prefix in prefixes:
+        full = tree.autocomplete(prefix)
+        assert sorted(snapshot.autocomplete(prefix)) == sorted(full)
+        _check_limited(snapshot.autocomplete(prefix, 2), full, 2)
+        _check_limited(list(snapshot.iter_autocomplete(prefix)), full,
+                       len(full))
+        assert sorted(snapshot.autocomplete_fuzzy(prefix, 1)) == \
+            sorted(tree.autocomplete_fuzzy(prefix, 1))
+
+        cursor = snapshot.cursor()
+        for element in prefix:
+            cursor.extend(element)
+        assert sorted(cursor.autocomplete()) == sorted(full)
+
+    for many, full in zip(snapshot.autocomplete_many(prefixes, 3),
+                          tree.autocomplete_many(prefixes)):
+        _check_limited(many, full, 3)
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+@pytest.mark.parametrize('weight_type', WEIGHT_TYPES)
+def test_frozen_tree_matches_its_source(tree_class, weight_type):
+    rng = random.Random(0)
+    for _ in range(100):
+        tree, prefixes = _random_tree(tree_class, weight_type, rng)
+        _check_same_answers(tree.freeze(), tree, prefixes)
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+def test_frozen_tree_cannot_be_changed(tree_class):
+    tree = tree_class('sum')
+    tree.insert('cat', 3, ['c', 'a', 't'])
+    snapshot = tree.freeze()
+    with pytest.raises(TypeError):
+        snapshot.insert('car', 1, ['c', 'a', 'r'])
+    with pytest.raises(TypeError):
+        snapshot.remove(['c'])
+    assert snapshot.autocomplete(['c']) == [('cat', 3)]
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+@pytest.mark.parametrize('weight_type', WEIGHT_TYPES)
+def test_mapped_index_matches_its_source(tree_class, weight_type, tmp_path):
+    rng = random.Random(1)
+    for i in range(50):
+        tree, prefixes = _random_tree(tree_class, weight_type, rng)
+        path = str(tmp_path / f'{i}.idx')
+        tree.freeze().write_index(path)
+
+        mapped = MappedPrefixTree(path)
+        try:
+            assert mapped.weight_type == weight_type
+            _check_same_answers(mapped, tree, prefixes)
+        finally:
+            mapped.close()
+
+
+def test_file_that_is_not_an_index_is_refused(tmp_path):
+    path = tmp_path / 'words.idx'
+    path.write_bytes(b'not an index file at all')
+    with pytest.raises(ValueError):
+        MappedPrefixTree(str(path))
@@ -0,0 +1,575 @@
+"""Tests for SimplePrefixTree and CompressedPrefixTree that compare a tree
+with another way of getting the same values into it, or with a dict model
+of those values.
+"""
+import random
+from itertools import islice
+
+import pytest
+
+from prefix_tree import SimplePrefixTree, CompressedPrefixTree
+
+TREE_CLASSES = [SimplePrefixTree, CompressedPrefixTree]
+WEIGHT_TYPES = ['sum', 'average']
+
+
+def _shape(tree):
+    """Return <tree> as nested tuples, its subtrees in no particular order,
+    so trees that only break ties differently compare equal.
+    """
+    if tree.is_leaf():
+        return tree.value, tree.weight
+    return (tuple(tree.value), tree.weight, len(tree),
+            tuple(sorted((_shape(subtree) for subtree in tree.subtrees),
+                         key=repr)))
+
+
+def _random_items(rng, count):
+    """Return <count> items of short strings over a small alphabet, so
+    values repeat and prefixes share paths.
+    """
+    items = []
+    for _ in range(count):
+        value = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 5)))
+        items.append((value, rng.randint(1, 4), list(value)))
+    return items
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+@pytest.mark.parametrize('weight_type', WEIGHT_TYPES)
+def test_from_items_matches_repeated_insert(tree_class, weight_type):
+    rng = random.Random(0)
+    for _ in range(300):
+        items = _random_items(rng, rng.randint(1, 12))
+        inserted = tree_class(weight_type)
+        for value, weight, prefix in items:
+            inserted.insert(value, weight, prefix)
+
+        built = tree_class.from_items(items, weight_type)
+        assert _shape(built) == _shape(inserted)
+        assert sorted(built.autocomplete([])) == \
+            sorted(inserted.autocomplete([]))
+
+
+def _model_items(model):
+    """Return the (value, weight) of every value in <model>, a dict from
+    value to [weight, prefix], sorted so they compare with autocomplete.
+    """
+    return sorted((value, weight) for value, (weight, _) in model.items())
+
+
+def _check_against_model(tree, model):
+    """Check that <tree> holds exactly the values of <model>, under every
+    prefix that leads to one, with exact aggregate weights at its root.
+    """
+    assert sorted(tree.autocomplete([])) == _model_items(model)
+    assert len(tree) == len(model)
+    total = sum(weight for weight, _ in model.values())
+    assert tree.aggregate_weight('sum') == total
+    if model:
+        assert tree.aggregate_weight('average') == total / len(model)
+    for _, prefix in model.values():
+        for end in range(len(prefix) + 1):
+            expected = sorted(
+                (value, weight) for value, (weight, other) in model.items()
+                if other[:end] == prefix[:end])
+            assert sorted(tree.autocomplete(prefix[:end])) == expected
+
+
+def _fill(tree, model, rng, count):
+    """Insert <count> random items into both <tree> and <model>."""
+    for value, weight, prefix in _random_items(rng, count):
+        tree.insert(value, weight, prefix)
+        model.setdefault(value, [0, prefix])[0] += weight
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+@pytest.mark.parametrize('weight_type', WEIGHT_TYPES)
+def test_update_weight_matches_model(tree_class, weight_type):
+    rng = random.Random(1)
+    for _ in range(100):
+        tree, model = tree_class(weight_type), {}
+        _fill(tree, model, rng, rng.randint(1, 12))
+        for _ in range(5):
+            value = rng.choice(sorted(model))
+            delta = rng.randint(1, 3)
+            tree.update_weight(value, delta)
+            model[value][0] += delta
+            _check_against_model(tree, model)
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+@pytest.mark.parametrize('weight_type', WEIGHT_TYPES)
+def test_remove_value_matches_model(tree_class, weight_type):
+    rng = random.Random(2)
+    for _ in range(100):
+        tree, model = tree_class(weight_type), {}
+        _fill(tree, model, rng, rng.randint(1, 12))
+        while model:
+            value = rng.choice(sorted(model))
+            tree.remove_value(value)
+            del model[value]
+            _check_against_model(tree, model)
+            if rng.random() < 0.3:
+                _fill(tree, model, rng, 2)
+                _check_against_model(tree, model)
+        assert tree.is_empty()
+
+
+def _check_aggregates(tree):
+    """Check that the aggregate weights of every tree in <tree> are exactly
+    those of the leaves under it; return those leaf weights.
+    """
+    if tree.is_leaf():
+        return [tree.weight]
+    weights = [weight for subtree in tree.subtrees
+               for weight in _check_aggregates(subtree)]
+    if weights:
+        assert tree.aggregate_weight('sum') == sum(weights)
+        assert tree.aggregate_weight('average') == \
+            sum(weights) / len(weights)
+    return weights
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+@pytest.mark.parametrize('weight_type', WEIGHT_TYPES)
+def test_aggregate_weights_stay_exact(tree_class, weight_type):
+    rng = random.Random(3)
+    for _ in range(100):
+        tree, model = tree_class(weight_type), {}
+        for _ in range(10):
+            if model and rng.random() < 0.4:
+                value = rng.choice(sorted(model))
+                tree.remove_value(value)
+                del model[value]
+            else:
+                _fill(tree, model, rng, 1)
+            _check_aggregates(tree)
+        _check_against_model(tree, model)
+
+
+def _compressible(tree, is_root=True):
+    """Return the number of internal trees in <tree> that hold no leaf and
+    do not branch, which a CompressedPrefixTree should not have.
+    """
+    if tree.is_leaf():
+        return 0
+    count = sum(_compressible(subtree, False) for subtree in tree.subtrees)
+    if not is_root and len(tree.subtrees) == 1 and \
+            not tree.subtrees[0].is_leaf():
+        count += 1
+    return count
+
+
+@pytest.mark.parametrize('weight_type', WEIGHT_TYPES)
+def test_compact_after_removals(weight_type):
+    rng = random.Random(4)
+    for _ in range(150):
+        tree, model = CompressedPrefixTree(weight_type), {}
+        _fill(tree, model, rng, rng.randint(1, 12))
+        for _ in range(rng.randint(0, len(model))):
+            value = rng.choice(sorted(model))
+            tree.remove_value(value)
+            del model[value]
+        tree.compact()
+        assert _compressible(tree) == 0
+        _check_against_model(tree, model)
+        assert tree.compact() == 0
+
+
+@pytest.mark.parametrize('weight_type', WEIGHT_TYPES)
+def test_auto_compact_keeps_tree_compressed(weight_type):
+    rng = random.Random(5)
+    for _ in range(150):
+        tree, model = CompressedPrefixTree(weight_type), {}
+        tree.set_auto_compact(True)
+        _fill(tree, model, rng, rng.randint(1, 12))
+        while model:
+            value = rng.choice(sorted(model))
+            tree.remove_value(value)
+            del model[value]
+            assert _compressible(tree) == 0
+            _check_against_model(tree, model)
+
+
+@pytest.mark.parametrize('weight_type', WEIGHT_TYPES)
+def test_to_compressed_matches_from_items(weight_type):
+    rng = random.Random(6)
+    for _ in range(300):
+        items = _random_items(rng, rng.randint(1, 12))
+        simple = SimplePrefixTree.from_items(items, weight_type)
+        converted = simple.to_compressed()
+        built = CompressedPrefixTree.from_items(items, weight_type)
+        assert _shape(converted) == _shape(built)
+        assert _compressible(converted) == 0
+
+
+def _edit_distance(first, second):
+    """Return the fewest inserts, deletes and replacements of one element
+    turning <first> into <second>.
+    """
+    row = list(range(len(second) + 1))
+    for i, element in enumerate(first, 1):
+        previous, row[0] = row[0], i
+        for j, other in enumerate(second, 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1,
+                                           previous + (element != other))
+    return row[-1]
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+@pytest.mark.parametrize('max_edits', [0, 1, 2])
+def test_autocomplete_fuzzy_matches_brute_force(tree_class, max_edits):
+    rng = random.Random(7)
+    for _ in range(100):
+        tree, model = tree_class('sum'), {}
+        _fill(tree, model, rng, rng.randint(1, 12))
+        query = [rng.choice('abcd') for _ in range(rng.randint(0, 4))]
+
+        expected = {}
+        for value, (weight, prefix) in model.items():
+            edits = min(_edit_distance(query, prefix[:end])
+                        for end in range(len(prefix) + 1))
+            if edits <= max_edits:
+                expected[value] = (weight, edits)
+
+        result = tree.autocomplete_fuzzy(query, max_edits)
+        assert {value: (weight, edits) for value, weight, edits in result} \
+            == expected
+        keys = [(edits, -weight) for _, weight, edits in result]
+        assert keys == sorted(keys)
+
+        limit = rng.randint(1, 3)
+        limited = tree.autocomplete_fuzzy(query, max_edits, limit)
+        assert [(edits, -weight) for _, weight, edits in limited] == \
+            keys[:limit]
+        assert all(expected[value] == (weight, edits)
+                   for value, weight, edits in limited)
+
+
+def _check_children(tree):
+    """Check that every tree in <tree> indexes exactly its non-leaf subtrees
+    in _children, by the prefix element that leads down to each.
+    """
+    if tree.is_leaf():
+        return
+    assert tree._children == {subtree._value[tree._depth]: subtree
+                              for subtree in tree.subtrees
+                              if not subtree.is_leaf()}
+    for subtree in tree.subtrees:
+        _check_children(subtree)
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+def test_children_index_follows_every_mutation(tree_class):
+    rng = random.Random(8)
+    for _ in range(100):
+        tree, model = tree_class('sum'), {}
+        for _ in range(15):
+            choice = rng.random()
+            if model and choice < 0.3:
+                value = rng.choice(sorted(model))
+                tree.remove_value(value)
+                del model[value]
+            elif model and choice < 0.4:
+                prefix = [rng.choice('abc') for _ in range(rng.randint(1, 2))]
+                tree.remove(prefix)
+                model = {value: entry for value, entry in model.items()
+                         if entry[1][:len(prefix)] != prefix}
+            else:
+                _fill(tree, model, rng, 1)
+            _check_children(tree)
+        _check_against_model(tree, model)
+
+
+def _check_sorted(tree):
+    """Check that the subtrees of every tree in <tree> are in non-increasing
+    order of weight.
+    """
+    weights = [subtree.weight for subtree in tree.subtrees]
+    assert weights == sorted(weights, reverse=True)
+    for subtree in tree.subtrees:
+        _check_sorted(subtree)
+
+
+def _check_limited(limited, full, limit):
+    """Check that <limited> is a top <limit> of the matches <full>: the
+    heaviest weights, each with a value that has it.
+    """
+    weights = sorted((weight for _, weight in full), reverse=True)
+    assert [weight for _, weight in limited] == weights[:limit]
+    assert set(limited) <= set(full)
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+@pytest.mark.parametrize('weight_type', WEIGHT_TYPES)
+def test_lazy_sorting_matches_eager(tree_class, weight_type):
+    rng = random.Random(9)
+    for _ in range(100):
+        lazy, eager = tree_class(weight_type), tree_class(weight_type)
+        lazy.set_lazy_sorting(True)
+        model = {}
+        for _ in range(12):
+            if model and rng.random() < 0.3:
+                value = rng.choice(sorted(model))
+                lazy.remove_value(value)
+                eager.remove_value(value)
+                del model[value]
+            else:
+                for value, weight, prefix in _random_items(rng, 1):
+                    lazy.insert(value, weight, prefix)
+                    eager.insert(value, weight, prefix)
+                    model.setdefault(value, [0, prefix])[0] += weight
+
+            prefix = list(rng.choice(sorted(model) or ['']))[:2]
+            full = eager.autocomplete(prefix)
+            assert sorted(lazy.autocomplete(prefix)) == sorted(full)
+            _check_limited(lazy.autocomplete(prefix, 2), full, 2)
+
+        lazy.set_lazy_sorting(False)
+        _check_sorted(lazy)
+        assert _shape(lazy) == _shape(eager)
+
+
+def _check_max_weights(tree):
+    """Check that every tree in <tree> records its largest leaf weight in
+    _max_weight; return that weight.
+    """
+    if tree.is_leaf():
+        assert tree._max_weight == tree.weight
+        return tree.weight
+    largest = max((_check_max_weights(subtree) for subtree in tree.subtrees),
+                  default=0)
+    assert tree._max_weight == largest
+    return largest
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+@pytest.mark.parametrize('weight_type', WEIGHT_TYPES)
+def test_limited_autocomplete_is_top_of_unlimited(tree_class, weight_type):
+    rng = random.Random(10)
+    for _ in range(100):
+        tree, model = tree_class(weight_type), {}
+        _fill(tree, model, rng, rng.randint(1, 15))
+        for _ in range(rng.randint(0, 3)):
+            value = rng.choice(sorted(model))
+            tree.update_weight(value, rng.randint(1, 5))
+        if len(model) > 1:
+            tree.remove_value(rng.choice(sorted(model)))
+        _check_max_weights(tree)
+
+        for _, prefix in model.values():
+            for end in range(len(prefix) + 1):
+                full = tree.autocomplete(prefix[:end])
+                for limit in range(1, len(full) + 2):
+                    _check_limited(tree.autocomplete(prefix[:end], limit),
+                                   full, limit)
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+@pytest.mark.parametrize('weight_type', WEIGHT_TYPES)
+def test_iter_autocomplete_yields_in_weight_order(tree_class, weight_type):
+    rng = random.Random(11)
+    for _ in range(100):
+        tree, model = tree_class(weight_type), {}
+        tree.set_lazy_sorting(rng.random() < 0.5)
+        _fill(tree, model, rng, rng.randint(1, 15))
+
+        for _, prefix in model.values():
+            for end in range(len(prefix) + 1):
+                full = tree.autocomplete(prefix[:end])
+                streamed = list(tree.iter_autocomplete(prefix[:end]))
+                assert sorted(streamed) == sorted(full)
+                weights = [weight for _, weight in streamed]
+                assert weights == sorted(weights, reverse=True)
+                _check_limited(list(islice(
+                    tree.iter_autocomplete(prefix[:end]), 2)), full, 2)
+        assert list(tree.iter_autocomplete(['d'])) == []
+
+
+def _check_values(tree, model, prefix=()):
+    """Check that the value of every tree in <tree> that is not a leaf is a
+    prefix of the prefixes of the values under it (one longer than its
+    parent's in a SimplePrefixTree); <prefix> is the parent's value.
+    """
+    if tree.is_leaf():
+        assert model[tree.value][1][:len(prefix)] == list(prefix)
+        return
+    value = tree.value
+    assert value[:len(prefix)] == list(prefix)
+    if isinstance(tree, SimplePrefixTree) and prefix != ():
+        assert len(value) == len(prefix) + 1
+    for subtree in tree.subtrees:
+        _check_values(subtree, model, value)
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+def test_trees_share_their_prefix_without_changing_values(tree_class):
+    rng = random.Random(12)
+    for _ in range(100):
+        tree, model = tree_class('sum'), {}
+        _fill(tree, model, rng, rng.randint(1, 15))
+        _check_values(tree, model)
+
+    tree = tree_class('sum')
+    tree.insert('abc', 1, ['a', 'b', 'c'])
+    path = [tree]
+    while not path[-1].subtrees[0].is_leaf():
+        path.append(path[-1].subtrees[0])
+    assert len({id(subtree._value) for subtree in path[1:]}) == 1
+    assert not hasattr(tree, '__dict__')
+
+    path[-1].value = ['x', 'y', 'z']
+    assert path[-1].value == ['x', 'y', 'z']
+    assert path[-2].value == ['a', 'b', 'c'][:len(path[-2].value)]
+    path[-1].subtrees[0].value = 'xyz'
+    assert path[-1].subtrees[0].value == 'xyz'
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+@pytest.mark.parametrize('weight_type', WEIGHT_TYPES)
+def test_result_cache_never_answers_stale(tree_class, weight_type):
+    rng = random.Random(13)
+    hits = 0
+    for _ in range(100):
+        cached, plain = tree_class(weight_type), tree_class(weight_type)
+        cached.set_result_cache(rng.randint(1, 4))
+        model = {}
+        for _ in range(15):
+            choice = rng.random()
+            if model and choice < 0.2:
+                value = rng.choice(sorted(model))
+                cached.remove_value(value)
+                plain.remove_value(value)
+                del model[value]
+            elif model and choice < 0.3:
+                value = rng.choice(sorted(model))
+                cached.update_weight(value, 2)
+                plain.update_weight(value, 2)
+            elif choice < 0.35:
+                prefix = [rng.choice('abc')]
+                cached.remove(prefix)
+                plain.remove(prefix)
+                model = {value: entry for value, entry in model.items()
+                         if entry[1][:1] != prefix}
+            else:
+                for value, weight, prefix in _random_items(rng, 1):
+                    cached.insert(value, weight, prefix)
+                    plain.insert(value, weight, prefix)
+                    model.setdefault(value, [0, prefix])[0] += weight
+
+            for _ in range(3):
+                prefix = [rng.choice('ab') for _ in range(rng.randint(0, 2))]
+                limit = rng.choice([None, 1, 2])
+                full = plain.autocomplete(prefix)
+                if limit is None:
+                    assert sorted(cached.autocomplete(prefix)) == sorted(full)
+                else:
+                    _check_limited(cached.autocomplete(prefix, limit), full,
+                                   limit)
+        hits += cached.cache_info()['hits']
+    assert hits > 0
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+def test_result_cache_is_invalidated_by_writes_under_its_prefix(tree_class):
+    tree = tree_class('sum')
+    tree.set_result_cache(4)
+    tree.insert('cat', 3, ['c', 'a', 't'])
+    assert tree.autocomplete(['c']) == [('cat', 3)]
+
+    tree.insert('cow', 5, ['c', 'o', 'w'])
+    assert tree.autocomplete(['c']) == [('cow', 5), ('cat', 3)]
+    tree.remove_value('cow')
+    assert tree.autocomplete(['c']) == [('cat', 3)]
+    tree.remove(['c', 'a'])
+    assert tree.autocomplete(['c']) == []
+    assert tree.cache_info()['hits'] == 0
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+@pytest.mark.parametrize('weight_type', WEIGHT_TYPES)
+def test_cursor_matches_autocomplete_of_its_prefix(tree_class, weight_type):
+    rng = random.Random(14)
+    for _ in range(100):
+        tree, model = tree_class(weight_type), {}
+        _fill(tree, model, rng, rng.randint(1, 10))
+        cursor = tree.cursor()
+        prefix = []
+        for _ in range(20):
+            choice = rng.random()
+            if choice < 0.5:
+                element = rng.choice('abcd')
+                cursor.extend(element)
+                prefix.append(element)
+            elif choice < 0.7:
+                cursor.backspace()
+                prefix = prefix[:-1]
+            elif model and choice < 0.8:
+                value = rng.choice(sorted(model))
+                tree.remove_value(value)
+                del model[value]
+            else:
+                _fill(tree, model, rng, 1)
+
+            assert cursor.prefix == prefix
+            full = tree.autocomplete(prefix)
+            assert sorted(cursor.autocomplete()) == sorted(full)
+            _check_limited(cursor.autocomplete(1), full, 1)
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+@pytest.mark.parametrize('weight_type', WEIGHT_TYPES)
+def test_autocomplete_many_matches_one_at_a_time(tree_class, weight_type):
+    rng = random.Random(15)
+    for _ in range(100):
+        tree, model = tree_class(weight_type), {}
+        _fill(tree, model, rng, rng.randint(1, 15))
+        prefixes = [[rng.choice('abcd') for _ in range(rng.randint(0, 3))]
+                    for _ in range(rng.randint(0, 8))]
+        prefixes += prefixes[:2]
+
+        limit = rng.choice([None, 1, 3])
+        results = tree.autocomplete_many(prefixes, limit)
+        assert len(results) == len(prefixes)
+        for prefix, result in zip(prefixes, results):
+            full = tree.autocomplete(prefix)
+            if limit is None:
+                assert sorted(result) == sorted(full)
+            else:
+                _check_limited(result, full, limit)
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+def test_counted_autocomplete_answers_and_adds_up(tree_class):
+    rng = random.Random(16)
+    for _ in range(50):
+        counted, plain = tree_class('sum'), tree_class('sum')
+        for value, weight, prefix in _random_items(rng, rng.randint(0, 12)):
+            counted.insert(value, weight, prefix)
+            plain.insert(value, weight, prefix)
+        calls = []
+        counted.set_stats(True, lambda prefix, counts:
+                          calls.append((list(prefix), dict(counts))))
+        if rng.random() < 0.5:
+            counted.set_result_cache(2)
+
+        for _ in range(5):
+            prefix = [rng.choice('abc') for _ in range(rng.randint(0, 2))]
+            limit = rng.choice([None, 1, 2])
+            result = counted.autocomplete(prefix, limit)
+            full = plain.autocomplete(prefix)
+            _check_limited(result, full, len(full) if limit is None
+                           else limit)
+
+            assert calls[-1][0] == prefix
+            counts = calls[-1][1]
+            assert counts['calls'] == 1
+            assert counts['nodes_visited'] >= counts['leaves_collected']
+            assert counts['leaves_collected'] in (0, len(result))
+
+        totals = counted.stats_info()
+        for name, total in totals.items():
+            assert total == sum(counts[name] for _, counts in calls)
+        counted.set_stats(False)
+        assert set(counted.stats_info().values()) == {None}
@@ -0,0 +1,155 @@
+"""Tests for VersionedPrefixTree: a published version never changes, and
+the tree a versioned tree is made from is left alone.
+"""
+import random
+import threading
+
+import pytest
+
+from prefix_tree import SimplePrefixTree, CompressedPrefixTree
+
+TREE_CLASSES = [SimplePrefixTree, CompressedPrefixTree]
+ITEMS = [('cat', 3, ['c', 'a', 't']), ('car', 4, ['c', 'a', 'r']),
+         ('cow', 5, ['c', 'o', 'w']), ('dog', 1, ['d', 'o', 'g'])]
+
+
+def _build(tree_class, items):
+    tree = tree_class('sum')
+    for value, weight, prefix in items:
+        tree.insert(value, weight, prefix)
+    return tree
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+def test_snapshot_survives_every_kind_of_write(tree_class):
+    versioned = _build(tree_class, ITEMS).versioned()
+    old = versioned.snapshot()
+    expected = old.autocomplete([])
+
+    versioned.insert('cap', 9, ['c', 'a', 'p'])
+    versioned.update_weight('dog', 10)
+    versioned.remove_value('cat')
+    versioned.remove(['c', 'o'])
+
+    assert old.autocomplete([]) == expected
+    assert versioned.autocomplete([]) == [('dog', 11), ('cap', 9),
+                                          ('car', 4)]
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+def test_source_tree_is_left_unchanged(tree_class):
+    tree = _build(tree_class, ITEMS)
+    tree.set_lazy_sorting(True)
+    tree.set_result_cache(4)
+    before = str(tree)
+
+    versioned = tree.versioned()
+    versioned.update_weight('cat', 1)
+    versioned.remove_value('cow')
+
+    assert str(tree) == before
+    tree.update_weight('cat', 3)
+    tree.remove_value('dog')
+    assert tree.autocomplete(['c']) == [('cat', 6), ('cow', 5), ('car', 4)]
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+def test_missing_value_raises_key_error(tree_class):
+    versioned = _build(tree_class, ITEMS).versioned()
+    with pytest.raises(KeyError):
+        versioned.update_weight('emu', 1)
+    versioned.remove(['c'])
+    with pytest.raises(KeyError):
+        versioned.remove_value('cat')
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+def test_matches_plain_tree_under_random_writes(tree_class):
+    rng = random.Random(0)
+    prefixes = {}
+    plain = tree_class('average')
+    versioned = tree_class('average').versioned()
+
+    for _ in range(300):
+        choice = rng.random()
+        if choice < 0.4 or len(plain) == 0:
+            value = f'v{rng.randint(0, 30)}'
+            prefix = prefixes.setdefault(
+                value, [rng.choice('ab') for _ in range(rng.randint(0, 4))])
+            weight = rng.randint(1, 9)
+            plain.insert(value, weight, prefix)
+            versioned.insert(value, weight, prefix)
+        elif choice < 0.6:
+            value = rng.choice(sorted(plain._index))
+            plain.update_weight(value, 2)
+            versioned.update_weight(value, 2)
+        elif choice < 0.85:
+            value = rng.choice(sorted(plain._index))
+            plain.remove_value(value)
+            versioned.remove_value(value)
+        else:
+            prefix = [rng.choice('ab') for _ in range(rng.randint(1, 2))]
+            plain.remove(prefix)
+            versioned.remove(prefix)
+
+        assert sorted(versioned.autocomplete([])) == \
+            sorted(plain.autocomplete([]))
+
+
+def test_readers_only_see_whole_versions():
+    versioned = CompressedPrefixTree('sum').versioned()
+    stop = threading.Event()
+    torn = []
+
+    def read():
+        while not stop.is_set():
+            values = {value for value, _ in
+                      versioned.snapshot().autocomplete([])}
+            # values go in in order, so a version holds the first few
+            if values != {f'v{i}' for i in range(len(values))}:
+                torn.append(values)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        for i in range(2000):
+            versioned.insert(f'v{i}', 1, list(str(i)))
+    finally:
+        stop.set()
+        reader.join()
+    assert torn == []
+
+
+def _leaves(tree):
+    if tree.is_leaf():
+        return {tree.value: tree}
+    leaves = {}
+    for subtree in tree.subtrees:
+        leaves.update(_leaves(subtree))
+    return leaves
+
+
+@pytest.mark.parametrize('tree_class', TREE_CLASSES)
+def test_writes_share_the_leaves_they_do_not_touch(tree_class):
+    versioned = _build(tree_class, ITEMS).versioned()
+    old = _leaves(versioned.snapshot())
+
+    versioned.insert('cap', 9, ['c', 'a', 'p'])
+    new = _leaves(versioned.snapshot())
+    assert all(new[value] is old[value] for value in old)
+
+    versioned.update_weight('cat', 2)
+    newer = _leaves(versioned.snapshot())
+    assert newer['cat'] is not new['cat'] and new['cat'].weight == 3
+    assert all(newer[value] is new[value] for value in new
+               if value != 'cat')
+
+
+def test_versions_share_their_stats():
+    versioned = _build(SimplePrefixTree, ITEMS).versioned()
+    versioned.set_stats(True)
+    old = versioned.snapshot()
+    versioned.insert('cap', 9, ['c', 'a', 'p'])
+    old.autocomplete(['c'])
+    versioned.autocomplete(['c'])
+    assert versioned.stats_info()['calls'] == 2